@@ -12,6 +12,8 @@ from src.Analysis import BookDataAnalysis
 #get current directory path and build the path to the cleaned_data.csv file
 current_directory = os.path.dirname(os.path.abspath(__file__))
 path = os.path.join(current_directory, '..', 'src', 'Data_Cleaning', 'cleaned_data.csv')
+#the dashboard loads the full float64/str frame: the compact schema(float32, categoricals) changes rounded values
+#  and the order of tied groups in the aggregations of BookDataAnalysis
 df = Loader.load_dataset(path)
 
 # create dash app
@@ -3,7 +3,9 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from src.Analysis.Reccomandation_Models import kmeans_reccomender, data_preprocessing
+from src.Analysis.Reccomandation_Models import (kmeans_reccomender, load_normalized_catalog, fit_kmeans_model, KMeansModel,
+                                                asin_index)
+from src.Analysis.Neighbor_Table import NeighborTable, build_neighbor_table, model_path, table_path
 import pandas as pd
 from flask import send_from_directory
 
@@ -21,22 +23,30 @@ def serve_static(path):
 #get current directory path and build the path to the cleaned_data.csv file
 current_directory = os.path.dirname(os.path.abspath(__file__))
 path = os.path.join(current_directory, '..', 'src', 'Data_Cleaning', 'cleaned_data.csv')
-df = pd.read_csv(path)
-df_norm = data_preprocessing(df)
 
-def convert_normalized_price_to_original(normalized_price, df_original):
-    """
-    Convert normalized price back to original price format
-    """
-    # Get the original price range
-    min_price = df_original['final_price'].min()
-    max_price = df_original['final_price'].max()
-    
-    # Convert normalized price back to original scale
-    original_price = normalized_price * (max_price - min_price) + min_price
-    
-    # Format to 2 decimal places
-    return round(original_price, 2)
+#the normalization parameters are fitted once and saved in src/Normalization/normalizer.json with the version of cleaned_data.csv,
+#  the next starts only load them until the file changes(load_normalized_catalog, shared with the offline job Neighbor_Table.py)
+df, normalizer, df_norm = load_normalized_catalog(path)
+
+#the UMAP + K-Means model is fitted once and saved in src/Analysis/kmeans_model.npz,
+#  it's fitted again if the rows, the version of the catalog or the normalizer changed(KMeansModel.matches),
+#  so a request only searches the neighbors of the book
+model = KMeansModel.load(model_path) if os.path.exists(model_path) else None
+refit = model is None or not model.matches(df_norm)
+if refit:
+    model = fit_kmeans_model(df_norm)
+    model.save(model_path)
+
+#the top-N recommendations of every book are computed once and saved in src/Analysis/neighbor_table.npz,
+#  a request is a slice of the table(the offline job python src/Analysis/Neighbor_Table.py computes it with a pool of processes),
+#  it's computed again with the model or if the rows, the version of the catalog or the normalizer changed(NeighborTable.matches)
+table = NeighborTable.load(table_path) if os.path.exists(table_path) and not refit else None
+if table is None or not table.matches(df_norm):
+    table = build_neighbor_table(df_norm, model, workers=1)
+    table.save(table_path)
+
+#hash index asin -> row position of the catalog, an unknown asin is answered without searching the dataframe
+index = asin_index(df_norm)
 
 @app.route('/recommend', methods=['GET'])
 def reccomend():
@@ -44,16 +54,22 @@ def reccomend():
     num_recs = int(request.args.get('num_recs', 5)) 
     if not asin:
         return jsonify({'error': 'missing ASIN code'}), 400
+    if asin not in index:
+        return jsonify({'error': 'No similar books found or invalid ASIN'}), 200
     try:
-        reccomendation = kmeans_reccomender(df_norm, asin, num_recs)
+        if num_recs <= table.num_recs:
+            reccomendation = table.recommend(df_norm, 'kmeans_reccomender', asin, num_recs)
+        else:
+            reccomendation = kmeans_reccomender(df_norm, asin, num_recs, model)
         if reccomendation.empty:
            return jsonify({'error': 'No similar books found or invalid ASIN'}), 200
         
         # Convert normalized prices back to original format
-        for idx, row in reccomendation.iterrows():
-            normalized_price = row['final_price']
-            original_price = convert_normalized_price_to_original(normalized_price, df)
-            reccomendation.at[idx, 'final_price'] = original_price
+        reccomendation['final_price'] = normalizer.inverse_transform(reccomendation[['final_price']])['final_price'].round(2)
+        
+        # compact float32 columns are cast back to float64 so the JSON shows 2 decimals
+        float_cols = reccomendation.select_dtypes('float32').columns
+        reccomendation[float_cols] = reccomendation[float_cols].astype('float64').round(2)
         
         result = reccomendation.to_dict(orient='records')
         return jsonify({'recommendation': result})
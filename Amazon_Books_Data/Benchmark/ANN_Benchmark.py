@@ -0,0 +1,77 @@
+import sys
+import os
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Analysis.ANN_Index import LSHIndex
+
+"""
+Harness of the approximate nearest neighbor search(ANN_Index.LSHIndex) against the exact search of sklearn NearestNeighbors.
+
+A synthetic catalog is generated('rows' books with 2 normalized features in 'categories' categories), the neighbors of 'queries'
+  random books are searched among the books of their category:
+  'exact' is a NearestNeighbors model fitted on each category, queried one book at a time,
+  'lsh' is an LSHIndex of all the books with the category as label, for each bucket width and number of probed tables.
+For each configuration the script reports recall@k(fraction of the exact k neighbors found), queries/sec and the build seconds,
+  the index is also built with incremental inserts of 'insert_batch' books to report the inserts/sec.
+
+Usage(from the folder Amazon_Books_Data):
+    python Benchmark/ANN_Benchmark.py --rows 1000000 --categories 100 --k 10 --width 0.01 0.02 0.04 --probes 1 2 4 8
+"""
+
+def exact_neighbors(X, labels, queries, k):
+    #exact k neighbors of the queries in their category, with the queries/sec of NearestNeighbors
+    models = {}
+    for label in np.unique(labels[queries]):
+        positions = np.flatnonzero(labels == label)
+        models[label] = (NearestNeighbors(n_neighbors=k).fit(X[positions]), positions)
+    start = time.perf_counter()
+    result = []
+    for q in queries:
+        model, positions = models[labels[q]]
+        result.append(positions[model.kneighbors(X[q:q + 1], return_distance=False)[0]])
+    return result, len(queries) / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recall and queries/sec of the LSH index against NearestNeighbors.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--categories', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=1_000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--tables', type=int, default=8)
+    parser.add_argument('--width', type=float, nargs='+', default=[0.01, 0.02, 0.04])
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--insert-batch', type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = rng.random((args.rows, 2))
+    labels = rng.integers(0, args.categories, args.rows)
+    queries = rng.choice(args.rows, args.queries, replace=False)
+    expected, qps = exact_neighbors(X, labels, queries, args.k)
+    results = [{'index': 'exact', 'width': None, 'probes': None, 'recall@k': 1.0, 'queries_per_sec': qps}]
+
+    for width in args.width:
+        start = time.perf_counter()
+        index = LSHIndex(X.shape[1], args.tables, width=width)
+        index.insert(X, labels)
+        build = time.perf_counter() - start
+        for probes in args.probes:
+            start = time.perf_counter()
+            found = [index.query(X[q], args.k, labels[q], probes)[0] for q in queries]
+            seconds = time.perf_counter() - start
+            recall = np.mean([len(np.intersect1d(f, e)) / args.k for f, e in zip(found, expected)])
+            results.append({'index': 'lsh', 'width': width, 'probes': probes, 'recall@k': recall,
+                            'queries_per_sec': args.queries / seconds, 'build_seconds': build})
+
+    # incremental build: the same index built by inserting batches of books
+    start = time.perf_counter()
+    index = LSHIndex(X.shape[1], args.tables, width=args.width[-1])
+    for i in range(0, args.rows, args.insert_batch):
+        index.insert(X[i:i + args.insert_batch], labels[i:i + args.insert_batch])
+    seconds = time.perf_counter() - start
+    print(pd.DataFrame(results).round(3).to_string(index=False))
+    print(f"incremental build: {args.rows} books in batches of {args.insert_batch}, {args.rows / seconds:.0f} inserts/sec")
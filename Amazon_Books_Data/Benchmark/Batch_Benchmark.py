@@ -0,0 +1,74 @@
+import sys
+import os
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Analysis import Reccomandation_Models
+
+"""
+Benchmark of the batch recommenders against a loop over the single-asin functions.
+
+A synthetic normalized catalog is generated('rows' books in 'categories' categories) with a random KMeansModel
+  (random 2D embedding and clusters, so UMAP is not fitted), then a batch of distinct asins is recommended:
+  'loop' calls the single-asin function for each asin(the KD-trees of knn_category_recommender are built before the timing),
+  'batch' calls the batch variant once.
+For each model the script reports seconds and asins/sec, and checks that the recommended books are the same.
+
+Usage(from the folder Amazon_Books_Data):
+    python Benchmark/Batch_Benchmark.py --rows 100000 --categories 2000 --batch 10000
+"""
+
+def make_catalog(rows, categories, seed = 0):
+    #synthetic normalized catalog with the columns used by the recommenders
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'asin': [f"B{i:09d}" for i in range(rows)],
+        'title': [f"Book {i}" for i in range(rows)],
+        'main_category': rng.integers(0, categories, rows),
+        'main_rank': rng.random(rows),
+        'reviews_count': rng.integers(0, 100_000, rows),
+        'reviews_normalized': rng.random(rows),
+        'rating': rng.integers(30, 51, rows) / 10,
+        'final_price': rng.random(rows),
+    })
+    model = Reccomandation_Models.KMeansModel(df['asin'], df['main_category'], rng.normal(size=(rows, 2)),
+                                              rng.integers(0, 10, rows), np.zeros((10, 2)))
+    return df, model
+
+def timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the batch recommenders.")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--categories', type=int, default=2_000)
+    parser.add_argument('--batch', type=int, default=10_000)
+    parser.add_argument('--num-recs', type=int, default=5)
+    args = parser.parse_args()
+
+    df, model = make_catalog(args.rows, args.categories)
+    asins = df['asin'].sample(args.batch, random_state=0).to_numpy()
+    Reccomandation_Models.build_category_indexes(df)
+    models = {
+        'filter_by_category': (Reccomandation_Models.filter_by_category, Reccomandation_Models.batch_filter_by_category, ()),
+        'knn_category_recommender': (Reccomandation_Models.knn_category_recommender,
+                                     Reccomandation_Models.batch_knn_category_recommender, ()),
+        'kmeans_reccomender': (Reccomandation_Models.kmeans_reccomender, Reccomandation_Models.batch_kmeans_reccomender, (model,)),
+    }
+    results = []
+    for name, (single, batch, extra) in models.items():
+        loop, seconds_loop = timed(lambda: [single(df, asin, args.num_recs, *extra) for asin in asins])
+        result, seconds_batch = timed(batch, df, asins, args.num_recs, *extra)
+        assert list(result['asin']) == [asin for recs in loop for asin in recs['asin']]
+        for implementation, seconds in [('loop', seconds_loop), ('batch', seconds_batch)]:
+            results.append({'model': name, 'implementation': implementation, 'seconds': seconds,
+                            'asins_per_sec': args.batch / seconds})
+        results[-1]['speedup'] = seconds_loop / seconds_batch
+    print(pd.DataFrame(results).round(3).to_string(index=False))
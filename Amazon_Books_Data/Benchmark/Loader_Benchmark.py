@@ -0,0 +1,84 @@
+import sys
+import os
+import argparse
+import multiprocessing as mp
+import resource
+import tempfile
+import time
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Load_Data import Loader
+
+"""
+Benchmark of the CSV reader backends of Loader.READ_ENGINES.
+
+cleaned_data.csv is replicated to the requested number of rows (1M and 10M by default), optionally compressed,
+  and every backend reads the file in a fresh process, so the peak RSS of a run is not affected by the previous runs.
+For each file and backend the script reports seconds, rows/sec and the peak RSS increase during the read.
+
+Usage(from the folder Amazon_Books_Data):
+    python Benchmark/Loader_Benchmark.py --rows 1000000 10000000 --compression none gzip zstd
+"""
+
+path = os.path.join(os.path.dirname(__file__), '..', 'src', 'Data_Cleaning', 'cleaned_data.csv')
+
+EXTENSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+def replicate_dataset(rows, compression, folder):
+    #write cleaned_data.csv replicated to 'rows' rows in the folder and return the file path
+    file = os.path.join(folder, f"books_{rows}.csv{EXTENSIONS[compression]}")
+    if not os.path.exists(file):
+        df = pd.read_csv(path)
+        df = pd.concat([df] * (rows // len(df) + 1), ignore_index=True).head(rows)
+        df.to_csv(file, index=False, compression=None if compression == 'none' else compression)
+    return file
+
+def _peak_rss():
+    #peak resident set size of the current process in bytes(ru_maxrss is in KB on linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _run(file, engine, queue):
+    start_rss = _peak_rss()
+    start = time.perf_counter()
+    df = Loader.read_csv(file, engine)
+    seconds = time.perf_counter() - start
+    queue.put((len(df), seconds, _peak_rss() - start_rss))
+
+def benchmark(file, engine):
+    #read the file with the backend in a new process and return rows, seconds and peak RSS increase
+    queue = mp.get_context('spawn').Queue()
+    process = mp.get_context('spawn').Process(target=_run, args=(file, engine, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the CSV reader backends of Loader.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--compression', nargs='+', default=['none'], choices=list(EXTENSIONS))
+    parser.add_argument('--engines', nargs='+', default=list(Loader.READ_ENGINES), choices=list(Loader.READ_ENGINES))
+    parser.add_argument('--dir', default=None, help="folder for the replicated files(default: a temporary folder)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.dir or tmp
+        results = []
+        for rows in args.rows:
+            for compression in args.compression:
+                file = replicate_dataset(rows, compression, folder)
+                for engine in args.engines:
+                    n, seconds, rss = benchmark(file, engine)
+                    results.append({
+                        'rows': n,
+                        'compression': compression,
+                        'engine': engine,
+                        'seconds': round(seconds, 3),
+                        'rows_per_sec': int(n / seconds),
+                        'peak_rss_mb': round(rss / 2**20, 1),
+                    })
+                    print(results[-1])
+        print(pd.DataFrame(results).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import sys
+import os
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Normalization import Normalizer
+
+"""
+Benchmark of Normalizer.extract_best_sellers_rank before and after the vectorized extraction.
+
+A synthetic best_sellers_rank column is generated(1M rows by default) with a given fraction of distinct JSON strings,
+  'before' is the original implementation, a json.loads and a pd.Series for each row,
+  'after' is Normalizer.extract_best_sellers_rank, a json.loads for each distinct string.
+For each implementation the script reports seconds and rows/sec, and checks that the results are the same.
+
+Usage(from the folder Amazon_Books_Data):
+    python Benchmark/Normalizer_Benchmark.py --rows 1000000 --distinct 0.5
+"""
+
+CATEGORIES = ['Books', 'Literature & Fiction', 'Children\'s Books', 'Mystery, Thriller & Suspense', 'Self-Help',
+              'Science Fiction & Fantasy', 'Biographies & Memoirs', 'Cookbooks, Food & Wine']
+
+def make_best_sellers_rank(rows, distinct, seed = 0):
+    #synthetic best_sellers_rank column with about rows * distinct distinct JSON strings, 1% of missing values
+    rng = np.random.default_rng(seed)
+    n = max(1, int(rows * distinct))
+    values = []
+    for _ in range(n):
+        ranks = [{'category': CATEGORIES[c], 'rank': int(r)}
+                 for c, r in zip(rng.choice(len(CATEGORIES), rng.integers(1, 4), replace=False), rng.integers(1, 500_000, 3))]
+        values.append(json.dumps(ranks))
+    column = pd.Series(values).iloc[rng.integers(0, n, rows)].reset_index(drop=True)
+    column[rng.random(rows) < 0.01] = None
+    return column
+
+def before(df):
+    #original implementation of Normalizer.extract_best_sellers_rank
+    def extract_info(x):
+        try:
+            data = json.loads(x)
+            if isinstance(data, list) and len(data) > 0:
+                return data[0].get('category'), data[0].get('rank')
+        except (json.JSONDecodeError, TypeError, IndexError):
+            pass
+        return None, None
+
+    df[['main_category', 'main_rank']] = df['best_sellers_rank'].apply(
+        lambda x: pd.Series(extract_info(x))
+    )
+    return df
+
+def run(func, column):
+    df = pd.DataFrame({'best_sellers_rank': column})
+    start = time.perf_counter()
+    df = func(df)
+    return df, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the best_sellers_rank extraction.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--distinct', type=float, nargs='+', default=[1.0, 0.5, 0.05],
+                        help="fractions of distinct JSON strings")
+    args = parser.parse_args()
+
+    results = []
+    for distinct in args.distinct:
+        column = make_best_sellers_rank(args.rows, distinct)
+        expected, seconds_before = run(before, column)
+        result, seconds_after = run(Normalizer.extract_best_sellers_rank, column)
+        pd.testing.assert_frame_equal(result, expected)
+        for name, seconds in [('before', seconds_before), ('after', seconds_after)]:
+            results.append({'rows': args.rows, 'distinct': distinct, 'implementation': name,
+                            'seconds': seconds, 'rows_per_sec': args.rows / seconds})
+        results[-1]['speedup'] = seconds_before / seconds_after
+    print(pd.DataFrame(results).round(3).to_string(index=False))
@@ -0,0 +1,58 @@
+import sys
+import os
+import argparse
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Analysis import Reccomandation_Models
+
+"""
+Benchmark of the distance ranking of kmeans_reccomender before and after the vectorized ranking.
+
+A synthetic cluster of candidate books is generated(random UMAP coordinates) for each size,
+  'before' is the original ranking, a np.linalg.norm for each row(DataFrame.apply) and a full sort_values,
+  'after' is the ranking of KMeansModel.neighbors, one broadcast distance over the coordinates and np.argpartition top-k.
+For each size the script reports seconds and candidates/sec, and checks that the recommended books are the same.
+
+Usage(from the folder Amazon_Books_Data):
+    python Benchmark/Reccomandation_Benchmark.py --candidates 1000 100000 1000000 --num-recs 5
+"""
+
+def before(same_cluster, input_coords, num_recs):
+    #original ranking of kmeans_reccomender
+    same_cluster = same_cluster.copy()
+    same_cluster['distance'] = same_cluster.apply(
+        lambda row: np.linalg.norm(np.array([row['umap_x'], row['umap_y']]) - input_coords),
+        axis=1
+    )
+    return same_cluster.sort_values('distance', kind='stable').head(num_recs).index.to_numpy()
+
+def after(embedding, input_coords, num_recs):
+    return Reccomandation_Models.top_k(Reccomandation_Models.squared_distances(embedding, input_coords), num_recs)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the distance ranking of kmeans_reccomender.")
+    parser.add_argument('--candidates', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--num-recs', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.candidates:
+        embedding = rng.normal(size=(n, 2))
+        same_cluster = pd.DataFrame(embedding, columns=['umap_x', 'umap_y'])
+        input_coords = rng.normal(size=2)
+        expected, seconds_before = timed(before, same_cluster, input_coords, args.num_recs)
+        result, seconds_after = timed(after, embedding, input_coords, args.num_recs)
+        assert np.array_equal(result, expected)
+        for name, seconds in [('before', seconds_before), ('after', seconds_after)]:
+            results.append({'candidates': n, 'implementation': name,
+                            'seconds': seconds, 'candidates_per_sec': n / seconds})
+        results[-1]['speedup'] = seconds_before / seconds_after
+    print(pd.DataFrame(results).round(6).to_string(index=False))
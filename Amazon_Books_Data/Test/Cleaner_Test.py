@@ -0,0 +1,224 @@
+import sys
+import os
+import ast
+import json
+import re
+import pytest
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from src.Data_Cleaning import Cleaner, Memoizer, Pipeline, Outliers
+from conftest import make_raw_dataset
+
+"""
+Parity tests: the optimized Cleaner functions must return the same values of the original implementations, copied below.
+"""
+
+def reference_get_book_format(df):
+    def get_format(value):
+        try:
+            formats = json.loads(value.replace("'", '"'))
+            if isinstance(formats, list) and len(formats) > 0:
+                return formats[0].get('name')
+        except (json.JSONDecodeError, TypeError):
+            pass
+    df['book_format'] = df['format'].apply(get_format)
+    df.drop(columns = ['format'], inplace = True, errors = 'ignore')
+    return df
+
+def reference_parse_item_weight(df):
+    def get_value(value):
+        if isinstance(value, str):
+            match = re.search(r"([\d.]+)\s*(pounds|ounces)", value.lower())
+            if match:
+                weight = float(match.group(1))
+                unit = match.group(2)
+                if unit == "pounds":
+                    return weight * 453.92
+                elif unit == "ounces":
+                    return weight * 28.35
+        return np.nan
+    df['item_weight'] = df['item_weight'].apply(get_value)
+    return df
+
+def reference_handle_rating(df):
+    df['rating'] = df['rating'].astype(str).str.extract(r'(\d+\.\d+)')
+    df['rating'] = df['rating'].astype(float)
+    return df
+
+def reference_add_stock_columns(df):
+    def get_quantity(value):
+        if isinstance(value,str):
+            match = re.search(r'Only (\d+) left in stock', value)
+            if match:
+                return int(match.group(1))
+            if(
+                'temporarily out of stock' in value.lower() 
+                or 'this title will be released on' in value.lower()
+                or 'out of stock' in value.lower()
+            ):
+                return 0
+            if(
+                'in stock' in value.lower()
+                or 'usually ships within 2 to 3 weeks' in value.lower()
+                or 'usually ships within 8 days' in value.lower()
+            ):
+                return np.nan
+        return np.nan
+    
+    def get_is_in_stock(value):
+        if isinstance(value, str):
+          if (
+            'temporarily out of stock' in value.lower()
+            or 'this title will be released on' in value.lower()
+            or 'out of stock' in value.lower()
+          ):
+            return 0
+          else:
+            return 1
+        return 0 
+    
+    df['quantity_in_stock'] = df['availability'].apply(get_quantity)
+    df['is_in_stock'] = df['availability'].apply(get_is_in_stock)
+    df.drop(columns=['availability'], inplace=True)
+    return df
+
+def reference_handle_categories(df):
+    def get_category(value):
+        try:
+            cats = ast.literal_eval(value)
+            if len(cats) >= 3:
+                return f"{cats[1]} - {cats[2]}"
+            elif len(cats) == 2:
+                return cats[1]
+        except Exception:
+            pass
+        return "Unknown category"
+    df['categories'] = df['categories'].apply(get_category)
+    return df
+
+def reference_find_outliers_iqr(df, columns):
+    outliers = {}
+    for col in columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            Q1 = df[col].quantile(0.25)
+            Q3 = df[col].quantile(0.75)
+            IQR = Q3 - Q1
+            col_outliers = df[(df[col] < Q1 - 1.5 * IQR) | (df[col] > Q3 + 1.5 * IQR)]
+            outliers[col] = col_outliers[['asin', 'title', col, 'main_category', 'final_price', 'reviews_count']]
+    return outliers
+
+FORMAT_VALUES = [
+    '[{"name":"Kindle","price":"$9.99","url":"/dp/B01"}]',
+    '[{"name":"Hardcover","price":"$27.91"},{"name":"Kindle","price":"$29.99"}]',
+    "[{'name':'Paperback','price':'$5.00'}]",                 #single quotes are replaced
+    '[{"name":"Children\'s Edition","price":"$5.00"}]',        #the apostrophe breaks the JSON string: None
+    '[{"price":"$5.00"}]',                                      #no name: None
+    '[]',
+    '{"name":"Kindle"}',                                        #not a list: None
+    'Other',
+    '[{"name":"Kindle",',                                       #truncated JSON: None
+]
+
+def test_get_book_format_parity():
+    raw = make_raw_dataset()
+    values = pd.concat([Cleaner.handle_format(raw)['format'], pd.Series(FORMAT_VALUES * 10)], ignore_index=True)
+    expected = reference_get_book_format(pd.DataFrame({'format': values}))
+    result = Cleaner.get_book_format(pd.DataFrame({'format': values}))
+    assert list(result.columns) == ['book_format']
+    pd.testing.assert_series_equal(result['book_format'], expected['book_format'])
+
+def test_parse_item_weight_parity():
+    #pounds and ounces must be converted as before, grams and kilograms are now supported too
+    values = pd.Series(['1.2 pounds', '14.4 Ounces', '2.05 Pounds', '0.5 pounds (pack of 2)', 'unknown', None, 3.5,
+                        '350 grams', '1.5 Kilograms'] * 5)
+    expected = reference_parse_item_weight(pd.DataFrame({'item_weight': values}))['item_weight']
+    result = Cleaner.parse_item_weight(pd.DataFrame({'item_weight': values}))['item_weight']
+
+    metric = values.isin(['350 grams', '1.5 Kilograms'])
+    pd.testing.assert_series_equal(result[~metric], expected[~metric])
+    assert result[values == '350 grams'].eq(350.0).all()
+    assert result[values == '1.5 Kilograms'].eq(1500.0).all()
+
+def test_handle_rating_parity():
+    values = pd.Series(['4.8 out of 5 stars', '4.5 out of 5 stars', None, 'no rating', 4.7, '5.0 out of 5 stars'] * 5)
+    expected = reference_handle_rating(pd.DataFrame({'rating': values}))
+    result = Cleaner.handle_rating(pd.DataFrame({'rating': values}))
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_add_stock_columns_parity():
+    values = pd.concat([make_raw_dataset()['availability'],
+                        pd.Series(['Only 1 left in stock - order soon. Out of stock soon', 'Usually ships within 8 days.', '', 'OUT OF STOCK'])],
+                       ignore_index=True)
+    expected = reference_add_stock_columns(pd.DataFrame({'availability': values}))
+    result = Cleaner.add_stock_columns(pd.DataFrame({'availability': values}))
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_handle_categories_parity():
+    values = pd.concat([make_raw_dataset()['categories'], pd.Series(['not a list', None, '["Books", "A", "B", "C"]'])],
+                       ignore_index=True)
+    expected = reference_handle_categories(pd.DataFrame({'categories': values}))
+    result = Cleaner.handle_categories(pd.DataFrame({'categories': values}))
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_lru_cache_across_chunks():
+    """
+    Cleaning a raw dataset chunk by chunk with shared caches must give the same result of a single call,
+      parsing each distinct value only once, and a bounded cache must never exceed its size.
+    """
+    raw = make_raw_dataset()
+    expected = Pipeline.clean_rows(raw.copy())
+
+    caches = Pipeline.make_caches()
+    chunks = [Pipeline.clean_rows(raw.iloc[i:i + 50].copy(), caches) for i in range(0, len(raw), 50)]
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected, check_dtype=False)
+    assert caches['rating'].misses == len(set(raw['rating']))
+    assert caches['rating'].hits > 0
+
+    calls = []
+    cache = Memoizer.LRUCache(maxsize=2)
+    parser = lambda value: calls.append(value) or value
+    Memoizer.apply_unique(pd.Series(['a', 'b', 'a']), parser, cache)
+    Memoizer.apply_unique(pd.Series(['c', 'a']), parser, cache)
+    assert calls == ['a', 'b', 'c'] and len(cache) == 2
+    Memoizer.apply_unique(pd.Series(['b']), parser, cache)    #'b' was evicted
+    assert calls == ['a', 'b', 'c', 'b']
+
+def test_find_outliers_iqr_parity():
+    df = pd.read_csv("src/Data_Cleaning/cleaned_data.csv")
+    columns = ['final_price', 'reviews_count', 'rating', 'title']
+    expected = reference_find_outliers_iqr(df, columns)
+    result = Cleaner.find_outliers_iqr(df, columns)
+    assert list(result) == list(expected)
+    for col in expected:
+        pd.testing.assert_frame_equal(result[col], expected[col])
+        np.testing.assert_array_equal(Cleaner.find_outliers_iqr(df, [col], compact=True)[col], expected[col].index)
+
+def test_tdigest_quantiles():
+    """
+    The quantiles of a t-digest must be close to the exact ones, also when the digests of the chunks are merged,
+      and the chunked outlier search must find the outliers of the in-memory search.
+    """
+    values = np.random.default_rng(0).lognormal(size=200_000)
+    q = [0.01, 0.25, 0.5, 0.75, 0.99]
+    exact = np.quantile(values, q)
+    digest = Outliers.TDigest().update(values)
+    merged = Outliers.TDigest()
+    for chunk in np.array_split(values, 7):
+        merged.merge(Outliers.TDigest().update(chunk))
+    assert len(digest) == len(merged) == len(values)
+    assert len(digest.means) <= digest.compression
+    for estimate in (digest.quantile(q), merged.quantile(q)):
+        #error measured as distance in rank
+        ranks = np.searchsorted(np.sort(values), estimate) / len(values)
+        assert np.abs(ranks - q).max() < 0.005
+    assert Outliers.TDigest().quantile(0.5) != Outliers.TDigest().quantile(0.5)   #NaN for an empty digest
+
+    df = pd.DataFrame({'reviews_count': values, 'rating': np.random.default_rng(1).normal(4.5, 0.2, len(values))})
+    chunks = lambda: (df.iloc[i:i + 30_000] for i in range(0, len(df), 30_000))
+    result = Outliers.find_outliers_iqr_chunks(chunks, ['reviews_count', 'rating'])
+    bounds = Cleaner.iqr_bounds(df, ['reviews_count', 'rating'])
+    for col, found in result.items():
+        exact = set(df.index[Cleaner.outlier_masks(df, bounds)[col]])
+        assert len(set(found) ^ exact) <= 0.001 * len(df)
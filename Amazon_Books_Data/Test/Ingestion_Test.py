@@ -0,0 +1,51 @@
+import sys
+import os
+import pytest
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from src.Data_Cleaning import Ingestion, Pipeline
+from src.Load_Data import Loader
+from src.Normalization import Normalizer
+from conftest import make_raw_dataset
+
+def test_ingest_snapshot(tmp_path, raw_csv):
+    """
+    - First ingestion: all the rows are new and the store must contain the same rows of a full cleaning of the snapshot.
+    - Same snapshot again: nothing changes and no partition is written.
+    - Snapshot with a changed row, an older row and a new asin: only the changed and the new rows are cleaned.
+    """
+    store = str(tmp_path / "store")
+    normalizer = Normalizer.StreamingNormalizer()
+    summary = Ingestion.ingest_snapshot(raw_csv, store, chunksize=64, normalizer=normalizer)
+    assert summary['new'] == 200 and summary['changed'] == 0
+    assert summary['renormalize'] is False and set(summary['drift']) == set(normalizer.stats)
+
+    expected = Pipeline.clean_dataset(pd.concat(Loader.load_dataset_chunks(raw_csv)))
+    df = Ingestion.load_store(store)
+    assert summary['new'] - summary['dropped'] == len(df) == len(expected)
+    assert len(pd.read_parquet(summary['quarantine'])) == summary['dropped'] > 0
+    pd.testing.assert_frame_equal(df.sort_values('asin').reset_index(drop=True),
+                                  expected.sort_values('asin').reset_index(drop=True), check_dtype=False)
+
+    summary = Ingestion.ingest_snapshot(raw_csv, store, chunksize=64)
+    assert summary['unchanged'] == 200 and summary['partition'] is None
+
+    raw = make_raw_dataset()
+    raw.loc[1, ['title', 'timestamp']] = ['Changed title', '2021-12-22T10:00:00.000Z']
+    raw.loc[2, ['title', 'timestamp']] = ['Older title', '2020-01-01T10:00:00.000Z']
+    raw = pd.concat([raw, raw.iloc[[3]].assign(asin='NEW0000001')])
+    snapshot = str(tmp_path / "snapshot2.csv")
+    raw.to_csv(snapshot, index=False)
+
+    summary = Ingestion.ingest_snapshot(snapshot, store, chunksize=64, normalizer=normalizer)
+    assert (summary['new'], summary['changed'], summary['stale'], summary['unchanged']) == (1, 1, 1, 198)
+    df = Ingestion.load_store(store).set_index('asin')
+    #the old row of the changed asin is replaced, the statistics are the ones of the rows of the store
+    stats = normalizer.stats['final_price']
+    assert stats.count == df['final_price'].notna().sum() == len(expected) + 1
+    assert stats.mean == pytest.approx(df['final_price'].mean())
+    assert stats.std() == pytest.approx(df['final_price'].std(ddof=0))
+    assert df.loc['0000000001', 'title'] == 'Changed title'
+    assert df.loc['0000000002', 'title'] == 'Title 2'
+    assert 'NEW0000001' in df.index
@@ -0,0 +1,126 @@
+import sys
+import os
+import pytest
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Load_Data import Loader
+
+path = "src/Data_Cleaning/cleaned_data.csv"
+
+@pytest.fixture
+def csv_copy(tmp_path):
+    #copy of the cleaned dataset, so the tests never touch the cache of the real file
+    copy = tmp_path / "cleaned_data.csv"
+    copy.write_bytes(open(path, 'rb').read())
+    return str(copy)
+
+def test_load_dataset_cache(csv_copy):
+    """
+    The first read builds the parquet cache, the second read loads it:
+      both DataFrames must be equal to the DataFrame read without cache(1-based index, no 'index' column).
+    """
+    expected = Loader.load_dataset(csv_copy, use_cache=False)
+    cache_file, meta_file = Loader._cache_paths(csv_copy)
+    assert not os.path.exists(cache_file)
+
+    first = Loader.load_dataset(csv_copy)
+    assert os.path.exists(cache_file) and os.path.exists(meta_file)
+    second = Loader.load_dataset(csv_copy)
+
+    for df in (first, second):
+        pd.testing.assert_frame_equal(df, expected)
+        assert df.index[0] == 1 and df.index[-1] == len(df)
+        assert 'index' not in df.columns
+
+def test_load_dataset_cache_invalidation(csv_copy):
+    #the cache must be rebuilt when the CSV file changes
+    df = Loader.load_dataset(csv_copy)
+    df.head(10).to_csv(csv_copy, index=False)
+    assert len(Loader.load_dataset(csv_copy)) == 10
+
+    #same content with a new mtime: the cache is still valid
+    stat = os.stat(csv_copy)
+    os.utime(csv_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(Loader.load_dataset(csv_copy)) == 10
+
+def test_load_dataset_replaced_while_parsing(csv_copy, monkeypatch):
+    """
+    A file replaced while it's parsed is read again: the cache and the version are the ones of the new file,
+      the content of the old file is never cached under the fingerprint of the new one.
+    """
+    old = Loader.load_dataset(csv_copy, use_cache=False)
+    read_csv = Loader.read_csv
+    calls = []
+    def replacing_read_csv(file, engine = 'c', **kwargs):
+        df = read_csv(file, engine, **kwargs)
+        if not calls:
+            old.head(10).drop(columns='index', errors='ignore').to_csv(csv_copy, index=False)
+        calls.append(file)
+        return df
+    monkeypatch.setattr(Loader, 'read_csv', replacing_read_csv)
+    df = Loader.load_dataset(csv_copy)
+    assert len(calls) == 2 and len(df) == 10
+    assert df.attrs['dataset_version'] == Loader._file_hash(csv_copy)
+    monkeypatch.setattr(Loader, 'read_csv', read_csv)
+    assert len(Loader.load_dataset(csv_copy)) == 10
+
+    #the version is read from the fingerprint of the cache, the file is not hashed again
+    hashes = []
+    monkeypatch.setattr(Loader, '_file_hash', lambda file, *args: hashes.append(file))
+    assert Loader.load_dataset(csv_copy, use_cache=False).attrs['dataset_version'] == df.attrs['dataset_version']
+    assert Loader.dataset_version(csv_copy) == df.attrs['dataset_version'] and not hashes
+
+def test_apply_schema(csv_copy):
+    #the compact DataFrame must have the declared dtypes, the same values and use less memory
+    df = Loader.load_dataset(csv_copy)
+    compact = Loader.load_dataset(csv_copy, compact=True)
+
+    for col, dtype in Loader.SCHEMA.items():
+        assert str(compact[col].dtype) == dtype, f"{col}: {compact[col].dtype}"
+    assert (compact['brand'].astype(str) == df['brand']).all()
+    assert (compact['reviews_count'] == df['reviews_count']).all()
+    assert compact['quantity_in_stock'].isna().sum() == df['quantity_in_stock'].isna().sum()
+    assert (compact['final_price'] - df['final_price']).abs().max() < 1e-4
+
+    report = Loader.memory_report(df)
+    assert report.loc['total', 'bytes_after'] < report.loc['total', 'bytes_before']
+    assert list(report.index[:-1]) == list(df.columns)
+
+def test_load_dataset_chunks(raw_csv):
+    """
+    The chunks must cover all the rows of the file with a continuous 1-based index,
+      the columns dropped by the Cleaner must never be parsed and every chunk must have the declared dtypes.
+    """
+    full = pd.read_csv(raw_csv)
+    chunks = list(Loader.load_dataset_chunks(raw_csv, chunksize=64))
+    assert [len(c) for c in chunks] == [64, 64, 64, 8]
+
+    df = pd.concat(chunks)
+    assert list(df.index) == list(range(1, len(full) + 1))
+    assert not set(Loader.UNUSED_RAW_COLUMNS) & set(df.columns)
+    for chunk in chunks:
+        assert chunk.dtypes.equals(chunks[0].dtypes)
+    assert str(df['reviews_count'].dtype) == 'Int64'
+    assert (df['asin'].values == full['asin'].astype(str).str.zfill(10).values).all()
+
+    #explicit column projection
+    chunk = next(Loader.load_dataset_chunks(raw_csv, chunksize=10, columns=['asin', 'availability']))
+    assert list(chunk.columns) == ['asin', 'availability']
+
+@pytest.mark.parametrize("engine", list(Loader.READ_ENGINES))
+@pytest.mark.parametrize("compression", [None, 'gzip', 'zstd'])
+def test_load_dataset_engines(tmp_path, engine, compression):
+    #every backend must read plain and compressed files into the same DataFrame
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    expected = Loader.load_dataset(path, use_cache=False)
+    extension = {None: '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+    file = str(tmp_path / f"cleaned_data.csv{extension}")
+    expected.to_csv(file, index=False, compression=compression)
+
+    df = Loader.load_dataset(file, use_cache=False, engine=engine)
+    pd.testing.assert_frame_equal(df, expected)
+
+def test_load_dataset_engine_not_valid():
+    with pytest.raises(ValueError):
+        Loader.load_dataset(path, use_cache=False, engine='fake_engine')
@@ -0,0 +1,171 @@
+import sys
+import os
+import json
+import pytest
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from src.Normalization import Normalizer
+from conftest import make_raw_dataset
+
+def reference_extract_best_sellers_rank(df):
+    #original implementation, a pd.Series for each row
+    def extract_info(x):
+        try:
+            data = json.loads(x)
+            if isinstance(data, list) and len(data) > 0:
+                return data[0].get('category'), data[0].get('rank')
+        except (json.JSONDecodeError, TypeError, IndexError):
+            pass
+        return None, None
+
+    df[['main_category', 'main_rank']] = df['best_sellers_rank'].apply(
+        lambda x: pd.Series(extract_info(x))
+    )
+    return df
+
+BEST_SELLERS_RANK_VALUES = [
+    '[{"category":"Books","rank":5},{"category":"Fantasy","rank":1}]',
+    '[{"category":"Books/Children","rank":120}]',
+    '[{"rank":7}]',              #no category
+    '[]',
+    'not json',
+    None,
+]
+
+def test_extract_best_sellers_rank_parity():
+    values = pd.concat([make_raw_dataset()['best_sellers_rank'], pd.Series(BEST_SELLERS_RANK_VALUES * 10)], ignore_index=True)
+    expected = reference_extract_best_sellers_rank(pd.DataFrame({'best_sellers_rank': values}))
+    result = Normalizer.extract_best_sellers_rank(pd.DataFrame({'best_sellers_rank': values}))
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_explode_best_sellers_rank(tmp_path):
+    """
+    The long-form table must contain every (category, rank) pair of the JSON strings, sorted by category and rank,
+      and top(category) must return the best ranks of the category as a full scan of the JSON strings.
+    """
+    raw = make_raw_dataset()
+    raw = pd.concat([raw, pd.DataFrame({'asin': ['X1', 'X2', 'X3'], 'best_sellers_rank': BEST_SELLERS_RANK_VALUES[:3]})],
+                    ignore_index=True)
+    ranks = Normalizer.explode_best_sellers_rank(raw)
+
+    expected = [(asin, d['category'], d['rank']) for asin, value in zip(raw['asin'], raw['best_sellers_rank'])
+                if isinstance(value, str) for d in json.loads(value) if 'category' in d]
+    table = ranks.table
+    decoded = list(zip(ranks.asins[table['asin_code']], ranks.categories[table['category_id']], table['rank']))
+    assert sorted(decoded) == sorted(expected)
+    assert table[['category_id', 'rank']].apply(tuple, axis=1).is_monotonic_increasing
+
+    for category in ['Books/Category 0', 'Books/Category 3', 'Books', 'Unknown']:
+        best = sorted((rank, asin) for asin, c, rank in expected if c == category)[:3]
+        top = ranks.top(category, 3)
+        assert len(top) == len(best)
+        assert list(top['rank']) == [rank for rank, _ in best]
+        assert set(top['asin']) <= {asin for asin, c, _ in expected if c == category}
+
+    ranks.save(tmp_path / "category_ranks.parquet")
+    loaded = Normalizer.CategoryRankTable.load(tmp_path / "category_ranks.parquet")
+    pd.testing.assert_frame_equal(loaded.table, table)
+    assert list(loaded.categories) == list(ranks.categories)
+
+def test_book_normalizer(tmp_path):
+    """
+    BookNormalizer must normalize as the Normalizer functions, also after save/load,
+      transform new rows without refitting and convert the normalized values back to the original ones.
+    """
+    df = pd.read_csv("src/Data_Cleaning/cleaned_data.csv")
+    before = df.copy()
+    expected = Normalizer.normalize_number_of_sellers(Normalizer.normalize_root_bs_rank(Normalizer.normalize_rating(
+        Normalizer.normalize_reviews(Normalizer.normalize_prices(df)))))
+    #normalize_prices and normalize_reviews return a new DataFrame, the input is not changed
+    pd.testing.assert_frame_equal(df, before)
+
+    df.attrs['dataset_version'] = 'v1'
+    Normalizer.BookNormalizer().fit(df).save(tmp_path / "normalizer.json")
+    normalizer = Normalizer.BookNormalizer.load(tmp_path / "normalizer.json")
+    #the version of the dataset is saved, so a normalizer fitted on an older catalog is recognized
+    assert normalizer.version == 'v1'
+    result = normalizer.transform(df)
+    pd.testing.assert_frame_equal(result, expected)
+
+    #a single row is normalized with the parameters of the whole dataset
+    pd.testing.assert_frame_equal(normalizer.transform(df.iloc[[7]]), expected.iloc[[7]])
+
+    restored = normalizer.inverse_transform(result)
+    for col in ['final_price', 'initial_price', 'reviews_count', 'rating', 'root_bs_rank', 'number_of_sellers']:
+        np.testing.assert_allclose(restored[col], df[col].astype(float), rtol=1e-9, atol=1e-6)
+
+def test_book_normalizer_categories():
+    raw = make_raw_dataset()
+    expected = Normalizer.normalize_best_sellers_rank(raw.copy())
+    extracted = Normalizer.extract_best_sellers_rank(raw.copy())
+    normalizer = Normalizer.BookNormalizer().fit(extracted[['main_category', 'main_rank']])
+    result = normalizer.transform(extracted[['main_category', 'main_rank']])
+    np.testing.assert_array_equal(result['main_category'], expected['main_category'])
+    np.testing.assert_allclose(result['main_rank'], expected['main_rank'])
+
+    restored = normalizer.inverse_transform(result)
+    assert restored['main_category'].fillna('-').tolist() == extracted['main_category'].astype(str).fillna('-').tolist()
+    new = normalizer.transform(pd.DataFrame({'main_category': ['Never seen'], 'main_rank': [10]}))
+    assert new['main_category'].iloc[0] == -1
+
+def test_streaming_normalizer(tmp_path):
+    """
+    The parameters of a StreamingNormalizer updated chunk by chunk(or merged from two workers) must be the ones fitted on all the rows,
+      and an update that changes the scale must be reported as drift.
+    """
+    df = pd.read_csv("src/Data_Cleaning/cleaned_data.csv")
+    expected = Normalizer.BookNormalizer().fit(df[['final_price', 'initial_price', 'reviews_count', 'root_bs_rank', 'number_of_sellers']])
+
+    streaming = Normalizer.StreamingNormalizer(tolerance=0.05)
+    for i in range(0, len(df), 100):
+        streaming.update(df.iloc[i:i + 100])
+    worker_1, worker_2 = Normalizer.StreamingNormalizer(), Normalizer.StreamingNormalizer()
+    worker_1.update(df.iloc[:500])
+    worker_2.update(df.iloc[500:])
+    merged = worker_1.merge(worker_2)
+    for normalizer in (streaming, merged):
+        assert normalizer.params.keys() == expected.params.keys()
+        for key, value in expected.params.items():
+            if key == 'prices':
+                for col in value:
+                    np.testing.assert_allclose(normalizer.params[key][col], value[col])
+            else:
+                np.testing.assert_allclose(normalizer.params[key], value)
+    pd.testing.assert_frame_equal(streaming.transform(df), expected.transform(df))
+
+    #the stored rows are normalized with the current parameters: rows of the same distribution don't move
+    #  the normalized values, a price above the maximum does
+    assert streaming.needs_renormalization()    #the baseline is the first chunk
+    streaming.rebase()
+    streaming.save(tmp_path / "streaming.json")
+    streaming = Normalizer.StreamingNormalizer.load(tmp_path / "streaming.json")
+    streaming.update(df.sample(50, random_state=0))
+    assert not streaming.needs_renormalization()
+    drift = streaming.update(df.head(1).assign(final_price=df['final_price'].max() * 2))
+    assert drift['final_price'] > streaming.tolerance and drift['initial_price'] == 0
+    assert streaming.needs_renormalization()
+    streaming.rebase()
+    assert not streaming.needs_renormalization()
+
+def test_feature_matrix(tmp_path):
+    """
+    The feature matrix must contain the columns of data_preprocessing as float32, in a C-contiguous array,
+      and the normalization functions must not change the input DataFrame.
+    """
+    df = pd.read_csv("src/Data_Cleaning/cleaned_data.csv")
+    before = df.copy()
+    expected = Normalizer.normalize_rating(Normalizer.normalize_reviews(Normalizer.normalize_prices(df)))
+    pd.testing.assert_frame_equal(df, before)
+
+    X, asins = Normalizer.feature_matrix(df)
+    assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS'] and X.shape == (len(df), 5)
+    np.testing.assert_allclose(X, expected[Normalizer.FEATURE_COLUMNS].to_numpy(dtype=np.float32), rtol=1e-6)
+    assert list(asins) == list(df['asin'])
+
+    Normalizer.save_feature_matrix(str(tmp_path / "features.npy"), X, asins)
+    loaded, loaded_asins = Normalizer.load_feature_matrix(str(tmp_path / "features.npy"))
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, X)
+    assert list(loaded_asins) == list(asins)
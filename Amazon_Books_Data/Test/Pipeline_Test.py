@@ -0,0 +1,114 @@
+import sys
+import os
+import pytest
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from src.Data_Cleaning import Cleaner, Pipeline, Parallel, Validation
+from src.Load_Data import Loader
+from src.Normalization import Normalizer
+
+def clean_step_by_step(df):
+    #the Cleaner functions called one after the other, without the pipeline
+    Cleaner.delete_columns(df)
+    df = Cleaner.handle_price(df)
+    df = Cleaner.handle_other_columns(df)
+    df = Cleaner.handle_number_of_sellers(df)
+    df = Cleaner.handle_best_sellers_rank(df)
+    df = Cleaner.add_stock_columns(df)
+    df = Cleaner.handle_format(df)
+    df = Cleaner.get_book_format(df)
+    df = Cleaner.handle_book_fomat(df)
+    df = Cleaner.parse_item_weight(df)
+    df = Cleaner.handle_timestamp(df)
+    df = Cleaner.handle_rating(df)
+    df = Cleaner.handle_categories(df)
+    return Cleaner.add_range_columns(df)
+
+def test_clean_file(tmp_path, raw_csv):
+    """
+    The pipeline must produce the same DataFrame of the Cleaner functions called step by step,
+      write it to the output file with the columns of cleaned_data.csv and profile every step.
+    """
+    out_path = str(tmp_path / "cleaned_data.csv")
+    df, profile = Pipeline.clean_file(raw_csv, out_path, category_ranks_path=str(tmp_path / "category_ranks.parquet"))
+
+    expected = clean_step_by_step(Loader.load_raw_dataset(raw_csv))
+    pd.testing.assert_frame_equal(df, expected)
+
+    written = pd.read_csv(out_path)
+    assert list(written.columns) == list(pd.read_csv("src/Data_Cleaning/cleaned_data.csv", nrows=0).columns)
+    assert len(written) == len(df)
+    category_ranks = Normalizer.CategoryRankTable.load(tmp_path / "category_ranks.parquet")
+    assert set(category_ranks.asins) == set(df['asin'])
+
+    steps = [name for name, _, _ in Pipeline.row_steps() + Pipeline.global_steps()]
+    assert profile['step'].tolist() == ['load'] + steps
+    assert (profile['seconds'] >= 0).all()
+    filters = profile[profile['kind'] == 'filter']
+    assert filters['rows_out'].iloc[-1] == len(df)
+    #the memory is measured only if requested
+    assert profile['memory_delta_mb'].isna().all()
+    _, profile = Pipeline.clean_file(raw_csv, None, profile_memory=True)
+    assert profile['memory_delta_mb'].notna().all() and profile['memory_delta_mb'].iloc[0] > 0
+
+@pytest.mark.parametrize("chunksize", [37, 1000])
+def test_clean_file_parallel(tmp_path, raw_csv, chunksize):
+    """
+    The parallel cleaning must produce the same DataFrame of the serial pipeline:
+      the global steps use the statistics merged from all the partitions.
+    """
+    expected, _ = Pipeline.clean_file(raw_csv, None)
+    df, timing = Parallel.clean_file_parallel(raw_csv, str(tmp_path / "cleaned_data.csv"), workers=2, chunksize=chunksize)
+    pd.testing.assert_frame_equal(df, expected)
+    assert timing['partitions'] == -(-200 // chunksize)
+
+    files, _ = Parallel.clean_file_parallel(raw_csv, str(tmp_path / "parts"), workers=2, chunksize=chunksize, partitioned=True)
+    assert len(files) == timing['partitions']
+    written = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    pd.testing.assert_frame_equal(written, expected.reset_index(drop=True))
+    assert sorted(os.listdir(tmp_path / "parts")) == sorted(os.path.basename(f) for f in files)
+
+def test_validation_quarantine(tmp_path, raw_csv, monkeypatch):
+    """
+    The validation rules must reject the rows dropped by handle_price and handle_other_columns,
+      count them by rule and write them with their reason code to the quarantine folder.
+    """
+    raw = Loader.load_raw_dataset(raw_csv)
+    priced = Cleaner.fill_prices(raw.copy())
+    valid = Cleaner.valid_price_mask(priced) & Cleaner.required_columns_mask(priced)
+
+    validator = Validation.Validator(quarantine_dir=str(tmp_path / "quarantine"))
+    df, _ = Pipeline.clean_file(raw_csv, None, validator=validator)
+    assert len(df) == valid.sum()
+    report = validator.report
+    assert report['validated'] == len(raw) and report['rejected'] == (~valid).sum() > 0
+    assert report['missing_price'] == priced[['initial_price', 'final_price', 'discount']].isna().any(axis=1).sum()
+    assert report['missing_brand'] == priced['brand'].isna().sum()
+
+    quarantine = pd.read_parquet(validator.files[0])
+    assert sorted(quarantine.index) == sorted(valid.index[~valid])
+    codes = [code for code, _ in Validation.RULES]
+    assert quarantine['reject_reason'].isin(codes).all()
+    first = quarantine['reject_flags'].map(lambda flags: codes[(flags & -flags).bit_length() - 1])
+    assert (first == quarantine['reject_reason']).all()
+
+    # validators sharing the folder, with a gap left by a deleted file, never overwrite a quarantine file
+    other = Validation.Validator(quarantine_dir=str(tmp_path / "quarantine"))
+    other(priced)
+    validator(priced)
+    os.remove(other.files[0])
+    other(priced)
+    files = validator.files + other.files
+    assert len(set(files)) == len(files) == 4
+    assert all(os.path.exists(f) for f in files if f != other.files[0])
+
+    # a failed write leaves no file in the folder
+    before = sorted(os.listdir(tmp_path / "quarantine"))
+    def failing_to_parquet(self, path, *args, **kwargs):
+        open(path, 'wb').close()
+        raise OSError("disk full")
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', failing_to_parquet)
+    with pytest.raises(OSError):
+        validator(priced)
+    assert sorted(os.listdir(tmp_path / "quarantine")) == before
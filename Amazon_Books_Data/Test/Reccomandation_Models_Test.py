@@ -1,9 +1,13 @@
 import sys
 import os
 import pytest
+import numpy as np
 import pandas as pd
+import umap
+from sklearn.cluster import KMeans
+from sklearn.neighbors import NearestNeighbors
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.Analysis import Reccomandation_Models
+from src.Analysis import Reccomandation_Models, Neighbor_Table, ANN_Index
 from src.Normalization import Normalizer
 from src.Load_Data import Loader
 
@@ -96,4 +100,265 @@ def test_kmeans_reccomender():
 
     assert not result.empty
     assert 'asin' in result.columns
-    
\ No newline at end of file
+    
+
+def reference_kmeans_reccomender(df, inp_asin, num_recs = 5):
+    #original implementation: UMAP and K-Means fitted for each call, distances computed row by row
+    df2 = df.copy()
+    X = df2[['final_price','reviews_normalized', 'main_category','rating_normalized']].values
+    X_umap = umap.UMAP(n_components=2, random_state=42).fit_transform(X)
+    clusters = KMeans(n_clusters=10, random_state=42).fit_predict(X_umap)
+    df2['umap_x'] = X_umap[:, 0]
+    df2['umap_y'] = X_umap[:, 1]
+    df2['cluster'] = clusters
+    book = df[df['asin'] == inp_asin]
+    target_cluster = df2[df2['asin'] == inp_asin]['cluster'].values[0]
+    same_cluster = df2[(df2['cluster'] == target_cluster) & (df2['main_category'] == book['main_category'].values[0])
+                       & (df2['asin'] != inp_asin)].copy()
+    input_coords = df2[df2['asin'] == inp_asin][['umap_x', 'umap_y']].values[0]
+    same_cluster.loc[:, 'distance'] = same_cluster.apply(
+        lambda row: np.linalg.norm([row['umap_x'], row['umap_y']] - input_coords), axis=1)
+    recommended = same_cluster.sort_values('distance').head(num_recs)
+    return recommended[['asin', 'title', 'final_price', 'reviews_count', 'rating', 'main_category']]
+
+def test_kmeans_model(tmp_path):
+    """
+    The recommendations of a saved and loaded KMeansModel must be the ones of the original kmeans_reccomender
+      (same random_state), and an unknown asin must return an empty DataFrame.
+    The model doesn't match the catalog of another dataset version or normalized with other parameters.
+    """
+    raw = Loader.load_dataset(path)
+    df = Reccomandation_Models.data_preprocessing(raw)
+    Reccomandation_Models.fit_kmeans_model(df).save(tmp_path / "kmeans_model.npz")
+    model = Reccomandation_Models.KMeansModel.load(tmp_path / "kmeans_model.npz")
+    assert model.matches(df)
+    assert model.info == {'dataset_version': Loader.dataset_version(path), 'normalizer_params': None}
+    other = df.copy()
+    other.attrs['dataset_version'] = 'other'
+    assert not model.matches(other)
+    assert not model.matches(Reccomandation_Models.data_preprocessing(raw, Normalizer.BookNormalizer().fit(raw)))
+    with pytest.raises(ValueError):
+        Reccomandation_Models.kmeans_reccomender(df.iloc[::-1].reset_index(drop=True), df['asin'].iloc[0], model=model)
+
+    for asin in ["0060244887"] + list(df["asin"].sample(2, random_state=0)):
+        expected = reference_kmeans_reccomender(df, asin, num_recs=5)
+        result = Reccomandation_Models.kmeans_reccomender(df, asin, num_recs=5, model=model)
+        assert list(result['asin']) == list(expected['asin'])
+    assert Reccomandation_Models.kmeans_reccomender(df, 'FAKE_ASIN_NOT_FOUND', model=model).empty
+
+def test_load_normalized_catalog(tmp_path):
+    """
+    The catalog of the server and of the offline job: compact dtypes, the normalizer is fitted and saved once
+      and fitted again when it was saved for another dataset version.
+    """
+    normalizer_path = tmp_path / "normalizer.json"
+    df, normalizer, df_norm = Reccomandation_Models.load_normalized_catalog(path, normalizer_path)
+    assert df['final_price'].dtype == np.float32
+    assert normalizer.version == df.attrs['dataset_version']
+    info = Reccomandation_Models.fit_info(df_norm)
+    assert info['normalizer_params'] is not None
+    assert Reccomandation_Models.fit_info(Reccomandation_Models.load_normalized_catalog(path, normalizer_path)[2]) == info
+
+    Normalizer.BookNormalizer({'rating': 1.0}, 'old').save(normalizer_path)
+    _, normalizer, df_norm = Reccomandation_Models.load_normalized_catalog(path, normalizer_path)
+    assert Reccomandation_Models.fit_info(df_norm) == info
+    assert Normalizer.BookNormalizer.load(normalizer_path).version == df.attrs['dataset_version']
+
+def reference_knn_category_recommender(df, inp_asin, num_recs = 5):
+    #original implementation: a NearestNeighbors model fitted for each call
+    book = df[df['asin'] == inp_asin]
+    category = book['main_category'].iloc[0]
+    same_category_books = df[(df['main_category'] == category) & (df['asin'] != inp_asin)].copy()
+    if same_category_books.empty:
+        return pd.DataFrame(columns=['asin', 'title', 'main_category'])
+    features = ['final_price', 'reviews_normalized']
+    same_category_books = same_category_books.dropna(subset=features).reset_index(drop=True)
+    knn = NearestNeighbors(n_neighbors=min(num_recs, len(same_category_books)), metric='euclidean')
+    knn.fit(same_category_books[features].values)
+    distances, indices = knn.kneighbors(book[features].values)
+    return same_category_books.iloc[indices[0]][['asin', 'title', 'final_price', 'reviews_count', 'main_category']]
+
+def test_knn_category_index():
+    """
+    The recommendations searched in the cached KD-tree of the category must be the ones of the original NearestNeighbors model,
+      the tree of a category is built once for each dataset version.
+    """
+    df = Reccomandation_Models.data_preprocessing(Loader.load_dataset(path))
+    assert df.attrs['dataset_version'] == Loader.dataset_version(path)
+    Reccomandation_Models.category_indexes.data.clear()
+
+    asins = df['asin'].sample(50, random_state=0)
+    for asin in asins:
+        expected = reference_knn_category_recommender(df, asin, num_recs=5)
+        result = Reccomandation_Models.knn_category_recommender(df, asin, num_recs=5)
+        assert list(result['asin']) == list(expected['asin'])
+        assert list(result.columns) == list(expected.columns)
+
+    categories = df.loc[df['asin'].isin(asins), 'main_category'].nunique()
+    assert len(Reccomandation_Models.category_indexes) == categories
+
+    Reccomandation_Models.build_category_indexes(df)
+    assert len(Reccomandation_Models.category_indexes) == df['main_category'].nunique()
+    other = df.copy()
+    other.attrs['dataset_version'] = 'other'
+    Reccomandation_Models.knn_category_recommender(other, asins.iloc[0])
+    assert len(Reccomandation_Models.category_indexes) == df['main_category'].nunique() + 1
+
+    # the derived frames keep df.attrs but not the row positions of df
+    for derived in [df.iloc[::-1].reset_index(drop=True), df[df['rating'] > 4.5]]:
+        for asin in derived['asin'].sample(10, random_state=0):
+            expected = reference_knn_category_recommender(derived, asin, num_recs=5)
+            assert list(Reccomandation_Models.knn_category_recommender(derived, asin, 5)['asin']) == list(expected['asin'])
+
+def test_asin_index():
+    """
+    The AsinIndex maps each asin to the position of its first row and it's built once for each dataset version,
+      the recommenders find the books with the index and don't change the dataframe.
+    """
+    df = Reccomandation_Models.data_preprocessing(Loader.load_dataset(path))
+    Reccomandation_Models.asin_indexes.data.clear()
+    index = Reccomandation_Models.asin_index(df)
+    assert Reccomandation_Models.asin_index(df) is index
+    assert len(Reccomandation_Models.asin_indexes) == 1
+
+    asins = df['asin'].to_numpy()
+    for asin in df['asin'].sample(50, random_state=0):
+        assert index.get(asin) == np.flatnonzero(asins == asin)[0]
+    assert 'not an asin' not in index
+    assert index.get('not an asin') is None
+    assert len(index) == df['asin'].nunique()
+
+    # the derived frames keep df.attrs but not the row positions of df
+    reversed_df = df.iloc[::-1].reset_index(drop=True)
+    reversed_index = Reccomandation_Models.asin_index(reversed_df)
+    assert reversed_index is not index
+    asin = reversed_df['asin'].iloc[0]
+    assert reversed_index.get(asin) == np.flatnonzero(reversed_df['asin'].to_numpy() == asin)[0]
+    result = Reccomandation_Models.filter_by_category(reversed_df, asin)
+    assert asin not in set(result['asin'])
+    assert (result['main_category'] == reversed_df['main_category'].iloc[0]).all()
+
+    before = df.copy()
+    asin = df['asin'].iloc[0]
+    Reccomandation_Models.filter_by_category(df, asin)
+    Reccomandation_Models.knn_category_recommender(df, asin)
+    pd.testing.assert_frame_equal(df, before)
+
+def test_top_k():
+    """
+    top_k must return the positions of the stable argsort of the distances, also with ties at the k-th distance.
+    """
+    rng = np.random.default_rng(0)
+    for distances in [rng.random(1000), rng.integers(0, 5, 1000).astype(float), np.zeros(10)]:
+        for k in [0, 1, 5, 10, 1000, 2000]:
+            expected = np.argsort(distances, kind='stable')[:k]
+            assert np.array_equal(Reccomandation_Models.top_k(distances, k), expected)
+
+    X = rng.random((100, 2))
+    point = rng.random(2)
+    assert np.allclose(Reccomandation_Models.squared_distances(X, point), np.linalg.norm(X - point, axis=1) ** 2)
+
+def test_neighbor_table(tmp_path):
+    """
+    The materialized tables of the offline job(Neighbor_Table.build_neighbor_table) must return the recommendations
+      of the functions of the models for every asin, computed with a pool of processes and after a save/load.
+    """
+    df = Reccomandation_Models.data_preprocessing(Loader.load_dataset(path))
+    model = Reccomandation_Models.fit_kmeans_model(df)
+    table = Neighbor_Table.build_neighbor_table(df, model, num_recs=5, workers=2)
+    table.save(tmp_path / "neighbor_table.npz")
+    loaded = Neighbor_Table.NeighborTable.load(tmp_path / "neighbor_table.npz")
+    assert loaded.matches(df) and loaded.num_recs == 5
+    other = df.copy()
+    other.attrs['normalizer_params'] = '{}'
+    assert not loaded.matches(other)
+    for name in Neighbor_Table.MODEL_COLUMNS:
+        assert loaded.tables[name].dtype == Neighbor_Table.NEIGHBOR_DTYPE
+        assert np.array_equal(loaded.tables[name], table.tables[name])
+
+    for asin in df['asin'].sample(50, random_state=0):
+        expected = {
+            'filter_by_category': Reccomandation_Models.filter_by_category(df, asin, 5),
+            'knn_category_recommender': Reccomandation_Models.knn_category_recommender(df, asin, 5),
+            'kmeans_reccomender': Reccomandation_Models.kmeans_reccomender(df, asin, 5, model),
+        }
+        for name, result in expected.items():
+            recommended = loaded.recommend(df, name, asin, 5)
+            assert list(recommended['asin']) == list(result['asin'])
+            # the functions return fewer columns when there are no recommendations
+            if len(result):
+                assert list(recommended.columns) == list(result.columns)
+        distances = loaded.neighbors('kmeans_reccomender', asin)['score']
+        assert (np.diff(distances) >= 0).all()
+    assert len(loaded.neighbors('knn_category_recommender', 'not an asin')) == 0
+
+def test_batch_recommenders():
+    """
+    The batch recommenders must return, for each input asin, the recommendations of the single-asin functions in rank order,
+      the unknown asins are skipped and the repeated ones are recommended once.
+    """
+    df = Reccomandation_Models.data_preprocessing(Loader.load_dataset(path))
+    model = Reccomandation_Models.fit_kmeans_model(df)
+    asins = list(df['asin'].sample(50, random_state=1)) + ['not an asin']
+    asins += asins[:5]
+    batches = {
+        Reccomandation_Models.filter_by_category: Reccomandation_Models.batch_filter_by_category(df, asins, 5),
+        Reccomandation_Models.knn_category_recommender: Reccomandation_Models.batch_knn_category_recommender(df, asins, 5),
+        lambda df, asin, num_recs: Reccomandation_Models.kmeans_reccomender(df, asin, num_recs, model):
+            Reccomandation_Models.batch_kmeans_reccomender(df, asins, 5, model),
+    }
+    for single, batch in batches.items():
+        assert list(batch.columns[:2]) == ['query_asin', 'rank']
+        assert list(pd.unique(batch['query_asin'])) == [a for a in pd.unique(pd.Series(asins)) if a in set(batch['query_asin'])]
+        for asin in asins[:50]:
+            rows = batch[batch['query_asin'] == asin]
+            assert list(rows['asin']) == list(single(df, asin, num_recs=5)['asin'])
+            assert list(rows['rank']) == list(range(len(rows)))
+    assert Reccomandation_Models.batch_knn_category_recommender(df, ['not an asin']).empty
+    with pytest.raises(ValueError):
+        Reccomandation_Models.batch_kmeans_reccomender(df.iloc[::-1].reset_index(drop=True), asins, 5, model)
+
+def test_lsh_index(tmp_path):
+    """
+    The LSHIndex built with incremental inserts must be the index built at once and it must be the same after a save/load,
+      the recall of the neighbors of the exact search grows with the probed tables,
+      with buckets larger than the features the approximate recommendations are the ones of knn_category_recommender.
+    """
+    rng = np.random.default_rng(0)
+    X = rng.random((20_000, 2))
+    labels = rng.integers(0, 5, len(X))
+    index = ANN_Index.LSHIndex(2, tables=8, width=0.05)
+    assert list(index.insert(X[:5_000], labels[:5_000])) == list(range(5_000))
+    index.insert(X[5_000:], labels[5_000:])
+    bulk = ANN_Index.LSHIndex(2, tables=8, width=0.05)
+    bulk.insert(X, labels)
+    assert np.array_equal(index.keys, bulk.keys)
+
+    index.save(tmp_path / "lsh.npz")
+    loaded = ANN_Index.LSHIndex.load(tmp_path / "lsh.npz")
+    recalls = []
+    for probes in [1, 8]:
+        recall = 0
+        for q in range(100):
+            same = np.flatnonzero(labels == labels[q])
+            expected = same[NearestNeighbors(n_neighbors=10).fit(X[same]).kneighbors(X[q:q + 1], return_distance=False)[0]]
+            ids, distances = loaded.query(X[q], 10, labels[q], probes)
+            assert (labels[ids] == labels[q]).all() and (np.diff(distances) >= 0).all()
+            assert np.array_equal(ids, index.query(X[q], 10, labels[q], probes)[0])
+            recall += len(np.intersect1d(ids, expected)) / 10
+        recalls.append(recall / 100)
+    assert recalls[0] < recalls[1] and recalls[1] >= 0.95
+
+    df = Reccomandation_Models.data_preprocessing(Loader.load_dataset(path))
+    for asin in df['asin'].sample(50, random_state=0):
+        expected = Reccomandation_Models.knn_category_recommender(df, asin, 5)
+        result = ANN_Index.ann_category_recommender(df, asin, 5, index=ANN_Index.ann_index(df, width=100.0))
+        assert list(result['asin']) == list(expected['asin'])
+    assert ANN_Index.ann_category_recommender(df, 'not an asin').empty
+
+    # with every asin repeated, the recommendations are still num_recs distinct asins different from the input
+    doubled = pd.concat([df, df], ignore_index=True)
+    for asin in df['asin'].sample(20, random_state=1):
+        expected = Reccomandation_Models.knn_category_recommender(df, asin, 5)
+        result = ANN_Index.ann_category_recommender(doubled, asin, 5, index=ANN_Index.ann_index(doubled, width=100.0))
+        assert list(result['asin']) == list(expected['asin'])
@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+"""
+Shared fixtures: a small synthetic raw dataset with the same columns and value formats
+  of Amazon_popular_books_dataset.csv (the raw file is not part of the repository).
+"""
+
+FORMATS = ['Kindle', 'Hardcover', 'Paperback', 'Audiobook', 'Spiral-bound']
+CATEGORIES = [["Books", "Literature & Fiction", "Mythology & Folk Tales"],
+              ["Books", "Children's Books", "Literature & Fiction"],
+              ["Books", "History"],
+              ["Books"]]
+AVAILABILITY = ['In Stock.', 'Only 3 left in stock - order soon.', 'Only 12 left in stock (more on the way).',
+                'Temporarily out of stock.', 'This title will be released on March 1, 2022.',
+                'Usually ships within 2 to 3 weeks.', None]
+WEIGHTS = ['1.2 pounds', '14.4 ounces', '2.05 Pounds', '350 grams', None, 'unknown']
+
+def make_raw_dataset(n = 200, seed = 0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        formats = [{"name": FORMATS[(i + j) % len(FORMATS)], "price": f"${rng.uniform(2, 50):.2f}", "url": f"/book-{i}-{j}/dp/{i:010d}"}
+                   for j in range(1 + i % 3)]
+        bsr = [{"category": f"Books/Category {(i + j) % 7}", "rank": int(rng.integers(1, 5000))} for j in range(1 + i % 3)]
+        initial = round(float(rng.uniform(5, 60)), 2)
+        final = round(initial * float(rng.uniform(0.3, 1.0)), 2)
+        rows.append({
+            'asin': f"{i:010d}",
+            'brand': f"Author {i % 17}" if i % 41 else None,
+            'currency': 'USD',
+            'discount': round(initial - final, 2) if i % 13 else None,
+            'final_price': final if i % 29 else -1,
+            'images_count': int(rng.integers(0, 10)),
+            'initial_price': initial if i % 11 else None,
+            'item_weight': WEIGHTS[i % len(WEIGHTS)],
+            'rating': f"{rng.choice([3.9, 4.5, 4.8]):.1f} out of 5 stars",
+            'reviews_count': int(rng.integers(10000, 200000)),
+            'root_bs_rank': float(rng.integers(1, 100000)) if i % 37 else None,
+            'seller_id': f"S{i % 5}",
+            'seller_name': f"Seller {i % 5}",
+            'timestamp': f"2021-12-21T23:{i % 60:02d}:19.000Z",
+            'title': f"Title {i}",
+            'video_count': 0,
+            'categories': json.dumps(CATEGORIES[i % len(CATEGORIES)]),
+            'number_of_sellers': float(rng.integers(1, 20)) if i % 5 else None,
+            'best_sellers_rank': json.dumps(bsr) if i % 31 else None,
+            'format': json.dumps(formats) if i % 23 else None,
+            'availability': AVAILABILITY[i % len(AVAILABILITY)],
+            'description': "long text " * 20,
+            'features': json.dumps(["feature"] * 5),
+            'url': f"https://www.amazon.com/dp/{i:010d}",
+        })
+    return pd.DataFrame(rows)
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    #path of a synthetic raw dataset written to a temporary folder
+    path = tmp_path / "Amazon_popular_books_dataset.csv"
+    make_raw_dataset().to_csv(path, index=False)
+    return str(path)
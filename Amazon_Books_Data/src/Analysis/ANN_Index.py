@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from src.Analysis.Reccomandation_Models import (KNN_FEATURES, asin_index, _dataset_key, category_index, squared_distances, top_k)
+from src.Data_Cleaning.Memoizer import LRUCache
+
+"""
+This module provides an approximate nearest neighbor(ANN) search for the content-based recommenders,
+  for catalogs too large for an exact search in each category(knn_category_recommender).
+
+The index is a random projection LSH for the euclidean distance(p-stable LSH): each of the 'tables' hash tables
+  projects a vector on 'projections' random gaussian directions and cuts each projection in buckets of size 'width',
+  so near vectors fall in the same bucket of a table with high probability.
+The label of a vector(the category of the book) is part of the key of its bucket, so a query only finds vectors with its label.
+A query reads the bucket of the vector in the first 'probes' tables and sorts the candidates by their exact distance:
+  'probes' is the recall/latency knob, more tables probed find more true neighbors and read more candidates.
+
+Each table is a sorted array of bucket keys with the ids of the vectors, a bucket is found with np.searchsorted
+  and new vectors are merged in the sorted arrays(incremental insert), the index is saved to a .npz file.
+
+- LSHIndex: the index, with insert / query / save / load.
+- ann_index: LSHIndex of the features of knn_category_recommender, built once for each dataset.
+- ann_category_recommender: knn_category_recommender with the approximate search.
+"""
+
+class LSHIndex:
+    """
+    Random projection LSH index of vectors with an optional integer label, the ids are the insertion order.
+
+    Attributes:
+        tables (int): number of hash tables.
+        projections (int): random projections of each table.
+        width (float): size of the buckets of a projection, about 2 times the distance of the k-th neighbor
+                       (a larger width finds more true neighbors and reads more candidates).
+        X (np.ndarray): the vectors inserted(vectors x dim).
+        labels (np.ndarray): label of each vector.
+        keys, ids (np.ndarray): sorted bucket keys of each table and the ids of their vectors(tables x vectors).
+    """
+    def __init__(self, dim, tables = 8, projections = 2, width = 0.05, seed = 0):
+        rng = np.random.default_rng(seed)
+        self.tables = tables
+        self.projections = projections
+        self.width = width
+        self.directions = rng.normal(size=(tables, dim, projections))
+        self.offsets = rng.uniform(0, width, size=(tables, projections))
+        # odd multipliers to mix the bucket coordinates and the label in a 64 bit key
+        self.mix = rng.integers(1, 2**62, size=projections + 1, dtype=np.uint64) | np.uint64(1)
+        self.X = np.empty((0, dim))
+        self.labels = np.empty(0, dtype=np.int64)
+        self.keys = np.empty((tables, 0), dtype=np.int64)
+        self.ids = np.empty((tables, 0), dtype=np.int64)
+
+    def _keys(self, X, labels):
+        #bucket key of each vector in each table(tables x vectors)
+        buckets = np.floor((np.einsum('nd,tdp->tnp', X, self.directions) + self.offsets[:, None, :]) / self.width)
+        coordinates = np.concatenate([buckets.astype(np.int64), np.broadcast_to(labels[None, :, None], buckets.shape[:2] + (1,))], axis=2)
+        return (coordinates.astype(np.uint64) * self.mix).sum(axis=2).view(np.int64)
+
+    def insert(self, X, labels = None):
+        """
+        Add vectors to the index, the keys of the new vectors are merged in the sorted tables.
+
+        Args:
+            X (np.ndarray): vectors(vectors x dim).
+            labels (np.ndarray, optional): integer label of each vector. Defaults to 0 for all the vectors.
+
+        Returns:
+            np.ndarray: the ids of the new vectors.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        labels = np.zeros(len(X), dtype=np.int64) if labels is None else np.asarray(labels, dtype=np.int64)
+        ids = np.arange(len(self.X), len(self.X) + len(X))
+        keys = self._keys(X, labels)
+        order = np.argsort(keys, axis=1, kind='stable')
+        new_keys = np.take_along_axis(keys, order, axis=1)
+        new_ids = ids[order]
+        # positions of the new keys in the sorted keys of each table, after the equal keys
+        positions = [np.searchsorted(self.keys[t], new_keys[t], side='right') for t in range(self.tables)]
+        self.keys = np.stack([np.insert(self.keys[t], positions[t], new_keys[t]) for t in range(self.tables)])
+        self.ids = np.stack([np.insert(self.ids[t], positions[t], new_ids[t]) for t in range(self.tables)])
+        self.X = np.concatenate([self.X, X])
+        self.labels = np.concatenate([self.labels, labels])
+        return ids
+
+    def query(self, x, k = 5, label = 0, probes = None):
+        """
+        Approximate k nearest neighbors of a vector among the vectors with the same label.
+
+        Args:
+            x (np.ndarray): the vector.
+            k (int, optional): number of neighbors. Defaults to 5.
+            label (int, optional): label of the neighbors. Defaults to 0.
+            probes (int, optional): number of tables read, from 1 to 'tables'. Defaults to all the tables.
+
+        Returns:
+            tuple: (ids, distances) of at most k neighbors, sorted by distance.
+        """
+        x = np.asarray(x, dtype=float).reshape(1, -1)
+        probes = self.tables if probes is None else min(probes, self.tables)
+        keys = self._keys(x, np.array([label], dtype=np.int64))[:probes, 0]
+        starts = [np.searchsorted(self.keys[t], keys[t], side='left') for t in range(probes)]
+        ends = [np.searchsorted(self.keys[t], keys[t], side='right') for t in range(probes)]
+        candidates = np.unique(np.concatenate([self.ids[t, s:e] for t, s, e in zip(range(probes), starts, ends)]))
+        candidates = candidates[self.labels[candidates] == label]
+        distances = squared_distances(self.X[candidates], x[0])
+        nearest = top_k(distances, k)
+        return candidates[nearest], np.sqrt(distances[nearest])
+
+    def save(self, path):
+        np.savez(path, X=self.X, labels=self.labels, keys=self.keys, ids=self.ids, directions=self.directions,
+                 offsets=self.offsets, mix=self.mix, width=self.width)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tables, dim, projections = data['directions'].shape
+            index = cls(dim, tables, projections, float(data['width']))
+            for name in ['X', 'labels', 'keys', 'ids', 'directions', 'offsets', 'mix']:
+                setattr(index, name, data[name])
+            return index
+
+# LSHIndex of the datasets, keyed by dataset key(Reccomandation_Models._dataset_key), see ann_index
+ann_indexes = LRUCache(maxsize = 4)
+
+def ann_index(df, tables = 8, projections = 2, width = 0.05):
+    """
+    LSHIndex of the features of knn_category_recommender(KNN_FEATURES) with the category of each book as label,
+      built once for each dataset(the key of its rows). The ids of the index are the row positions of df, books with missing features are not inserted.
+
+    Args:
+        df (pd.DataFrame): normalized dataset.
+        tables, projections, width: parameters of the LSHIndex.
+
+    Returns:
+        tuple: (LSHIndex, row position of each id of the index)
+    """
+    key = (_dataset_key(df), tables, projections, width)
+    found, value = ann_indexes.lookup(key)
+    if not found:
+        X = df[KNN_FEATURES].to_numpy(dtype=float)
+        positions = np.flatnonzero(~np.isnan(X).any(axis=1))
+        index = LSHIndex(X.shape[1], tables, projections, width)
+        index.insert(X[positions], df['main_category'].to_numpy()[positions])
+        value = (index, positions)
+        ann_indexes.store(key, value)
+    return value
+
+def ann_category_recommender(df, inp_asin, num_recs = 5, probes = None, index = None):
+    """
+    knn_category_recommender with the approximate search of an LSHIndex: the books of the same category near to the given one
+      in the space of the normalized final price and reviews count, the exact distances are computed only for the candidates of the index.
+    The index is queried for more neighbors until num_recs distinct asins different from the input are found(the rows of an asin
+      can be repeated in the catalog), if the candidates of the index are not enough(e.g. the book has missing features
+      and its bucket is empty) the neighbors are searched among all the books of the category(exact search).
+
+    Args:
+        df (pd.DataFrame): A DataFrame containing normalized book data.
+        inp_asin (str): input asin code.
+        num_recs (int, optional): number of reccomended books to return.
+        probes (int, optional): number of hash tables read, fewer tables are faster and find less true neighbors. Defaults to all the tables.
+        index (tuple, optional): (LSHIndex, row positions of its ids) of df, e.g. a loaded index with new books inserted.
+                                 Defaults to ann_index(df).
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the recommended books with the columns of knn_category_recommender.
+    """
+    columns = ['asin', 'title', 'final_price', 'reviews_count', 'main_category']
+    position = asin_index(df).get(inp_asin)
+    if position is None:
+        print(f"{inp_asin} not found")
+        return pd.DataFrame(columns=columns)
+    index, positions = index or ann_index(df)
+    x = df[KNN_FEATURES].iloc[position].to_numpy(dtype=float)
+    asins = df['asin'].to_numpy()
+    category = df['main_category'].iloc[position]
+
+    def distinct(neighbors):
+        #the nearest row of each asin different from the input, in order of distance
+        neighbors = neighbors[asins[neighbors] != inp_asin]
+        return neighbors[np.sort(np.unique(asins[neighbors], return_index=True)[1])][:num_recs]
+
+    # the input book is one of its own neighbors, it's searched one more time
+    k = num_recs + 1
+    while True:
+        ids, _ = index.query(x, k, category, probes)
+        neighbors = distinct(positions[ids])
+        if len(neighbors) == num_recs or len(ids) < k:
+            break
+        k *= 2
+    if len(neighbors) < num_recs:
+        _, books, _ = category_index(df, category)
+        neighbors = distinct(books[top_k(squared_distances(df[KNN_FEATURES].to_numpy(dtype=float)[books], x), len(books))])
+    return df.iloc[neighbors][columns]
@@ -0,0 +1,237 @@
+import sys
+import os
+import argparse
+import time
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.Analysis import Reccomandation_Models
+from src.Analysis.Reccomandation_Models import (AsinIndex, KNN_FEATURES, KMeansModel, fit_kmeans_model, load_normalized_catalog,
+                                                fit_info, popularity_neighbors, distance_neighbors)
+
+"""
+This module provides the offline job that materializes the top-N recommendations of every book for every model
+  (filter_by_category, knn_category_recommender, kmeans_reccomender), so serving a recommendation is a slice of an array.
+
+All the models recommend books of the same category, so the job is split by category and the categories are computed
+  by a pool of processes(ProcessPoolExecutor). The workers are started with 'spawn': a child forked after the UMAP fit
+  inherits the locks of the numba/OpenMP threads and the pool can deadlock. In a category the neighbors of a block of books are computed at once
+  (Reccomandation_Models.popularity_neighbors and Reccomandation_Models.distance_neighbors):
+   - filter_by_category: the books of the category are sorted once by popularity, the recommendations of each book
+                         are the first books of that order with a different asin.
+   - knn_category_recommender / kmeans_reccomender: the distances between a block of books and all the books of the category
+                         are one broadcast NumPy operation(block x books), the nearest ones are selected with np.argpartition.
+
+The result of each model is a structured array of NEIGHBOR_DTYPE records (asin_code, rank, neighbor_code, score) sorted by
+  asin_code and rank, the codes are row positions of the catalog:
+   score is the main_rank of the recommended book for filter_by_category, the euclidean distance for the other models.
+
+- build_neighbor_table: compute the tables of all the models for a normalized catalog(data_preprocessing).
+- NeighborTable: the tables with the asins of the catalog, saved to a .npz file and read by the serving processes.
+
+The job loads and normalizes the catalog as the server(Reccomandation_Models.load_normalized_catalog) and saves the model
+  and the table in the files read by App/Server.py(model_path, table_path), so the server starts without computing them.
+
+Usage(from the folder Amazon_Books_Data):
+    python src/Analysis/Neighbor_Table.py src/Data_Cleaning/cleaned_data.csv src/Analysis/neighbor_table.npz --num-recs 10 --workers 8
+"""
+
+# files of the KMeansModel and of the NeighborTable read by the server
+model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kmeans_model.npz')
+table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neighbor_table.npz')
+
+NEIGHBOR_DTYPE = np.dtype([('asin_code', '<i4'), ('rank', '<u2'), ('neighbor_code', '<i4'), ('score', '<f4')])
+
+"""
+Columns returned by each model, the table of a model returns the same columns of the function.
+"""
+MODEL_COLUMNS = {
+    'filter_by_category': ['asin', 'title', 'rating', 'main_category'],
+    'knn_category_recommender': ['asin', 'title', 'final_price', 'reviews_count', 'main_category'],
+    'kmeans_reccomender': ['asin', 'title', 'final_price', 'reviews_count', 'rating', 'main_category'],
+}
+
+def _records(positions, query, rank, neighbor, score):
+    #NEIGHBOR_DTYPE records of the recommendations of a category, the local positions are mapped to the catalog rows
+    records = np.empty(len(query), dtype=NEIGHBOR_DTYPE)
+    records['asin_code'] = positions[query]
+    records['rank'] = rank
+    records['neighbor_code'] = positions[neighbor]
+    records['score'] = score
+    return records
+
+def category_neighbors(task):
+    """
+    Worker: the recommendations of all the models for the books of a category.
+
+    Args:
+        task (dict): arrays of the category(category_tasks), the local positions of the queries and num_recs.
+
+    Returns:
+        dict: model name -> NEIGHBOR_DTYPE records of the category.
+    """
+    positions, asin_codes, queries, num_recs = task['positions'], task['asin_codes'], task['queries'], task['num_recs']
+    result = {}
+    if 'popularity' in task:
+        rank, reviews, rating = task['popularity']
+        order = np.lexsort((-rating, -reviews, rank))
+        query, ranks, neighbor = popularity_neighbors(order, asin_codes, queries, num_recs)
+        result['filter_by_category'] = _records(positions, query, ranks, neighbor, rank[neighbor])
+    if 'knn' in task:
+        result['knn_category_recommender'] = _records(positions, *distance_neighbors(
+            task['knn'], asin_codes, np.zeros(len(positions), dtype=np.int8), queries, num_recs))
+    if 'kmeans' in task:
+        embedding, labels = task['kmeans']
+        result['kmeans_reccomender'] = _records(positions, *distance_neighbors(
+            embedding, asin_codes, labels, queries, num_recs))
+    return result
+
+def category_tasks(df, queries, num_recs, model = None, models = tuple(MODEL_COLUMNS)):
+    """
+    Split the catalog by category: one task(category_neighbors) for each category with at least one query.
+
+    Args:
+        df (pd.DataFrame): normalized catalog.
+        queries (np.ndarray): boolean mask of the rows to recommend for.
+        num_recs (int): number of recommendations of each book.
+        model (KMeansModel, optional): model fitted on df, needed by 'kmeans_reccomender'. Defaults to None.
+        models (iterable, optional): names of the models. Defaults to all the models.
+
+    Returns:
+        list: the tasks.
+    """
+    asin_codes = pd.factorize(df['asin'])[0]
+    columns = {}
+    if 'filter_by_category' in models:
+        columns['popularity'] = [df[col].to_numpy(dtype=float) for col in ['main_rank', 'reviews_count', 'rating']]
+    if 'knn_category_recommender' in models:
+        columns['knn'] = df[KNN_FEATURES].to_numpy(dtype=float)
+    if 'kmeans_reccomender' in models:
+        columns['kmeans'] = (np.asarray(model.embedding, dtype=float), model.labels)
+
+    tasks = []
+    for positions in df.groupby('main_category', sort=False).indices.values():
+        local = np.flatnonzero(queries[positions])
+        if not len(local):
+            continue
+        task = {'positions': positions, 'asin_codes': asin_codes[positions], 'queries': local, 'num_recs': num_recs}
+        for name, values in columns.items():
+            if name == 'popularity':
+                task[name] = [v[positions] for v in values]
+            elif name == 'kmeans':
+                task[name] = (values[0][positions], values[1][positions])
+            else:
+                task[name] = values[positions]
+        tasks.append(task)
+    return tasks
+
+def run_tasks(tasks, workers = None):
+    #run category_neighbors on the tasks with a pool of processes(in this process if workers is 1), the records of each model are concatenated
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        results = [category_neighbors(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(category_neighbors, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    names = results[0].keys() if results else []
+    return {name: np.concatenate([r[name] for r in results]) for name in names}
+
+def build_neighbor_table(df, model = None, num_recs = 10, workers = None):
+    """
+    Offline job: the top num_recs recommendations of every asin of the catalog for every model.
+    The recommendations of an asin are the ones of the first row of the asin, as for the functions of Reccomandation_Models.
+
+    Args:
+        df (pd.DataFrame): normalized catalog(data_preprocessing).
+        model (KMeansModel, optional): UMAP + K-Means model fitted on df, if None it's fitted(fit_kmeans_model). Defaults to None.
+        num_recs (int, optional): number of recommendations of each asin. Defaults to 10.
+        workers (int, optional): number of processes. Defaults to os.cpu_count().
+
+    Returns:
+        NeighborTable: the tables of the models.
+    """
+    if model is None:
+        model = fit_kmeans_model(df)
+    elif not model.matches(df):
+        raise ValueError("The K-Means model was not fitted on the catalog")
+    queries = np.zeros(len(df), dtype=bool)
+    queries[list(Reccomandation_Models.asin_index(df).positions.values())] = True
+    tables = run_tasks(category_tasks(df, queries, num_recs, model), workers)
+    return NeighborTable(df['asin'], {name: tables.get(name, np.empty(0, dtype=NEIGHBOR_DTYPE)) for name in MODEL_COLUMNS},
+                         num_recs, fit_info(df))
+
+class NeighborTable:
+    """
+    Materialized recommendations of a catalog(build_neighbor_table): for each model a NEIGHBOR_DTYPE array
+      sorted by asin_code and rank, with the offsets of the records of each asin, so a lookup is a slice of the array.
+
+    Attributes:
+        asins (np.ndarray): asin of each row of the catalog, the codes of the tables are positions in this array.
+        tables (dict): model name -> NEIGHBOR_DTYPE array.
+        num_recs (int): number of recommendations computed for each asin.
+        info (dict): version of the dataset and parameters of the normalizer of the catalog(Reccomandation_Models.fit_info).
+        index (AsinIndex): asin -> position of its first row.
+    """
+    def __init__(self, asins, tables, num_recs, info = None):
+        self.asins = np.asarray(asins, dtype=object)
+        self.num_recs = int(num_recs)
+        self.info = info if info is not None else {'dataset_version': None, 'normalizer_params': None}
+        self.index = AsinIndex(self.asins)
+        self.tables, self.offsets = {}, {}
+        for name, table in tables.items():
+            table = table[np.lexsort((table['rank'], table['asin_code']))]
+            self.tables[name] = table
+            self.offsets[name] = np.searchsorted(table['asin_code'], np.arange(len(self.asins) + 1))
+
+    def neighbors(self, name, inp_asin, num_recs = None):
+        """
+        Records of the recommendations of an asin for a model, in rank order.
+        Returns an empty array if the asin is unknown or it has no recommendations.
+        """
+        position = self.index.get(inp_asin)
+        if position is None:
+            return self.tables[name][:0]
+        start, end = self.offsets[name][position], self.offsets[name][position + 1]
+        return self.tables[name][start:end][:num_recs]
+
+    def recommend(self, df, name, inp_asin, num_recs = 5):
+        #recommendations of the model as returned by its function, df is the catalog of the table
+        return df.iloc[self.neighbors(name, inp_asin, num_recs)['neighbor_code']][MODEL_COLUMNS[name]]
+
+    def matches(self, df):
+        #check that the table was computed on the rows of df, with the same dataset version and normalizer
+        return (self.info == fit_info(df) and len(df) == len(self.asins)
+                and (df['asin'].to_numpy(dtype=object) == self.asins).all())
+
+    def save(self, path):
+        np.savez(path, asins=self.asins.astype(str), num_recs=self.num_recs, info=json.dumps(self.info), **self.tables)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tables = {name: data[name] for name in MODEL_COLUMNS if name in data}
+            # the files saved without 'info' don't match any catalog, so the table is computed again
+            info = json.loads(str(data['info'])) if 'info' in data else {}
+            return cls(data['asins'].astype(object), tables, data['num_recs'], info)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute the top-N recommendations of every book for every model.")
+    parser.add_argument('cleaned_path')
+    parser.add_argument('out_path', nargs='?', default=table_path)
+    parser.add_argument('--num-recs', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--model', default=model_path, help="KMeansModel .npz file, fitted if missing or stale")
+    args = parser.parse_args()
+
+    _, _, df_norm = load_normalized_catalog(args.cleaned_path)
+    model = KMeansModel.load(args.model) if os.path.exists(args.model) else None
+    if model is None or not model.matches(df_norm):
+        model = fit_kmeans_model(df_norm)
+        model.save(args.model)
+    start = time.perf_counter()
+    table = build_neighbor_table(df_norm, model, args.num_recs, args.workers)
+    table.save(args.out_path)
+    print({name: len(t) for name, t in table.tables.items()}, f"{time.perf_counter() - start:.2f} seconds")
@@ -1,10 +1,16 @@
 #import hdbscan
+import hashlib
+import json
+import os
+import weakref
 import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
-from sklearn.neighbors import NearestNeighbors
+from sklearn.neighbors import KDTree
 import umap
 from src.Normalization import Normalizer
+from src.Load_Data import Loader
+from src.Data_Cleaning.Memoizer import LRUCache
 
 """
 The file contains 3 book recommendation models based only on numerical and categorical features of the books in the dataset(content-based)
@@ -28,6 +34,10 @@ because the dataset does not contain user-book interaction data.
                             This model first applies UMAP to reduce the dimensional data (price, reviews, category) to 2D and then K-Means
                                to group them into clusters, then it searches for books in the same cluster and category as the input, excluding the given book.
                             Finally, it returns the closest ones to the input in the new UMAP space as recommendations.
+
+* 'batch_*':                The batch variants of the 3 models(batch_filter_by_category, batch_knn_category_recommender, batch_kmeans_reccomender)
+                              take an array of asin codes and compute the recommendations of all the books of a category at once,
+                              the result is one long-form DataFrame(query_asin, rank, columns of the recommended book, score).
                            
                                 
 * 'notes': I'm not gonna delete outlier values for the columns that i've used in the models because statistically these values are outlier but can be interpreted
@@ -39,12 +49,77 @@ because the dataset does not contain user-book interaction data.
            but there are no books with a negative final price, a final price of $0 or books with an incredibly high price (e.g. $1000)
            that would represent true outlier values in that case.
 """
+"""
+Columns of the normalized dataset used by knn_category_recommender.
+"""
+KNN_FEATURES = ['final_price', 'reviews_normalized']
+
+# KD-trees of the categories, keyed by (dataset key, category), see category_index
+category_indexes = LRUCache(maxsize = 10_000)
+
+# id of a DataFrame -> (weak reference to it, hash of its rows), see _dataset_key
+_row_hashes = {}
+
+def _rows_hash(df):
+    #hash of the rows used by the models in their order, computed once for each DataFrame object
+    #the cleaned dataset(filter_by_category) has no normalized features, only the columns of df are hashed
+    entry = _row_hashes.get(id(df))
+    if entry is None or entry[0]() is not df:
+        columns = [col for col in ['asin', 'main_category'] + KNN_FEATURES if col in df.columns]
+        hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+        key = id(df)
+        # the entry is removed when the DataFrame is deleted, so its id can be reused by another one
+        entry = (weakref.ref(df, lambda _: _row_hashes.pop(key, None)), hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest())
+        _row_hashes[key] = entry
+    return entry[1]
+
+def _dataset_key(df):
+    """
+    Key of the structures cached for a dataset(AsinIndex, KD-trees, LSH index), they store row positions of df:
+      (version of the file in df.attrs['dataset_version'](Loader.load_dataset) or None, hash of the rows of df).
+    pandas copies attrs to the frames derived from df(slices, filters, reset_index), so the version alone
+      doesn't identify the rows: the hash of the rows is part of the key.
+    """
+    return (df.attrs.get('dataset_version'), _rows_hash(df))
+
+class AsinIndex:
+    """
+    Hash index of the asin codes of a dataset: asin -> position of its first row, so a book is found in O(1)
+      instead of comparing the whole column 'asin' with the input code.
+    """
+    def __init__(self, asins):
+        asins = np.asarray(asins, dtype=object)
+        # reversed, so the position of the first row of an asin is the last one written
+        self.positions = dict(zip(asins[::-1], range(len(asins) - 1, -1, -1)))
+
+    def get(self, asin):
+        #position of the first row of the asin, None if the asin is not in the dataset
+        return self.positions.get(asin)
+
+    def __contains__(self, asin):
+        return asin in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+# AsinIndex of the datasets, keyed by dataset key, see asin_index
+asin_indexes = LRUCache(maxsize = 16)
+
+def asin_index(df):
+    #AsinIndex of the dataset, built once for each dataset key(_dataset_key) and shared by all the recommenders
+    key = _dataset_key(df)
+    found, index = asin_indexes.lookup(key)
+    if not found:
+        index = AsinIndex(df['asin'])
+        asin_indexes.store(key, index)
+    return index
+
 def filter_by_category(df, inp_asin, num_recs = 5):
     """
     Suggests the most popular books in the same category as a book the user searched for by ASIN code.
     The asin(Amazon Standard Identification Number) is a unique alphanumeric code that identifies each product on Amazon.
-    The function doesn't work on the original dataframe but it works on a copy of it,
-      extract the column's value 'main_category' of the row that matches to the asin code,
+    The function only reads the dataframe, the row that matches to the asin code is found with the AsinIndex of the dataset(asin_index),
+      extract the column's value 'main_category' of that row,
       filter books in the same category (excluding the book the user searched for),
       sort books by main_rank(ascending),reviews_count(descending) and rating(descending),
       then returns the dataframe with the results or an empty dataframe if the asin code is not correct or the category of the book is unique.
@@ -58,20 +133,19 @@ def filter_by_category(df, inp_asin, num_recs = 5):
     Returns:
         pd.DataFrame: A DataFrame containing the asin, title, rating, and category of recommended books.
     """
-    df2 = df.copy()
-    
-    book =df2[df2['asin'] == inp_asin]
-    if book.empty:
+    position = asin_index(df).get(inp_asin)
+    if position is None:
         print(f"{inp_asin} not found")
         return pd.DataFrame(columns = ['asin','title','main_category'])
+    book = df.iloc[[position]]
     
     print(book[['title', 'main_category','final_price']])
     
     category = int(book['main_category'].iloc[0])
 
-    same_category_books = df2[
-        (df2['main_category'].astype(int) == category) &
-        (df2['asin'] != inp_asin)
+    same_category_books = df[
+        (df['main_category'].astype(int) == category) &
+        (df['asin'] != inp_asin)
     ]
     
     
@@ -87,26 +161,35 @@ def filter_by_category(df, inp_asin, num_recs = 5):
     top_recommendations = recommended_books.head(num_recs)
     return top_recommendations[['asin', 'title', 'rating', 'main_category']]
 
-def data_preprocessing(df):
+def data_preprocessing(df, normalizer = None):
     """
-    Read the dataset containing cleaned data, make a copy, normalize columns 'initial_price', 'final_price', 'reviews_count',
+    Read the dataset containing cleaned data, make a shallow copy(the input is not changed, pandas Copy-on-Write), normalize columns 'initial_price', 'final_price', 'reviews_count',
     'number_of_sellers','main_category','main_rank','rating'.
     Normalization functions are defined with documentation in Normalization/Normalizer.py
+    The parameters of the normalizer are stored in df_norm.attrs['normalizer_params'](JSON, None without a normalizer),
+      so the models fitted on df_norm can check that they match the normalization of a catalog(fit_info).
     
     Args:
         data (str): _dataset path
+        normalizer (Normalizer.BookNormalizer, optional): fitted normalizer, its parameters are used instead of fitting
+                                                          the normalization functions on df. Defaults to None.
         
     Returns:
         pd.DataFrame: DataFrame normalized
     """
     
-    df2 = df.copy()
+    df2 = df.copy(deep=False)
     
-    df_norm = Normalizer.normalize_prices(df2)
-    df_norm = Normalizer.normalize_reviews(df_norm)
-    df_norm = Normalizer.normalize_rating(df_norm)
-    df_norm = Normalizer.normalize_root_bs_rank(df_norm)
-    df_norm = Normalizer.normalize_number_of_sellers(df_norm)
+    if normalizer is not None:
+        df_norm = normalizer.transform(df2)
+        df_norm.attrs['normalizer_params'] = json.dumps(normalizer.params, sort_keys=True)
+    else:
+        df_norm = Normalizer.normalize_prices(df2)
+        df_norm = Normalizer.normalize_reviews(df_norm)
+        df_norm = Normalizer.normalize_rating(df_norm)
+        df_norm = Normalizer.normalize_root_bs_rank(df_norm)
+        df_norm = Normalizer.normalize_number_of_sellers(df_norm)
+        df_norm.attrs['normalizer_params'] = None
     
     #handle NaN values
     df_norm['final_price'].fillna(df_norm['final_price'].mean())
@@ -117,6 +200,55 @@ def data_preprocessing(df):
     
     return df_norm
 
+def load_normalized_catalog(path, normalizer_path = Normalizer.normalizer_path):
+    """
+    Load the catalog served by the app(memory-compact dtypes) and normalize it, the server and the offline job
+      (Neighbor_Table.py) call this function, so the models and tables they save match the same catalog(fit_info).
+    The normalizer is loaded from normalizer_path, it's fitted again and saved if the file is missing
+      or it was fitted on another version of the catalog(df.attrs['dataset_version'], Loader.dataset_version).
+
+    Args:
+        path (str): path of cleaned_data.csv.
+        normalizer_path (str, optional): path of the saved BookNormalizer. Defaults to Normalizer.normalizer_path.
+
+    Returns:
+        tuple: (catalog, Normalizer.BookNormalizer, normalized catalog)
+    """
+    df = Loader.load_dataset(path, compact=True)
+    normalizer = Normalizer.BookNormalizer.load(normalizer_path) if os.path.exists(normalizer_path) else None
+    if normalizer is None or normalizer.version != df.attrs['dataset_version']:
+        normalizer = Normalizer.BookNormalizer().fit(df)
+        normalizer.save(normalizer_path)
+    return df, normalizer, data_preprocessing(df, normalizer)
+
+def _build_category_index(df, positions):
+    #KD-tree of the books at the given row positions with no missing features: (tree, their positions, all the positions)
+    #the tree is None if all the books have missing features
+    X = df[KNN_FEATURES].to_numpy(dtype=float)[positions]
+    valid = ~np.isnan(X).any(axis=1)
+    return KDTree(X[valid]) if valid.any() else None, positions[valid], positions
+
+def category_index(df, category):
+    """
+    Return the KD-tree of the books of a category, built on first use and cached in category_indexes
+      with the key (dataset key, category), so the next queries on the same dataset only search the tree.
+
+    Returns:
+        tuple: (KDTree of the features KNN_FEATURES, row position of each point of the tree, row positions of all the books in the category)
+    """
+    key = (_dataset_key(df), category)
+    found, index = category_indexes.lookup(key)
+    if not found:
+        index = _build_category_index(df, np.flatnonzero((df['main_category'] == category).to_numpy()))
+        category_indexes.store(key, index)
+    return index
+
+def build_category_indexes(df):
+    #build the KD-trees of all the categories at once(e.g. when a server starts) and store them in category_indexes
+    key = _dataset_key(df)
+    for category, positions in df.groupby('main_category', sort=False).indices.items():
+        category_indexes.store((key, category), _build_category_index(df, positions))
+
 def knn_category_recommender(df, inp_asin, num_recs = 5):
     """
    Content-Based model to recommends books similar to a given one (identified by its ASIN), based on final price and review count,
@@ -126,6 +258,9 @@ def knn_category_recommender(df, inp_asin, num_recs = 5):
     it calculates the Euclidean distance between books in this feature space and returns those closest
     to the selected book  that is, the most similar books in terms of price and reviews count.
     
+   The neighbors are searched in the KD-tree of the category(category_index), built once for each category and dataset,
+    so a query doesn't copy the DataFrame and doesn't fit a model.
+    
    The method  returns the dataframe with the results or an empty dataframe if the asin code is not correct or the category of the book is unique.
    
 
@@ -139,50 +274,36 @@ def knn_category_recommender(df, inp_asin, num_recs = 5):
         pd.DataFrame: A DataFrame containing the recommended books with relevant columns.
     """
     
-    df2 = df.copy()
-    
     # Check if the ASIN code is valid
-    book = df2[df2['asin'] == inp_asin]
-    if book.empty:
+    position = asin_index(df).get(inp_asin)
+    if position is None:
         print(f"{inp_asin} not found")
         return pd.DataFrame(columns=['asin', 'title', 'final_price', 'reviews_count', 'main_category'])
+    book = df.iloc[[position]]
     
     # Extract book category
     category = book['main_category'].iloc[0]
     print(book[['title', 'final_price', 'main_category', 'reviews_count']])
     
-    # Filter books in the same category excluding the input
-    same_category_books = df2[
-        (df2['main_category'] == category) & 
-        (df2['asin'] != inp_asin)  
-    ].copy()  
-    
-    if same_category_books.empty:
+    tree, positions, books = category_index(df, category)
+    asins = df['asin'].to_numpy()
+    # books in the same category excluding the input
+    if (asins[books] == inp_asin).all():
         print(f"No books in the category {category} available")
         return pd.DataFrame(columns=['asin', 'title', 'main_category'])
     
-    # Prepare data for the model
-    features = ['final_price', 'reviews_normalized']
-    
-    # Handle missing values without inplace
-    same_category_books = same_category_books.dropna(subset=features).reset_index(drop=True)
-    
-    # Fit NearestNeighbors model
-    knn = NearestNeighbors(n_neighbors=min(num_recs, len(same_category_books)), 
-                          metric='euclidean')
-    
-    # Convert to numpy array to avoid feature names warning
-    X = same_category_books[features].values
-    knn.fit(X)
-    
-    # Get target book features
-    target_book = book[features].values
-    
-    # Find nearest neighbors
-    distances, indices = knn.kneighbors(target_book)
+    # Find nearest neighbors, the input book can be one of them so it's searched one more time
+    excluded = int((asins[positions] == inp_asin).sum())
+    if len(positions) == excluded:
+        print(f"No books in the category {category} available")
+        return pd.DataFrame(columns=['asin', 'title', 'main_category'])
+    k = min(num_recs + excluded, len(positions))
+    distances, indices = tree.query(book[KNN_FEATURES].to_numpy(dtype=float)[:1], k=k)
+    neighbors = positions[indices[0]]
+    neighbors = neighbors[asins[neighbors] != inp_asin][:num_recs]
     
     # Get recommendations
-    recommended = same_category_books.iloc[indices[0]]
+    recommended = df.iloc[neighbors]
     
     return recommended[['asin', 'title', 'final_price', 'reviews_count', 'main_category']]
 
@@ -276,7 +397,7 @@ def hdbscan_reccomender(df, inp_asin, num_recs = 5):
     return recommended[['asin', 'title', 'final_price', 'reviews_count', 'rating', 'main_category']]
 """
 
-def kmeans_reccomender(df,inp_asin,num_recs = 5):
+def kmeans_reccomender(df,inp_asin,num_recs = 5, model = None):
     """
     Content-Based model to recommends books similar to a given one (identified by its ASIN), based on final price and reviews count,
      by using the K-Means clustering algorithm within the same category combined with dimensionality reduction via UMAP.
@@ -303,66 +424,346 @@ def kmeans_reccomender(df,inp_asin,num_recs = 5):
        
        - **Reccomend the nearest books in the UMAP space:** Computes the Euclidean distance between the input book and all books in the same cluster/category
                                                             using UMAP coordinates.Returns the closest `num_recs` books as recommendations.
+    
+    UMAP and K-Means are fitted on the whole catalog, that takes seconds: the fitted model can be computed once(fit_kmeans_model),
+      saved and passed to the function, so a call is only an asin lookup and a nearest neighbor search in the cluster(KMeansModel.neighbors).
                                                             
      Args:
         df (pd.DataFrame):  A DataFrame containing normalized book data, including ASIN, final_price,
                            reviews_count, and main_category.
         inp_asin (str): input asin code.
         num_recs (int, optional): number of reccomended books to return.
+        model (KMeansModel, optional): model fitted on df(fit_kmeans_model or KMeansModel.load), if None the model is fitted on df
+                                       for the call. Defaults to None.
         
     Returns:
         pd.DataFrame: A DataFrame containing the recommended books with relevant columns.
+
+    Raises:
+        ValueError: if the model was not fitted on df(KMeansModel.matches).
     """
-    df2 = df.copy()
-    
-    #check if the asin code is valid
-    book =df[df['asin'] == inp_asin]
-    if book.empty:
+    if model is None:
+        #check if the asin code is valid
+        position = asin_index(df).get(inp_asin)
+        if position is None:
+            print(f"{inp_asin} not found")
+            return pd.DataFrame(columns = ['asin','title','final_price','reviews_count','main_category'])
+        print(df.iloc[[position]][['title','final_price','main_category', 'reviews_count']])
+        model = fit_kmeans_model(df)
+    elif not model.matches(df):
+        raise ValueError("The K-Means model was not fitted on the catalog")
+    elif inp_asin not in model.index:
         print(f"{inp_asin} not found")
         return pd.DataFrame(columns = ['asin','title','final_price','reviews_count','main_category'])
     
-    print(book[['title','final_price','main_category', 'reviews_count']])
-    
-    #columns to use
-    cols = ['final_price','reviews_normalized', 'main_category','rating_normalized']
+    neighbors = model.neighbors(inp_asin, num_recs)
+    if len(neighbors) == 0:
+        print(f"No similar books found in cluster {model.labels[model.index.get(inp_asin)]}.")
+        return pd.DataFrame(columns=['asin', 'title', 'final_price', 'reviews_count', 'main_category'])
     
-    X = df2[cols].values
+    # Return top-N closest in UMAP space
+    return df.iloc[neighbors][['asin', 'title', 'final_price', 'reviews_count', 'rating', 'main_category']]
+
+def squared_distances(X, point):
+    #squared euclidean distance of each row of X from the point, one broadcast pass over the block X(rows x features)
+    diff = X - point
+    return np.einsum('ij,ij->i', diff, diff)
+
+def top_k(distances, k):
+    """
+    Positions of the k smallest distances, sorted by distance(ties in order of position, as a stable argsort).
+    np.argpartition selects the k smallest in linear time, only the selected distances are sorted.
+    """
+    if k >= len(distances):
+        return np.argsort(distances, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    threshold = distances[np.argpartition(distances, k - 1)[k - 1]]
+    # every distance equal to the k-th one is a candidate, so the ties are broken by position
+    selected = np.flatnonzero(distances <= threshold)
+    return selected[np.argsort(distances[selected], kind='stable')[:k]]
+
+# number of distances computed at once by a block(block x books of the category)
+BLOCK_SIZE = 1 << 22
+
+def popularity_neighbors(order, asin_codes, queries, num_recs):
+    """
+    Neighbors of filter_by_category in a category: the first num_recs books of the popularity order with a different asin.
+
+    Args:
+        order (np.ndarray): local positions of the books of the category sorted by popularity.
+        asin_codes (np.ndarray): integer code of the asin of each book of the category.
+        queries (np.ndarray): local positions of the books to recommend for.
+        num_recs (int): number of recommendations of each book.
+
+    Returns:
+        tuple: (query, rank, neighbor) local positions of the recommendations.
+    """
+    # a book excludes the books with its asin, at most 'duplicates' of them are in the first columns
+    duplicates = np.unique(asin_codes, return_counts=True)[1].max()
+    candidates = order[:num_recs + duplicates]
+    keep = asin_codes[candidates][None, :] != asin_codes[queries][:, None]
+    # the kept candidates first, in popularity order
+    columns = np.argsort(~keep, axis=1, kind='stable')[:, :num_recs]
+    valid = np.take_along_axis(keep, columns, axis=1)
+    rows, ranks = np.nonzero(valid)
+    return queries[rows], ranks, candidates[columns[rows, ranks]]
+
+def distance_neighbors(X, asin_codes, labels, queries, num_recs, block_size = BLOCK_SIZE):
+    """
+    Nearest neighbors of a block of books in a category, excluding the books with the same asin and the books with another label
+      (the K-Means cluster for kmeans_reccomender). Books with missing features are never returned.
+    The neighbors are sorted by distance, the ties in order of position(as a stable argsort).
+
+    Args:
+        X (np.ndarray): features of the books of the category(books x features).
+        asin_codes (np.ndarray): integer code of the asin of each book.
+        labels (np.ndarray): label of each book, a neighbor has the label of the query.
+        queries (np.ndarray): local positions of the books to recommend for.
+        num_recs (int): number of recommendations of each book.
+        block_size (int, optional): maximum number of distances computed at once. Defaults to BLOCK_SIZE.
+
+    Returns:
+        tuple: (query, rank, neighbor, distance) of the recommendations.
+    """
+    books = len(X)
+    k = min(num_recs, books)
+    block = max(1, block_size // max(books, 1))
+    found = []
+    for start in range(0, len(queries), block):
+        q = queries[start:start + block]
+        diff = X[q][:, None, :] - X[None, :, :]
+        d = np.einsum('ijk,ijk->ij', diff, diff)
+        d[np.isnan(d) | (asin_codes[q][:, None] == asin_codes[None, :]) | (labels[q][:, None] != labels[None, :])] = np.inf
+        if k < books:
+            selected = np.argpartition(d, k - 1, axis=1)[:, :k]
+            threshold = np.take_along_axis(d, selected, axis=1).max(axis=1)
+            # rows with ties at the k-th distance are sorted in full, so the ties are broken by position
+            ties = (d <= threshold[:, None]).sum(axis=1) > k
+            selected[ties] = np.argsort(d[ties], axis=1, kind='stable')[:, :k]
+        else:
+            selected = np.broadcast_to(np.arange(books), d.shape)
+        distances = np.take_along_axis(d, selected, axis=1)
+        order = np.lexsort((selected, distances))
+        selected = np.take_along_axis(selected, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+        rows, ranks = np.nonzero(np.isfinite(distances))
+        found.append((q[rows], ranks, selected[rows, ranks], np.sqrt(distances[rows, ranks])))
+    if not found:
+        return tuple(np.empty(0, dtype=dtype) for dtype in (np.int64, np.int64, np.int64, float))
+    return tuple(np.concatenate(parts) for parts in zip(*found))
+
+"""
+Columns of the normalized dataset used by the UMAP + K-Means model.
+"""
+KMEANS_FEATURES = ['final_price','reviews_normalized', 'main_category','rating_normalized']
+
+def fit_info(df):
+    """
+    Version of the dataset and parameters of the normalizer of a normalized catalog(data_preprocessing),
+      saved with the models fitted on it(KMeansModel, Neighbor_Table.NeighborTable) and compared by their method matches.
+
+    Returns:
+        dict: {'dataset_version': df.attrs['dataset_version'], 'normalizer_params': df.attrs['normalizer_params']}, None if missing.
+    """
+    return {'dataset_version': df.attrs.get('dataset_version'), 'normalizer_params': df.attrs.get('normalizer_params')}
+
+class KMeansModel:
+    """
+    UMAP + K-Means model of kmeans_reccomender fitted on a catalog, with the row positions of the catalog:
+      the 2D UMAP embedding, the cluster label of each book and the K-Means centroids.
+    The model is saved to a .npz file, so the serving processes load it instead of fitting UMAP and K-Means again.
+
+    Attributes:
+        asins (np.ndarray): asin of each row of the catalog.
+        categories (np.ndarray): main_category of each row.
+        embedding (np.ndarray): UMAP coordinates(rows x 2).
+        labels (np.ndarray): K-Means cluster of each row.
+        centroids (np.ndarray): K-Means centroids(clusters x 2).
+        info (dict): version of the dataset and parameters of the normalizer of the catalog(fit_info).
+        index (AsinIndex): asin -> position of its first row.
+    """
+    def __init__(self, asins, categories, embedding, labels, centroids, info = None):
+        self.asins = np.asarray(asins, dtype=object)
+        self.info = info if info is not None else {'dataset_version': None, 'normalizer_params': None}
+        self.categories = np.asarray(categories)
+        self.embedding = np.asarray(embedding)
+        self.labels = np.asarray(labels)
+        self.centroids = np.asarray(centroids)
+        self.index = AsinIndex(self.asins)
+        # weak reference to the last DataFrame that matched, so the check of each call on the same catalog is O(1)
+        self._matched = None
+        # rows of each cluster, in catalog order
+        order = np.argsort(self.labels, kind='stable')
+        bounds = np.searchsorted(self.labels[order], np.arange(len(self.centroids) + 1))
+        self.members = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+
+    def neighbors(self, inp_asin, num_recs = 5):
+        """
+        Positions of the num_recs nearest books(UMAP space) in the same cluster and category of the book, excluding the book.
+        Returns an empty array if the asin is unknown or no other book shares cluster and category.
+        """
+        position = self.index.get(inp_asin)
+        if position is None:
+            return np.empty(0, dtype=np.int64)
+        members = self.members[self.labels[position]]
+        candidates = members[(self.categories[members] == self.categories[position]) & (self.asins[members] != inp_asin)]
+        return candidates[top_k(squared_distances(self.embedding[candidates], self.embedding[position]), num_recs)]
+
+    def matches(self, df):
+        #check that the model was fitted on the rows of df, with the same dataset version and normalizer
+        if self._matched is not None and self._matched() is df and self.info == fit_info(df):
+            return True
+        matched = (self.info == fit_info(df) and len(df) == len(self.asins)
+                   and (df['asin'].to_numpy(dtype=object) == self.asins).all())
+        if matched:
+            self._matched = weakref.ref(df)
+        return bool(matched)
+
+    def save(self, path):
+        np.savez(path, asins=self.asins.astype(str), categories=self.categories, embedding=self.embedding,
+                 labels=self.labels, centroids=self.centroids, info=json.dumps(self.info))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            # the files saved without 'info' don't match any catalog, so the model is fitted again
+            info = json.loads(str(data['info'])) if 'info' in data else {}
+            return cls(data['asins'].astype(object), data['categories'], data['embedding'], data['labels'], data['centroids'], info)
+
+def fit_kmeans_model(df, n_clusters = 10, random_state = 42):
+    """
+    Offline step of kmeans_reccomender: reduce the normalized features(KMEANS_FEATURES) to 2 dimensions with UMAP
+      and cluster the books with K-Means in the UMAP space.
+
+    Args:
+        df (pd.DataFrame): normalized dataset(data_preprocessing).
+        n_clusters (int, optional): number of K-Means clusters. Defaults to 10.
+        random_state (int, optional): seed of UMAP and K-Means. Defaults to 42.
+
+    Returns:
+        KMeansModel: the fitted model.
+    """
+    X = df[KMEANS_FEATURES].values
     
     # Dimensionality reduction using umap
-    reducer = umap.UMAP(n_components=2, random_state=42)
+    reducer = umap.UMAP(n_components=2, random_state=random_state)
     X_umap = reducer.fit_transform(X)
     
     # Clustering with K-Means
-    kmeans = KMeans(n_clusters=10, random_state=42) 
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state) 
     clusters = kmeans.fit_predict(X_umap)
-    
-    # Add UMAP coordinates and cluster labels to the DataFrame
-    df2['umap_x'] = X_umap[:, 0]
-    df2['umap_y'] = X_umap[:, 1]
-    df2['cluster'] = clusters
-    
-    # find the cluster of the target book
-    target_cluster = df2[df2['asin'] == inp_asin]['cluster'].values[0]
-    target_category = book['main_category'].values[0]
+    return KMeansModel(df['asin'], df['main_category'], X_umap, clusters, kmeans.cluster_centers_, fit_info(df))
 
-    same_cluster = df2[
-        (df2['cluster'] == target_cluster) &
-        (df2['main_category'] == target_category) &
-        (df2['asin'] != inp_asin)
-    ].copy()
+def _batch_recommend(df, asins, kernel, columns, score):
+    """
+    Common part of the batch recommenders: the known asins of the batch are grouped by category and the kernel
+      computes the recommendations of all the books of a category at once.
 
-    if same_cluster.empty:
-        print(f"No similar books found in cluster {target_cluster}.")
-        return pd.DataFrame(columns=['asin', 'title', 'final_price', 'reviews_count', 'main_category'])
+    Args:
+        df (pd.DataFrame): the dataset.
+        asins (array-like): input asin codes, the unknown ones are skipped and the repeated ones are recommended once.
+        kernel (callable): kernel(positions, queries) -> (query, rank, neighbor, score), positions are the rows of a category
+                           and the other arrays are local positions in the category(popularity_neighbors, distance_neighbors).
+        columns (list): columns of the recommended books.
+        score (str): name of the score column.
 
-    # Calculate distances in UMAP space and recommend the nearest books in the UMAP space
-    input_coords = df2[df2['asin'] == inp_asin][['umap_x', 'umap_y']].values[0]
-    same_cluster.loc[:, 'distance'] = same_cluster.apply(
-    lambda row: np.linalg.norm([row['umap_x'], row['umap_y']] - input_coords),
-    axis=1
-)
-    recommended = same_cluster.sort_values('distance').head(num_recs) # Return top-N closest in UMAP space
-    
-    return recommended[['asin', 'title', 'final_price', 'reviews_count', 'rating', 'main_category']]
+    Returns:
+        pd.DataFrame: one row for each recommendation: query_asin, rank, the columns of the recommended book and the score,
+                      in order of the input asins and rank.
+    """
+    index = asin_index(df)
+    queries = np.array([p for p in (index.get(a) for a in pd.unique(np.asarray(asins, dtype=object))) if p is not None],
+                       dtype=np.int64)
+    order = np.full(len(df), -1)
+    order[queries] = np.arange(len(queries))
+
+    # rows of the categories of the batch, grouped by category
+    categories = df['main_category'].to_numpy()
+    rows = np.flatnonzero(np.isin(categories, categories[queries]))
+    parts = []
+    for group in pd.Series(categories[rows]).groupby(categories[rows], sort=False).indices.values():
+        positions = rows[group]
+        query, rank, neighbor, values = kernel(positions, np.flatnonzero(order[positions] >= 0))
+        parts.append((positions[query], rank, positions[neighbor], values))
+    if parts:
+        query, rank, neighbor, values = (np.concatenate(p) for p in zip(*parts))
+    else:
+        query, rank, neighbor, values = (np.empty(0, dtype=np.int64),) * 3 + (np.empty(0),)
+    sort = np.lexsort((rank, order[query]))
+    query, rank, neighbor, values = query[sort], rank[sort], neighbor[sort], values[sort]
+
+    result = df.iloc[neighbor][columns].reset_index(drop=True)
+    result.insert(0, 'query_asin', df['asin'].to_numpy()[query])
+    result.insert(1, 'rank', rank)
+    result[score] = values
+    return result
+
+def batch_filter_by_category(df, asins, num_recs = 5):
+    """
+    filter_by_category for many books: the books of each category are sorted by popularity once for the whole batch.
+
+    Args:
+        df (pd.Dataframe): dataframe that contains the cleaned data.
+        asins (array-like): input asin codes.
+        num_recs (int, optional): number of reccomended books for each asin.
+
+    Returns:
+        pd.DataFrame: query_asin, rank, the columns of filter_by_category and the main_rank of the recommended books.
+    """
+    asin_codes = pd.factorize(df['asin'])[0]
+    keys = [df[col].to_numpy(dtype=float) for col in ['main_rank', 'reviews_count', 'rating']]
+
+    def kernel(positions, queries):
+        rank, reviews, rating = (key[positions] for key in keys)
+        query, ranks, neighbor = popularity_neighbors(np.lexsort((-rating, -reviews, rank)), asin_codes[positions], queries, num_recs)
+        return query, ranks, neighbor, rank[neighbor]
+    return _batch_recommend(df, asins, kernel, ['asin', 'title', 'rating', 'main_category'], 'main_rank')
+
+def batch_knn_category_recommender(df, asins, num_recs = 5):
+    """
+    knn_category_recommender for many books: one pairwise distance pass(distance_neighbors) for the books of the batch in each category.
+
+    Args:
+        df (pd.DataFrame): A DataFrame containing normalized book data.
+        asins (array-like): input asin codes.
+        num_recs (int, optional): number of reccomended books for each asin.
+
+    Returns:
+        pd.DataFrame: query_asin, rank, the columns of knn_category_recommender and the distance of the recommended books.
+    """
+    asin_codes = pd.factorize(df['asin'])[0]
+    X = df[KNN_FEATURES].to_numpy(dtype=float)
+
+    def kernel(positions, queries):
+        return distance_neighbors(X[positions], asin_codes[positions], np.zeros(len(positions), dtype=np.int8), queries, num_recs)
+    return _batch_recommend(df, asins, kernel, ['asin', 'title', 'final_price', 'reviews_count', 'main_category'], 'distance')
 
+def batch_kmeans_reccomender(df, asins, num_recs = 5, model = None):
+    """
+    kmeans_reccomender for many books: one pairwise distance pass(distance_neighbors) in the UMAP space for the books of the batch
+      in each category, the neighbors of a book are in its cluster.
+
+    Args:
+        df (pd.DataFrame): A DataFrame containing normalized book data.
+        asins (array-like): input asin codes.
+        num_recs (int, optional): number of reccomended books for each asin.
+        model (KMeansModel, optional): model fitted on df, if None the model is fitted on df for the call. Defaults to None.
+
+    Returns:
+        pd.DataFrame: query_asin, rank, the columns of kmeans_reccomender and the distance of the recommended books.
+
+    Raises:
+        ValueError: if the model was not fitted on df(KMeansModel.matches).
+    """
+    if model is None:
+        model = fit_kmeans_model(df)
+    elif not model.matches(df):
+        raise ValueError("The K-Means model was not fitted on the catalog")
+    asin_codes = pd.factorize(df['asin'])[0]
+    embedding = np.asarray(model.embedding, dtype=float)
 
+    def kernel(positions, queries):
+        return distance_neighbors(embedding[positions], asin_codes[positions], model.labels[positions], queries, num_recs)
+    return _batch_recommend(df, asins, kernel, ['asin', 'title', 'final_price', 'reviews_count', 'rating', 'main_category'],
+                            'distance')
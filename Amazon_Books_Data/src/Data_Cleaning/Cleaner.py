@@ -1,6 +1,7 @@
 import ast
 import json
-from src.Load_Data.Loader import load_dataset
+from src.Load_Data.Loader import load_dataset, UNUSED_RAW_COLUMNS
+from src.Data_Cleaning.Memoizer import apply_unique, parse_unique
 import pandas as pd
 import numpy as np
 import re
@@ -11,6 +12,8 @@ This module provides functions to clean a dataset:
 
 - show_nan: Displays the count of missing values in each column.
 
+The functions are run in order by the cleaning pipeline in Pipeline.py.
+
 """
 
 def show_nan(df):
@@ -19,30 +22,18 @@ def show_nan(df):
 
 def delete_columns(df):
     """
-    delete columns with too many missing values that are not useful for analysis
+    delete columns with too many missing values that are not useful for analysis(Loader.UNUSED_RAW_COLUMNS)
     # errors='ignore' to avoid KeyError if column doesn't exist
     """
-    columns = ['upc','answered_questions','department','delivery','domain','features','product_dimensions','video','colors','image',
-               'date_first_available','model_number','description',
-               'manufacturer','plus_content','buybox_seller','image_url','url','ISBN10']
-    df.drop(columns = columns, inplace = True, errors = 'ignore') 
+    df.drop(columns = UNUSED_RAW_COLUMNS, inplace = True, errors = 'ignore') 
     
-def handle_price(df):
+def fill_prices(df):
     """
-    Handle the columns initial_price,final_price,discount:
-    
-       First convert columns's values to numeric.
-       
-       Then find missing values.
+    Convert the columns initial_price, final_price and discount to numeric and fill their missing values:
        if initial_price is NaN, try to get it by summing final_price + discount,
-         if final_price is NaN, try to get it by subtracting initial_price - discount,
-         if discount is NaN, try to get it by subtracting initial_price - final_price,
-         if one value is not valid(for example negative value, zero value, not a number or discount greater than initial_price),
-             then remove the row.
-        
-        Finally check one more time for NaN values in the columns. 
+       if final_price is NaN, try to get it by subtracting initial_price - discount,
+       if discount is NaN, try to get it by subtracting initial_price - final_price.
     """
-    
     df['initial_price'] = pd.to_numeric(df['initial_price'], errors = 'coerce') 
     df['final_price'] = pd.to_numeric(df['final_price'], errors = 'coerce')
     df['discount'] = pd.to_numeric(df['discount'], errors = 'coerce')
@@ -53,25 +44,49 @@ def handle_price(df):
     df.loc[df['final_price'].isna() & df['initial_price'].notna() & df['discount'].notna(), 'final_price'] = df['initial_price'] - df['discount']
     # replace NaN values in the column discount with the difference of initial_price and final_price
     df.loc[df['discount'].isna() & df['initial_price'].notna() & df['final_price'].notna(), 'discount'] = df['initial_price'] - df['final_price']
-    #remove rows with not valid values in the columns
-    df = df[(df['initial_price'] > 0)
+    return df
+
+def valid_price_mask(df):
+    """
+    Boolean mask of the rows with valid prices: initial_price and final_price greater than 0, discount not negative
+      and final_price not greater than initial_price.
+    Comparisons with NaN are False, so rows whose prices are still NaN after fill_prices are not valid.
+    """
+    return ((df['initial_price'] > 0)
             & (df['final_price'] > 0)
             & (df['discount'] >= 0)
-            & (df['final_price'] <= df['initial_price'])]
+            & (df['final_price'] <= df['initial_price']))
+
+def handle_price(df):
+    """
+    Handle the columns initial_price,final_price,discount:
     
-    #remove rows with initial_price,final_price and discount values that are NaN
-    df = df[~(df['initial_price'].isna() & df['final_price'].isna() & df['discount'].isna())]
+       First convert columns's values to numeric and fill the missing values(fill_prices).
+       
+       if one value is not valid(for example negative value, zero value, not a number or discount greater than initial_price),
+             then remove the row(valid_price_mask).
+        
+        Finally check one more time for NaN values in the columns. 
+    """
+    df = fill_prices(df)
+    #remove rows with not valid or NaN values in the columns
+    df = df[valid_price_mask(df)]
     
     # check one more time for NaN values in the columns
     print("\nRows with NaN values in the columns initial_price, final_price and discount:\n")
     print(df[['initial_price', 'final_price', 'discount']].isna().sum())
     return df
 
-def handle_number_of_sellers(df):
-    # Replace the NaN values in the column number_of_sellers with the mode value
+def parse_number_of_sellers(df):
     df['number_of_sellers'] = pd.to_numeric(df['number_of_sellers'], errors='coerce')
-    mode_value = df['number_of_sellers'].mode().iloc[0]
-    df['number_of_sellers'].fillna(mode_value, inplace = True)
+    return df
+
+def handle_number_of_sellers(df, mode_value = None):
+    # Replace the NaN values in the column number_of_sellers with the mode value(computed on df if not given)
+    df = parse_number_of_sellers(df)
+    if mode_value is None:
+        mode_value = df['number_of_sellers'].mode().iloc[0]
+    df['number_of_sellers'] = df['number_of_sellers'].fillna(mode_value)
     return df
 
 def handle_format(df):
@@ -79,7 +94,16 @@ def handle_format(df):
     df['format'] = df['format'].fillna('Other')
     return df
 
-def get_book_format(df):
+def _get_format(value):
+    #return the name of the first format of the JSON list, None if the value is not a valid JSON list
+    try:
+        formats = json.loads(value.replace("'", '"'))
+        if isinstance(formats, list) and len(formats) > 0:
+            return formats[0].get('name')
+    except (json.JSONDecodeError, TypeError):
+        pass   #continue if there is an error in parsing the JSON string
+
+def get_book_format(df, cache = None):
     """
     Extract the book format from the column 'format', save the value in a new column 'book_format' and then delete column 'format'.
     The column 'format' has list of dictionaries as values for example:
@@ -88,23 +112,19 @@ def get_book_format(df):
            {"name":"Hardcover","price":"$38.50","url":"/Diagnostic-Statistical-Manual-Disorders-Separate/dp/B09CPKZ65D"}
            {...}]
     
-    The function only extract the first format from the list of dictionaries, price and url are not used.   
-    """
-    def get_format(value):
-        try:
-            formats = json.loads(value.replace("'", '"'))
-            if isinstance(formats, list) and len(formats) > 0:
-                return formats[0].get('name')
-        except (json.JSONDecodeError, TypeError):
-            pass   #continue if there is an error in parsing the JSON string
-    df['book_format'] = df['format'].apply(get_format)
+    The function only extract the first format from the list of dictionaries, price and url are not used.
+    Each distinct JSON string is parsed only once (Memoizer.apply_unique), many rows share the same string, e.g. 'Other' for missing formats.
+    'cache' is an optional LRUCache shared between calls (e.g. the chunks of a raw file).
+    """
+    df['book_format'] = apply_unique(df['format'], _get_format, cache)
     df.drop(columns = ['format'], inplace = True, errors = 'ignore')  #delete the column 'format'
     return df
 
-def handle_book_fomat(df):
-    #replace the NaN values in the column 'book_format' with the mode value
-    mode_format = df['book_format'].mode()[0]
-    df['book_format'].fillna(mode_format, inplace = True)
+def handle_book_fomat(df, mode_format = None):
+    #replace the NaN values in the column 'book_format' with the mode value(computed on df if not given)
+    if mode_format is None:
+        mode_format = df['book_format'].mode()[0]
+    df['book_format'] = df['book_format'].fillna(mode_format)
     return df
 def handle_best_sellers_rank(df):
     """
@@ -125,40 +145,83 @@ def handle_best_sellers_rank(df):
     return df
     
 
+REQUIRED_COLUMNS = ['item_weight', 'root_bs_rank', 'brand', 'best_sellers_rank']
+
+def required_columns_mask(df):
+    #boolean mask of the rows without NaN values in the columns REQUIRED_COLUMNS
+    return df[REQUIRED_COLUMNS].notna().all(axis=1)
+
 def handle_other_columns(df):
     """
     delete rows with NaN values in the columns:
       'item_weight', 'root_bs_rank', 'brand', best_sellers_rank'
+    The rows are filtered once with a single mask(required_columns_mask).
     """
-    columns = ['item_weight', 'root_bs_rank', 'brand', 'best_sellers_rank']
-    for column in columns:
-        df = df[df[column].notna()]
-    return df
+    return df[required_columns_mask(df)]
+
+
+"""
+Conversion factors to grams of the units of measurement found in the column 'item_weight'.
+"""
+WEIGHT_UNITS = {
+    'pounds': 453.92,
+    'ounces': 28.35,
+    'grams': 1.0,
+    'kilograms': 1000.0,
+}
+WEIGHT_PATTERN = r"(?P<value>[\d.]+)\s*(?P<unit>pounds|ounces|kilograms|grams)"
 
+def _weights_to_grams(weights):
+    #vectorized parser of a Series of distinct weight strings, see convert_weight_to_grams
+    weights = weights.where(weights.map(type) == str)
+    parts = weights.str.lower().str.extract(WEIGHT_PATTERN)
+    value = pd.to_numeric(parts['value'], errors='coerce').astype(float)
+    factor = parts['unit'].map(WEIGHT_UNITS).astype(float)
+    return value * factor
 
-def parse_item_weight(df):
+def convert_weight_to_grams(weights, cache = None):
     """
-    Extract numeric values from the 'item_weight' column and cast it from 'pounds|ounces to grams,
+    Convert a Series of weight strings (e.g. '1.2 pounds', '14.4 Ounces', '350 grams') to grams.
+    The numeric value and the unit are extracted from the distinct strings (Memoizer.apply_unique) with one regex with named groups,
+      then the value is multiplied by the factor of the unit (WEIGHT_UNITS) as an array operation
+      and the weights are broadcast back to the rows.
+    Values that are not strings or don't match the pattern are converted to NaN.
+    """
+    return apply_unique(weights, _weights_to_grams, cache, vectorized = True).astype(float)
+
+def parse_item_weight(df, cache = None):
+    """
+    Extract numeric values from the 'item_weight' column and cast it from pounds|ounces|grams|kilograms to grams,
       if the value is not a number, it will be set to NaN.
       
-    The function uses regex and groups to find the numeric value and the unit of measurement.
-    """
-    def get_value(value):
-        if isinstance(value, str):
-            match = re.search(r"([\d.]+)\s*(pounds|ounces)", value.lower())
-            if match:
-                weight = float(match.group(1))
-                unit = match.group(2)
-                if unit == "pounds":
-                    return weight * 453.92  # Convert pounds to grams
-                elif unit == "ounces":
-                    return weight * 28.35  # Convert ounces to grams
-        return np.nan  # Return None if no match found
-    
-    df['item_weight'] = df['item_weight'].apply(get_value)
+    The function uses regex and named groups to find the numeric value and the unit of measurement(convert_weight_to_grams).
+    """
+    df['item_weight'] = convert_weight_to_grams(df['item_weight'], cache)
     return df
 
-def add_stock_columns(df):
+OUT_OF_STOCK_PHRASES = ('temporarily out of stock', 'this title will be released on', 'out of stock')
+
+def classify_availability(value):
+    """
+    Classify an availability string, the string is lowercased and scanned only once.
+
+    Returns:
+        tuple: (quantity_in_stock, is_in_stock), see add_stock_columns.
+    """
+    if not isinstance(value, str):
+        return np.nan, 0
+    text = value.lower()
+    out_of_stock = any(phrase in text for phrase in OUT_OF_STOCK_PHRASES)
+    match = re.search(r'Only (\d+) left in stock', value)
+    if match:
+        quantity = int(match.group(1))
+    elif out_of_stock:
+        quantity = 0
+    else:
+        quantity = np.nan
+    return quantity, 0 if out_of_stock else 1
+
+def add_stock_columns(df, cache = None):
     """
     Create two columns quantity_in_stock and is_in_stock based on the column availability.
     - If the availability string contains 'Only X left in stock', extract X and set it as quantity_in_stock.
@@ -177,42 +240,14 @@ def add_stock_columns(df):
         
     - If the availability string is empty or does not match any of the above conditions,
         set quantity_in_stock to NaN and is_in_stock to 0 (not available).
+        
+    The availability text is heavily repeated, so each distinct string is classified once (classify_availability through Memoizer.parse_unique),
+      then both columns are built from the lookup table through the codes.
     """
-    def get_quantity(value):
-        if isinstance(value,str):
-            match = re.search(r'Only (\d+) left in stock', value)
-            if match:
-                return int(match.group(1))
-            if(
-                'temporarily out of stock' in value.lower() 
-                or 'this title will be released on' in value.lower()
-                or 'out of stock' in value.lower()
-            ):
-                return 0
-            
-            if(
-                'in stock' in value.lower()
-                or 'usually ships within 2 to 3 weeks' in value.lower()
-                or 'usually ships within 8 days' in value.lower()
-                
-            ):
-                return np.nan
-        return np.nan
-    
-    def get_is_in_stock(value):
-        if isinstance(value, str):
-          if (
-            'temporarily out of stock' in value.lower()
-            or 'this title will be released on' in value.lower()
-            or 'out of stock' in value.lower()
-          ):
-            return 0 #not available(0)
-          else:
-            return 1  #available(1)
-        return 0 
-    
-    df['quantity_in_stock'] = df['availability'].apply(get_quantity)
-    df['is_in_stock'] = df['availability'].apply(get_is_in_stock)
+    codes, results = parse_unique(df['availability'], classify_availability, cache)
+    table = np.array(results, dtype = float).reshape(-1, 2)
+    df['quantity_in_stock'] = table[codes, 0]
+    df['is_in_stock'] = table[codes, 1].astype(np.int64)
     df.drop(columns=['availability'], inplace=True)
     return df
 
@@ -224,67 +259,109 @@ def handle_timestamp(df):
     df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
     return df
 
-def handle_rating(df):
+def _extract_ratings(ratings):
+    #vectorized parser of a Series of distinct ratings, see handle_rating
+    return ratings.astype(str).str.extract(r'(?P<rating>\d+\.\d+)')['rating'].astype(float)
+
+def handle_rating(df, cache = None):
     """
     Convert the 'rating' column to numeric format.
     Values of the column 'rating' are strings in the format X out of stars,
       the function use regex to extract the value of X and cast it to float.
+    The column has only a few distinct values (e.g. '4.8 out of 5 stars'), so the regex is applied only to the distinct values
+      (Memoizer.apply_unique), then the ratings are broadcast back to the rows.
     """
-    df['rating'] = df['rating'].astype(str).str.extract(r'(\d+\.\d+)')
-    df['rating'] = df['rating'].astype(float)
+    df['rating'] = apply_unique(df['rating'], _extract_ratings, cache, vectorized = True).astype(float)
     return df
 
-def handle_categories(df):
+def _get_category(value):
+    #return 'second - third' value of the list of categories, see handle_categories
+    try:
+        cats = ast.literal_eval(value)
+        if len(cats) >= 3:
+            return f"{cats[1]} - {cats[2]}"
+        elif len(cats) == 2:
+            return cats[1]
+    except Exception:
+        pass
+    return "Unknown category"
+
+def handle_categories(df, cache = None):
     """
     Get the second and third value of the column 'categories' and it append using a dash(-).
     The column categories has lists of string as values, for example:
        ["Books","Literature & Fiction","Mythology & Folk Tales"]
        ["Books","Children's Books","Literature & Fiction"]
        ...
+    The column has only a few hundred distinct values, each of them is parsed once with ast.literal_eval (Memoizer.apply_unique).
+    """
+    df['categories'] = apply_unique(df['categories'], _get_category, cache)
+    return df
+
+def add_range_columns(df):
     """
-    def get_category(value):
-        try:
-            cats = ast.literal_eval(value)
-            if len(cats) >= 3:
-                return f"{cats[1]} - {cats[2]}"
-            elif len(cats) == 2:
-                return cats[1]
-        except Exception:
-            pass
-        return "Unknown category"
-    df['categories'] = df['categories'].apply(get_category)
+    Add the columns discount_pct, discount_range, price_range and num_reviews_range,
+      with the same bins used by the analysis functions in BookDataAnalysis.
+    """
+    df['discount_pct'] = (df['discount'] / df['initial_price']) * 100
+    df['discount_range'] = pd.cut(df['discount_pct'], bins=[0, 10, 20, 30, float('inf')],
+                                  labels=['< 10%', '10%-20%', '20%-30%', '30%+'], right=False)
+    df['price_range'] = pd.cut(df['final_price'], bins=[0, 10, 20, 30, float('inf')],
+                               labels=['< $10', '$10-$20', '$20-$30', '$30+'], right=False)
+    df['num_reviews_range'] = pd.cut(df['reviews_count'], bins=[0, 10000, 20000, 30000, 40000, 50000, float('inf')],
+                                     labels=['0-10000', '10000-20000', '20000-30000', '30000-40000', '40000-50000', '50000+'], right=False)
     return df
 
-def find_outliers_iqr(df, columns):
+def iqr_bounds(df, columns):
+    """
+    Lower and upper bounds of the Interquartile Range method for the numeric columns,
+      the quartiles of all the columns are computed in one pass(a single quantile call).
+
+    Returns:
+        pd.DataFrame: one column for each numeric column, with the rows 'lower' and 'upper'.
+    """
+    quartiles = df[columns].quantile([0.25, 0.75])
+    q1, q3 = quartiles.loc[0.25], quartiles.loc[0.75]
+    iqr = q3 - q1
+    return pd.DataFrame([q1 - 1.5 * iqr, q3 + 1.5 * iqr], index=['lower', 'upper'])
+
+def outlier_masks(df, bounds):
+    #boolean mask(np.ndarray) of the outlier rows of each column of bounds(see iqr_bounds), missing values are not outliers
+    masks = {}
+    for col in bounds.columns:
+        values = df[col].to_numpy(dtype=float, na_value=np.nan)
+        masks[col] = (values < bounds.at['lower', col]) | (values > bounds.at['upper', col])
+    return masks
+
+def find_outliers_iqr(df, columns, compact = False):
     """
     Get outlier values for specific columns using Interquantile Range method.
     The Interquartile Range is a traditional statistical method that find the values to get outlier values of the variable into the entire dataset.
+    The quartiles of all the columns are computed in one pass (iqr_bounds), for data that doesn't fit in memory see Outliers.py.
 
     Args:
         df (pd.DataFrame): Inpt datarame.
         columns (list): list of columns for the search.
+        compact (bool, optional): return the index labels of the outlier rows instead of DataFrames. Defaults to False.
 
     Returns:
         dict: A dictionary where the keys are the column names
-              and the values are the DataFrames of the outliers found for that column.
+              and the values are the DataFrames of the outliers found for that column(np.ndarray of index labels if compact).
     """
-    outliers = {}
+    numeric = []
     for col in columns:
         if pd.api.types.is_numeric_dtype(df[col]):
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-
-           
-            col_outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-            
-            
-            if not col_outliers.empty:
-                outliers[col] = col_outliers[['asin', 'title', col, 'main_category', 'final_price', 'reviews_count']]
-            else:
-                outliers[col] = pd.DataFrame(columns=['asin', 'title', col, 'main_category', 'final_price', 'reviews_count'])
+            numeric.append(col)
         else:
             print(f"The column '{col}' is not numerical.")
+    if not numeric:
+        return {}
+
+    outliers = {}
+    index = df.index.to_numpy()
+    for col, mask in outlier_masks(df, iqr_bounds(df, numeric)).items():
+        if compact:
+            outliers[col] = index[mask]
+        else:
+            outliers[col] = df.loc[mask, ['asin', 'title', col, 'main_category', 'final_price', 'reviews_count']]
     return outliers
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import pandas as pd
+from src.Load_Data import Loader
+from src.Data_Cleaning import Pipeline
+from src.Data_Cleaning.Validation import Validator
+
+"""
+This module provides an incremental ingestion of the daily scrape snapshots(raw files with the format of Amazon_popular_books_dataset.csv)
+  into a partitioned store of cleaned rows, so a refresh costs time proportional to the rows that changed and not to the catalog.
+
+- ingest_snapshot: hash each raw row of a snapshot, upsert by 'asin' keeping the row with the latest 'timestamp'
+                   and run the row-local Cleaner steps (Pipeline.clean_rows) only on the new or changed rows.
+
+- load_store: read the latest cleaned row of each asin from the store and apply the Cleaner steps that need
+              statistics of the whole dataset (Pipeline.clean_global), returning the DataFrame of cleaned_data.csv.
+
+The store is a folder with:
+   state.parquet        one row per asin: hash of the raw row, timestamp, partition holding its cleaned row(-1 if the row was dropped by the Cleaner)
+   part-00000.parquet   the cleaned rows of the first ingestion
+   part-00001.parquet   the cleaned rows that were new or changed in the second ingestion
+   ...
+   quarantine-00000.parquet   the rows of an ingestion rejected by the validation, with their reason code(Validation.Validator)
+   ...
+The hash doesn't include the column 'timestamp', so a book scraped again with the same data is not processed again.
+"""
+
+STATE_FILE = "state.parquet"
+
+def _partition_path(store_dir, partition):
+    return os.path.join(store_dir, f"part-{partition:05d}.parquet")
+
+def _write_parquet(df, file):
+    #write to a temporary file and rename it, so an interrupted ingestion never leaves a partial file
+    tmp = f"{file}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, file)
+
+def read_state(store_dir):
+    #return the state of the store, or an empty state if the store is new
+    file = os.path.join(store_dir, STATE_FILE)
+    if os.path.exists(file):
+        return pd.read_parquet(file)
+    return pd.DataFrame({
+        'asin': pd.Series(dtype=str),
+        'row_hash': pd.Series(dtype='uint64'),
+        'timestamp': pd.Series(dtype='datetime64[ns, UTC]'),
+        'partition': pd.Series(dtype='int64'),
+    })
+
+def _read_rows(store_dir, partitions):
+    #cleaned rows of the asins from their partitions, partitions is a Series asin -> partition(the dropped rows, -1, are skipped)
+    parts = []
+    partitions = partitions[partitions >= 0]
+    for partition, asins in partitions.groupby(partitions.to_numpy()):
+        part = pd.read_parquet(_partition_path(store_dir, partition))
+        parts.append(part[part['asin'].isin(asins.index)])
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+def hash_rows(df):
+    #hash of each raw row, the column 'timestamp' is excluded
+    return pd.util.hash_pandas_object(df.drop(columns=['timestamp'], errors='ignore'), index=False).to_numpy()
+
+def ingest_snapshot(path, store_dir, chunksize = 100_000, normalizer = None):
+    """
+    Ingest a raw scrape snapshot into the store.
+
+    The snapshot is read in chunks(Loader.load_dataset_chunks), each raw row is hashed and compared with the hash stored for its asin:
+      - rows of new asins and rows whose hash changed are kept, if their timestamp is not older than the stored one
+      - if the snapshot contains the same asin more than once, only the row with the latest timestamp is kept
+    Only the kept rows (the delta) are cleaned with Pipeline.clean_rows and written to a new partition of the store.
+
+    Args:
+        path (str): path of the raw CSV file.
+        store_dir (str): folder of the store, it is created if it doesn't exist.
+        chunksize (int, optional): number of rows read at a time. Defaults to 100000.
+        normalizer (Normalizer.StreamingNormalizer, optional): updated with the cleaned rows of the delta, the old rows
+                                                               of the changed asins are removed from its statistics,
+                                                               so it must be updated by every ingestion of the store.
+                                                               The summary reports its drift. Defaults to None.
+
+    Returns:
+        dict: number of rows read, new, changed, unchanged, stale(older than the stored row) and dropped by the Cleaner,
+              the number of rows rejected by each validation rule('rejected'),
+              the path of the new partition and of the quarantine file(None if no row was written),
+              and with a normalizer the drift of each feature('drift') and if a new normalization is needed('renormalize').
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    state = read_state(store_dir).set_index('asin')
+    # a sentinel is appended, so the position -1 of new asins is a valid index
+    state_hash = np.append(state['row_hash'].to_numpy(), np.uint64(0))
+    state_time = np.append(state['timestamp'].to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+
+    rows, unchanged, stale = 0, 0, 0
+    delta = []
+    for chunk in Loader.load_dataset_chunks(path, chunksize=chunksize):
+        rows += len(chunk)
+        chunk = chunk.assign(_row_hash=hash_rows(chunk),
+                             _timestamp=pd.to_datetime(chunk['timestamp'], errors='coerce', utc=True))
+        # position of each asin in the state, -1 for new asins
+        pos = state.index.get_indexer(chunk['asin'])
+        known = pos >= 0
+        same = known & (state_hash[pos] == chunk['_row_hash'].to_numpy())
+        older = known & (chunk['_timestamp'].to_numpy(dtype='datetime64[ns]') < state_time[pos])
+        unchanged += int(same.sum())
+        stale += int((older & ~same).sum())
+        delta.append(chunk[~same & ~older])
+
+    delta = pd.concat(delta) if delta else pd.DataFrame()
+    summary = {'rows': rows, 'new': 0, 'changed': 0, 'unchanged': unchanged, 'stale': stale, 'dropped': 0,
+               'rejected': {}, 'partition': None, 'quarantine': None}
+    if delta.empty:
+        return summary
+
+    # keep the latest row of each asin
+    delta = delta.sort_values('_timestamp', kind='stable').drop_duplicates('asin', keep='last')
+    is_new = ~delta['asin'].isin(state.index)
+    summary['new'] = int(is_new.sum())
+    summary['changed'] = int((~is_new).sum())
+
+    partition = int(state['partition'].max()) + 1 if len(state) else 0
+    validator = Validator(quarantine_dir=store_dir)
+    cleaned = Pipeline.clean_rows(delta.drop(columns=['_row_hash', '_timestamp']), validator=validator)
+    kept = delta['asin'].isin(cleaned['asin']).to_numpy()
+    summary['dropped'] = int((~kept).sum())
+    summary['rejected'] = {code: count for code, count in validator.counts.items() if count}
+    summary['quarantine'] = validator.files[0] if validator.files else None
+    if normalizer is not None:
+        # the old cleaned rows of the changed asins are replaced, their values are removed from the statistics
+        replaced = _read_rows(store_dir, state.loc[delta['asin'][~is_new], 'partition'])
+        summary['drift'] = normalizer.update(cleaned, removed=replaced).to_dict()
+        summary['renormalize'] = normalizer.needs_renormalization()
+    if not cleaned.empty:
+        summary['partition'] = _partition_path(store_dir, partition)
+        _write_parquet(cleaned, summary['partition'])
+
+    updates = pd.DataFrame({
+        'row_hash': delta['_row_hash'].to_numpy(),
+        'timestamp': delta['_timestamp'].array,
+        'partition': np.where(kept, partition, -1),
+    }, index=pd.Index(delta['asin'].to_numpy(), name='asin'))
+    state = pd.concat([state[~state.index.isin(updates.index)], updates])
+    _write_parquet(state.reset_index(), os.path.join(store_dir, STATE_FILE))
+    return summary
+
+def load_store(store_dir):
+    """
+    Read the latest cleaned row of each asin from the store and apply Pipeline.clean_global.
+
+    Returns:
+        pd.DataFrame: the cleaned dataset with a 1-based index, as returned by Loader.load_dataset.
+    """
+    state = read_state(store_dir)
+    rows = _read_rows(store_dir, state.set_index('asin')['partition'])
+    if rows.empty:
+        return pd.DataFrame()
+    df = Pipeline.clean_global(rows)
+    df.index = range(1, len(df) + 1)
+    return df
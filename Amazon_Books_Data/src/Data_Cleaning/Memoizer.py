@@ -0,0 +1,108 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+"""
+This module provides a factorize-then-parse memoization layer for the per-row parsers of the Cleaner.
+
+Raw columns such as 'categories', 'format', 'availability', 'rating' and 'item_weight' contain the same strings again and again,
+  so instead of parsing every row the column is factorized (pd.factorize), the parser runs once per distinct value
+  and the results are broadcast back to the rows through the codes.
+
+- LRUCache: bounded cache of parsed values, it can be shared by many calls (e.g. the chunks of a raw file)
+            so a value parsed in a chunk is not parsed again in the next ones.
+
+- parse_unique: factorize a Series and parse its distinct values, returns the codes and the parsed values.
+
+- apply_unique: same as parse_unique but returns a Series aligned with the input.
+"""
+
+class LRUCache:
+    """
+    Least Recently Used cache with at most 'maxsize' entries: when the cache is full, the least recently used value is evicted.
+    Missing values (None, NaN, pd.NA) are stored under a single sentinel key, because NaN != NaN.
+    """
+    _NAN = object()
+
+    def __init__(self, maxsize = 100_000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, value):
+        if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+            return self._NAN
+        return value
+
+    def lookup(self, value):
+        #return (True, parsed value) if the value is cached, (False, None) otherwise
+        key = self._key(value)
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return True, self.data[key]
+        self.misses += 1
+        return False, None
+
+    def store(self, value, result):
+        key = self._key(value)
+        self.data[key] = result
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last = False)
+
+    def __len__(self):
+        return len(self.data)
+
+def parse_unique(series, parser, cache = None, vectorized = False):
+    """
+    Factorize the Series and run the parser once per distinct value(missing values included).
+
+    Args:
+        series (pd.Series): column to parse.
+        parser (callable): if vectorized is False a function value -> result,
+                           otherwise a function pd.Series of distinct values -> array-like of results of the same length.
+        cache (LRUCache, optional): cache of parsed values shared between calls. Defaults to None.
+        vectorized (bool, optional): the parser works on a Series of values. Defaults to False.
+
+    Returns:
+        tuple: (codes, results) where codes is an integer array with the position of each row's value in results,
+               and results is a list with the parsed distinct values.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel = False)
+    uniques = list(uniques)
+    results = [None] * len(uniques)
+    missing = list(range(len(uniques)))
+    if cache is not None:
+        missing = []
+        for i, value in enumerate(uniques):
+            found, result = cache.lookup(value)
+            if found:
+                results[i] = result
+            else:
+                missing.append(i)
+
+    if vectorized:
+        parsed = parser(pd.Series([uniques[i] for i in missing], dtype = object)) if missing else []
+        parsed = list(np.asarray(parsed))
+    else:
+        parsed = [parser(uniques[i]) for i in missing]
+
+    for i, result in zip(missing, parsed):
+        results[i] = result
+        if cache is not None:
+            cache.store(uniques[i], result)
+    return codes, results
+
+def apply_unique(series, parser, cache = None, vectorized = False):
+    """
+    Parse the Series with parse_unique and broadcast the results to its rows.
+
+    Returns:
+        pd.Series: the parsed values, with the same index of the input.
+    """
+    codes, results = parse_unique(series, parser, cache, vectorized)
+    values = np.empty(len(results), dtype = object)
+    values[:] = results
+    return pd.Series(values[codes], index = series.index).infer_objects()
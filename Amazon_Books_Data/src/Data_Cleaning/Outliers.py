@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from src.Data_Cleaning.Cleaner import outlier_masks
+
+"""
+This module provides the Interquartile Range outlier search (Cleaner.find_outliers_iqr) for data that doesn't fit in memory,
+  e.g. the chunks of a CSV file (pd.read_csv(..., chunksize=...)) or the partitions written by Parallel.clean_file_parallel.
+
+The quartiles can't be computed exactly without all the values in memory, so each column is summarized by a t-digest:
+  a sorted set of centroids(mean, weight) that is small near the tails and the median and mergeable,
+  so the digests of different chunks(or processes) can be merged into the digest of the whole dataset.
+
+- TDigest: mergeable sketch of the distribution of a column, with approximate quantiles.
+- iqr_bounds_chunks: first pass, the bounds of the Interquartile Range method from the digests of the chunks.
+- find_outliers_iqr_chunks: second pass, the index labels of the outlier rows of each column.
+"""
+
+class TDigest:
+    """
+    Merging t-digest of the values of a column.
+    The values are buffered and compressed into centroids: sorted by value, the values whose quantile falls in the same
+      unit of the scale function k(q) = compression / (2*pi) * asin(2q - 1) are merged in one centroid,
+      so the centroids are small where k changes fast(the tails) and at most about 'compression' / 2 centroids are kept.
+    Missing values are ignored.
+
+    Attributes:
+        compression (int): accuracy of the digest, more centroids are kept with an higher compression.
+        means, weights (np.ndarray): the centroids, sorted by mean.
+        min, max (float): smallest and largest value seen.
+    """
+    def __init__(self, compression = 200, buffer_size = 100_000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values):
+        #add an array of values to the digest
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        #add the centroids of another digest to this one
+        other._compress()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(other.means, other.weights)
+        return self
+
+    def _compress(self, means = None, weights = None):
+        parts_means = [self.means] + self._buffer + ([means] if means is not None else [])
+        parts_weights = [self.weights] + [np.ones(len(b)) for b in self._buffer] + ([weights] if weights is not None else [])
+        self._buffer, self._buffered = [], 0
+        means, weights = np.concatenate(parts_means), np.concatenate(parts_weights)
+        if not len(means):
+            return
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # quantile of the center of each centroid and its unit of the scale function
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def __len__(self):
+        #number of values added to the digest
+        return int(self.weights.sum()) + self._buffered
+
+    def quantile(self, q):
+        """
+        Approximate quantiles, interpolating between the centers of the centroids(and the min/max values at the ends).
+
+        Args:
+            q (float or array-like): quantiles between 0 and 1.
+
+        Returns:
+            float or np.ndarray: the quantiles, NaN if the digest is empty.
+        """
+        self._compress()
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        total = self.weights.sum()
+        centers = np.r_[0, np.cumsum(self.weights) - self.weights / 2, total]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(np.asarray(q) * total, centers, values)
+
+def iqr_bounds_chunks(chunks, columns, compression = 200):
+    """
+    First pass of the outlier search: one TDigest for each column, updated chunk by chunk.
+
+    Args:
+        chunks (iterable): the DataFrames of the dataset.
+        columns (list): numeric columns for the search.
+        compression (int, optional): compression of the digests. Defaults to 200.
+
+    Returns:
+        pd.DataFrame: the bounds of the Interquartile Range method, as returned by Cleaner.iqr_bounds.
+    """
+    digests = {col: TDigest(compression) for col in columns}
+    for chunk in chunks:
+        for col in columns:
+            digests[col].update(chunk[col].to_numpy(dtype=float, na_value=np.nan))
+    bounds = {}
+    for col, digest in digests.items():
+        q1, q3 = digest.quantile([0.25, 0.75])
+        bounds[col] = [q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)]
+    return pd.DataFrame(bounds, index=['lower', 'upper'])
+
+def find_outliers_iqr_chunks(chunks, columns, bounds = None, compression = 200):
+    """
+    Outlier search of Cleaner.find_outliers_iqr(compact=True) on a dataset read in chunks,
+      only the digests and the index labels of the outlier rows are kept in memory.
+
+    Args:
+        chunks (callable): function without arguments that returns a new iterable of the DataFrames of the dataset,
+                           it's called twice if bounds is None(e.g. lambda: pd.read_csv(path, chunksize=100_000)).
+        columns (list): numeric columns for the search.
+        bounds (pd.DataFrame, optional): bounds computed before(iqr_bounds_chunks). Defaults to None.
+        compression (int, optional): compression of the digests. Defaults to 200.
+
+    Returns:
+        dict: the column names and the np.ndarray of the index labels of their outlier rows.
+    """
+    if bounds is None:
+        bounds = iqr_bounds_chunks(chunks(), columns, compression)
+    found = {col: [] for col in columns}
+    for chunk in chunks():
+        index = chunk.index.to_numpy()
+        for col, mask in outlier_masks(chunk, bounds[columns]).items():
+            found[col].append(index[mask])
+    return {col: np.concatenate(labels) if labels else np.empty(0, dtype=np.int64) for col, labels in found.items()}
@@ -0,0 +1,155 @@
+import sys
+import os
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Load_Data import Loader
+from src.Data_Cleaning import Pipeline
+from src.Normalization import Normalizer
+
+"""
+This module provides a parallel cleaning mode: the raw file is split in partitions of 'chunksize' rows
+  (Loader.load_dataset_chunks) and the partitions are cleaned by a pool of processes (ProcessPoolExecutor).
+
+The row-local steps (Pipeline.clean_rows) run in the workers, the steps that need statistics of the whole dataset
+  (mode fills, category encoding, rank scaling) need the statistics of all the partitions:
+   1. each worker cleans its partition and returns it with its partial statistics(partial_stats):
+      value counts of number_of_sellers and book_format, the category strings and the min/max of main_rank
+   2. the parent merges the partial statistics(merge_stats), it's cheap because they have one entry per distinct value
+   3. the merged statistics are broadcast to the global steps (Pipeline.clean_global(df, stats)),
+      so every partition is filled and encoded as if the whole dataset was cleaned at once.
+
+- partial_stats / merge_stats: mergeable statistics of the partitions.
+- clean_file_parallel: clean a raw file in parallel, the partitions are concatenated and written to a CSV file
+                       or written as a partitioned parquet dataset (one part-NNNNN.parquet for each partition).
+
+Usage(from the folder Amazon_Books_Data):
+    python src/Data_Cleaning/Parallel.py Amazon_popular_books_dataset.csv src/Data_Cleaning/cleaned_data.csv --workers 8
+"""
+
+# caches of the parsed values of each worker process, shared by all the partitions cleaned by the worker
+_caches = None
+
+def _worker_caches(maxsize):
+    global _caches
+    if _caches is None:
+        _caches = Pipeline.make_caches(maxsize)
+    return _caches
+
+def partial_stats(df):
+    """
+    Statistics of a partition cleaned by Pipeline.clean_rows, needed by the global steps.
+
+    Returns:
+        dict: value counts of 'number_of_sellers' and 'book_format', the distinct 'main_category' strings
+              and (min, max) of 'main_rank'.
+    """
+    rank = pd.to_numeric(df['main_rank'], errors='coerce')
+    return {
+        'number_of_sellers': df['number_of_sellers'].value_counts(),
+        'book_format': df['book_format'].value_counts(),
+        'categories': pd.unique(df['main_category'].astype(str)),
+        'rank_range': (rank.min(), rank.max()),
+    }
+
+def _merge_mode(counts):
+    #mode of the merged value counts, the smallest value wins the ties (as pd.Series.mode)
+    counts = [c for c in counts if len(c)]
+    if not counts:
+        return None
+    total = pd.concat(counts).groupby(level=0).sum()
+    return total[total == total.max()].index.sort_values()[0]
+
+def merge_stats(stats):
+    #merge the partial statistics of the partitions into the statistics of the whole dataset, for Pipeline.global_steps
+    return {
+        'number_of_sellers': _merge_mode([s['number_of_sellers'] for s in stats]),
+        'book_format': _merge_mode([s['book_format'] for s in stats]),
+        'categories': Normalizer.category_vocabulary(np.concatenate([s['categories'] for s in stats])),
+        'rank_range': (np.nanmin([s['rank_range'][0] for s in stats]), np.nanmax([s['rank_range'][1] for s in stats])),
+    }
+
+def _clean_partition(chunk, tmp_path = None, maxsize = 100_000):
+    #worker: row-local cleaning of a partition, the cleaned rows are returned or written to tmp_path
+    df = Pipeline.clean_rows(chunk, _worker_caches(maxsize))
+    stats = partial_stats(df)
+    if tmp_path is None:
+        return df, stats
+    df.to_parquet(tmp_path)
+    return None, stats
+
+def _finalize_partition(tmp_path, out_file, stats):
+    #worker: apply the global steps with the statistics of the whole dataset and write the partition
+    df = Pipeline.clean_global(pd.read_parquet(tmp_path), stats)
+    df.to_parquet(out_file, index=False)
+    os.remove(tmp_path)
+    return out_file
+
+def clean_file_parallel(raw_path, out_path = Pipeline.cleaned_path, workers = None, chunksize = 100_000,
+                        partitioned = False, maxsize = 100_000):
+    """
+    Clean a raw file with a pool of processes, the result is the same of Pipeline.clean_file.
+
+    The parent reads the partitions and submits them to the pool, at most 2 partitions per worker are pending,
+      so the memory used by the parent doesn't depend on the size of the file when the output is partitioned.
+
+    Args:
+        raw_path (str): path of the raw CSV file.
+        out_path (str, optional): output CSV file, or output folder if partitioned is True. None to not write the result.
+                                  Defaults to src/Data_Cleaning/cleaned_data.csv.
+        workers (int, optional): number of processes. Defaults to os.cpu_count().
+        chunksize (int, optional): number of raw rows of each partition. Defaults to 100000.
+        partitioned (bool, optional): write one part-NNNNN.parquet file for each partition in the folder out_path,
+                                      instead of concatenating the partitions. Defaults to False.
+        maxsize (int, optional): size of the LRUCache of each parsed column in each worker. Defaults to 100000.
+
+    Returns:
+        tuple: (cleaned DataFrame, or the list of the partition files if partitioned is True,
+                dict with the seconds of the row and global phases and the number of partitions)
+    """
+    workers = workers or os.cpu_count()
+    if partitioned:
+        os.makedirs(out_path, exist_ok=True)
+    timing = {}
+    start = time.perf_counter()
+    parts, stats = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for i, chunk in enumerate(Loader.load_dataset_chunks(raw_path, chunksize=chunksize)):
+            tmp_path = os.path.join(out_path, f"part-{i:05d}.tmp.parquet") if partitioned else None
+            pending.append((tmp_path, pool.submit(_clean_partition, chunk, tmp_path, maxsize)))
+            while len(pending) >= 2 * workers:
+                tmp_path, future = pending.popleft()
+                parts.append((tmp_path, future.result()))
+        parts.extend((tmp_path, future.result()) for tmp_path, future in pending)
+        stats = merge_stats([part_stats for _, (_, part_stats) in parts])
+        timing['rows_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if partitioned:
+            futures = [pool.submit(_finalize_partition, tmp_path, os.path.join(out_path, f"part-{i:05d}.parquet"), stats)
+                       for i, (tmp_path, _) in enumerate(parts)]
+            result = [future.result() for future in futures]
+    if not partitioned:
+        result = Pipeline.clean_global(pd.concat([df for _, (df, _) in parts]), stats)
+        if out_path is not None:
+            result.to_csv(out_path, index=False)
+    timing['global_seconds'] = time.perf_counter() - start
+    timing['partitions'] = len(parts)
+    return result, timing
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Clean the raw Amazon books dataset with a pool of processes.")
+    parser.add_argument('raw_path')
+    parser.add_argument('out_path', nargs='?', default=Pipeline.cleaned_path)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--partitioned', action='store_true', help="write a folder of parquet partitions")
+    args = parser.parse_args()
+    result, timing = clean_file_parallel(args.raw_path, args.out_path, args.workers, args.chunksize, args.partitioned)
+    print(timing)
@@ -0,0 +1,192 @@
+import sys
+import os
+import argparse
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.Load_Data import Loader
+from src.Data_Cleaning import Cleaner
+from src.Data_Cleaning.Memoizer import LRUCache
+from src.Data_Cleaning.Validation import Validator
+from src.Normalization import Normalizer
+
+"""
+This module provides the cleaning pipeline that produces cleaned_data.csv from the raw dataset Amazon_popular_books_dataset.csv.
+
+The pipeline runs the Cleaner functions in a declared order, each step is one of:
+   - 'transform': function DataFrame -> DataFrame, it changes the columns of the rows
+   - 'filter': function DataFrame -> boolean mask of the rows to keep
+The masks of consecutive filters are combined with & and applied once before the next transform,
+  so the rows are copied a single time and no intermediate full-frame copy is made by each filter.
+For each step the pipeline records wall time, rows in/out and, if requested, the memory delta of the DataFrame (CleaningPipeline.profile).
+
+- row_steps: the row-local steps, each output row depends only on the same input row (chunks, new rows of a snapshot...).
+- global_steps: the steps that need statistics of the whole dataset (mode fills, category encoding, rank scaling).
+- clean_rows / clean_global / clean_dataset: run the steps on a DataFrame.
+- clean_file: clean a raw file and write cleaned_data.csv.
+
+Usage(from the folder Amazon_Books_Data):
+    python src/Data_Cleaning/Pipeline.py Amazon_popular_books_dataset.csv src/Data_Cleaning/cleaned_data.csv
+"""
+
+cleaned_path = os.path.join(os.path.dirname(__file__), 'cleaned_data.csv')
+
+"""
+Columns parsed by the row steps through the Memoizer, make_caches returns one LRUCache for each of them.
+"""
+PARSED_COLUMNS = ['format', 'item_weight', 'availability', 'rating', 'categories']
+
+def make_caches(maxsize = 100_000):
+    #one LRUCache for each column of PARSED_COLUMNS, to share the parsed values between the chunks of a raw file
+    return {col: LRUCache(maxsize) for col in PARSED_COLUMNS}
+
+def _delete_columns(df):
+    Cleaner.delete_columns(df)
+    return df
+
+def _extract_best_sellers_rank(df):
+    df = Normalizer.extract_best_sellers_rank(df)
+    return df.drop(columns=['best_sellers_rank'])
+
+def row_steps(caches = None, validator = None):
+    """
+    Declared order of the row-local cleaning steps: (name, kind, function).
+    'caches' is an optional dict column -> LRUCache (see make_caches) that keeps the parsed values between runs.
+    'validator' is an optional Validation.Validator, that counts the rows rejected by each rule and can quarantine them.
+    """
+    caches = caches or {}
+    return [
+        ('delete_columns', 'transform', _delete_columns),
+        ('fill_prices', 'transform', Cleaner.fill_prices),
+        ('validation', 'filter', validator or Validator()),
+        ('number_of_sellers', 'transform', Cleaner.parse_number_of_sellers),
+        ('best_sellers_rank', 'transform', _extract_best_sellers_rank),
+        ('stock_columns', 'transform', lambda df: Cleaner.add_stock_columns(df, caches.get('availability'))),
+        ('format', 'transform', Cleaner.handle_format),
+        ('book_format', 'transform', lambda df: Cleaner.get_book_format(df, caches.get('format'))),
+        ('item_weight', 'transform', lambda df: Cleaner.parse_item_weight(df, caches.get('item_weight'))),
+        ('timestamp', 'transform', Cleaner.handle_timestamp),
+        ('rating', 'transform', lambda df: Cleaner.handle_rating(df, caches.get('rating'))),
+        ('categories', 'transform', lambda df: Cleaner.handle_categories(df, caches.get('categories'))),
+        ('range_columns', 'transform', Cleaner.add_range_columns),
+    ]
+
+def global_steps(stats = None):
+    """
+    Declared order of the cleaning steps that need statistics of the whole dataset: (name, kind, function).
+    'stats' is an optional dict with the statistics of the whole dataset (see Parallel.merge_stats):
+      'number_of_sellers' and 'book_format' modes, 'categories' and 'rank_range' of the best sellers rank.
+    Without stats they are computed on the DataFrame the steps run on.
+    """
+    stats = stats or {}
+    return [
+        ('fill_number_of_sellers', 'transform', lambda df: Cleaner.handle_number_of_sellers(df, stats.get('number_of_sellers'))),
+        ('fill_book_format', 'transform', lambda df: Cleaner.handle_book_fomat(df, stats.get('book_format'))),
+        ('encode_best_sellers_rank', 'transform',
+         lambda df: Normalizer.encode_best_sellers_rank(df, stats.get('categories'), stats.get('rank_range'))),
+    ]
+
+class CleaningPipeline:
+    """
+    Run a list of cleaning steps (name, kind, function) in order and profile them.
+
+    Attributes:
+        steps (list): the steps of the pipeline.
+        profile_memory (bool): measure the memory of the DataFrame after each step, memory_usage(deep=True) reads
+                               every string cell, so it's off by default.
+        profile (pd.DataFrame): after run, one row per step with seconds, rows_in, rows_out and memory_delta_mb
+                                (change of the DataFrame memory, NaN if profile_memory is False,
+                                the rows removed by a filter are counted when its mask is applied).
+    """
+    def __init__(self, steps, profile_memory = False):
+        self.steps = steps
+        self.profile_memory = profile_memory
+        self.profile = None
+
+    def _memory(self, df):
+        return df.memory_usage(deep=True).sum() if self.profile_memory else np.nan
+
+    def run(self, df):
+        records = []
+        mask = None
+        memory = self._memory(df)
+        for name, kind, func in self.steps:
+            rows_in = len(df)
+            start = time.perf_counter()
+            if kind == 'filter':
+                step_mask = func(df)
+                mask = step_mask if mask is None else mask & step_mask
+            else:
+                if mask is not None:
+                    df = df[mask]
+                    mask = None
+                df = func(df)
+            seconds = time.perf_counter() - start
+            new_memory = self._memory(df)
+            records.append({'step': name, 'kind': kind, 'seconds': seconds, 'rows_in': rows_in,
+                            'rows_out': len(df) if mask is None else int(mask.sum()),
+                            'memory_delta_mb': (new_memory - memory) / 2**20})
+            memory = new_memory
+        if mask is not None:
+            df = df[mask]
+        self.profile = pd.DataFrame(records)
+        return df
+
+def clean_rows(df, caches = None, validator = None):
+    """
+    Apply the row-local cleaning steps (row_steps), the function can be applied to any subset of the raw dataset.
+    Missing number_of_sellers and book_format values are not filled and main_category/main_rank are not encoded,
+      because these steps need statistics of the whole dataset(see clean_global).
+    """
+    return CleaningPipeline(row_steps(caches, validator)).run(df)
+
+def clean_global(df, stats = None):
+    #apply the cleaning steps that need statistics of the whole dataset (global_steps) to rows cleaned by clean_rows
+    return CleaningPipeline(global_steps(stats)).run(df)
+
+def clean_dataset(df, caches = None, validator = None):
+    #clean the raw dataset Amazon_popular_books_dataset.csv and return the DataFrame of cleaned_data.csv
+    return CleaningPipeline(row_steps(caches, validator) + global_steps()).run(df)
+
+def clean_file(raw_path, out_path = cleaned_path, engine = 'c', validator = None, category_ranks_path = None, profile_memory = False):
+    """
+    Clean a raw file and write the result to out_path (by default src/Data_Cleaning/cleaned_data.csv).
+    Only the columns kept by the Cleaner are parsed (Loader.load_raw_dataset).
+    The rows rejected by the validation are counted(and quarantined) by 'validator'(Validation.Validator), if given.
+    If category_ranks_path is given, all the category ranks of the cleaned rows are written to a Parquet file
+      (Normalizer.explode_best_sellers_rank), because the column best_sellers_rank is not kept in the cleaned dataset.
+    If profile_memory is True the profile has the memory delta of each step(CleaningPipeline.profile_memory).
+
+    Returns:
+        tuple: (cleaned DataFrame, profile DataFrame of the pipeline, with a first step 'load' for the raw file)
+    """
+    start = time.perf_counter()
+    df = raw = Loader.load_raw_dataset(raw_path, engine)
+    pipeline = CleaningPipeline(row_steps(make_caches(), validator) + global_steps(), profile_memory)
+    load = {'step': 'load', 'kind': 'read', 'seconds': time.perf_counter() - start, 'rows_in': 0, 'rows_out': len(df),
+            'memory_delta_mb': pipeline._memory(df) / 2**20}
+    df = pipeline.run(df)
+    if category_ranks_path is not None:
+        Normalizer.explode_best_sellers_rank(raw.loc[df.index]).save(category_ranks_path)
+    if out_path is not None:
+        df.to_csv(out_path, index=False)
+    profile = pd.concat([pd.DataFrame([load]), pipeline.profile], ignore_index=True)
+    return df, profile
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Clean the raw Amazon books dataset and write cleaned_data.csv.")
+    parser.add_argument('raw_path')
+    parser.add_argument('out_path', nargs='?', default=cleaned_path)
+    parser.add_argument('--engine', default='c', choices=list(Loader.READ_ENGINES))
+    parser.add_argument('--quarantine', default=None, help="folder of the quarantine files of the rejected rows")
+    parser.add_argument('--category-ranks', default=None, help="Parquet file of the long-form category rank table")
+    parser.add_argument('--profile-memory', action='store_true', help="measure the memory delta of each step")
+    args = parser.parse_args()
+    validator = Validator(quarantine_dir=args.quarantine)
+    df, profile = clean_file(args.raw_path, args.out_path, args.engine, validator, args.category_ranks, args.profile_memory)
+    print(profile.round(4).to_string(index=False))
+    print("\nRejected rows by rule:\n")
+    print(validator.report.to_string())
+    print(f"\n{len(df)} rows written to {args.out_path}")
@@ -0,0 +1,106 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+from src.Data_Cleaning import Cleaner
+
+"""
+This module provides the validation stage of the cleaning pipeline: the rows that the Cleaner would drop
+  (Cleaner.valid_price_mask and Cleaner.required_columns_mask) are rejected with a reason code instead of silently dropped.
+
+Each rule is a (code, function) pair, the function returns the boolean mask of the rows that break the rule.
+All the rules are evaluated once on the columns and stacked in a single matrix(rows x rules),
+  so the counts of each rule and the reason of each rejected row come from the same pass over the data.
+
+- RULES: the rules of the Cleaner, together they reject the same rows of valid_price_mask & required_columns_mask.
+- rule_violations: the matrix of the rules broken by each row.
+- Validator: filter step of the pipeline(Pipeline.row_steps) that counts the rejected rows of each rule
+             and writes them to a quarantine Parquet file with their reason code.
+"""
+
+def _missing(col):
+    return lambda df: df[col].isna()
+
+RULES = [
+    ('missing_price', lambda df: df[['initial_price', 'final_price', 'discount']].isna().any(axis=1)),
+    ('non_positive_price', lambda df: (df['initial_price'] <= 0) | (df['final_price'] <= 0)),
+    ('negative_discount', lambda df: df['discount'] < 0),
+    ('final_above_initial', lambda df: df['final_price'] > df['initial_price']),
+] + [(f'missing_{col}', _missing(col)) for col in Cleaner.REQUIRED_COLUMNS]
+
+def rule_violations(df, rules = RULES):
+    #boolean matrix(rows x rules) of the rules broken by each row
+    violations = np.zeros((len(df), len(rules)), dtype=bool)
+    for i, (_, rule) in enumerate(rules):
+        violations[:, i] = np.asarray(rule(df), dtype=bool)
+    return violations
+
+class Validator:
+    """
+    Filter step that rejects the rows breaking at least one rule.
+    The validator can be called on many DataFrames(e.g. the chunks of a file, the snapshots of an ingestion),
+      the counts are summed and each call with rejected rows writes a new file in quarantine_dir,
+      numbered after the files already in the folder: quarantine-00000.parquet, quarantine-00001.parquet, ...
+      The rows are written to a temporary file that is then hard linked to the first free number(the link fails if the name is taken),
+      so validators sharing the folder never overwrite a file and a quarantine file is never partial, also if the write fails.
+    The quarantined rows keep their index and have two more columns:
+       reject_reason: code of the first rule broken by the row
+       reject_flags: bit i is set if the row breaks the rule i of 'rules'
+
+    Attributes:
+        rules (list): the (code, function) rules.
+        quarantine_dir (str): folder of the quarantine files, None to not write the rejected rows.
+        rows (int): number of rows validated.
+        counts (dict): number of rejected rows of each rule, a row breaking many rules is counted by each of them.
+        files (list): the quarantine files written.
+    """
+    def __init__(self, rules = RULES, quarantine_dir = None):
+        self.rules = rules
+        self.quarantine_dir = quarantine_dir
+        self.rows = 0
+        self.rejected = 0
+        self.counts = {code: 0 for code, _ in rules}
+        self.files = []
+
+    def __call__(self, df):
+        violations = rule_violations(df, self.rules)
+        rejected = violations.any(axis=1)
+        self.rows += len(df)
+        self.rejected += int(rejected.sum())
+        for (code, _), count in zip(self.rules, violations.sum(axis=0)):
+            self.counts[code] += int(count)
+        if self.quarantine_dir is not None and rejected.any():
+            self._quarantine(df[rejected], violations[rejected])
+        return pd.Series(~rejected, index=df.index)
+
+    def _quarantine(self, df, violations):
+        codes = np.array([code for code, _ in self.rules])
+        flags = violations.astype(np.int64) @ (np.int64(1) << np.arange(len(self.rules), dtype=np.int64))
+        df = df.assign(reject_reason=codes[violations.argmax(axis=1)], reject_flags=flags)
+        os.makedirs(self.quarantine_dir, exist_ok=True)
+        # the temporary name doesn't match quarantine-*.parquet, so the readers of the folder never see it
+        tmp = os.path.join(self.quarantine_dir, f".quarantine-{os.getpid()}-{id(self)}.tmp")
+        try:
+            df.to_parquet(tmp)
+            number = len(glob.glob(os.path.join(self.quarantine_dir, "quarantine-*.parquet")))
+            # os.link fails if the name exists, so validators writing to the same folder(or a gap left by a deleted file)
+            #   never overwrite an existing file: a taken name is skipped
+            while True:
+                file = os.path.join(self.quarantine_dir, f"quarantine-{number:05d}.parquet")
+                try:
+                    os.link(tmp, file)
+                    break
+                except FileExistsError:
+                    number += 1
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.files.append(file)
+
+    @property
+    def report(self):
+        #number of rejected rows of each rule, with the total of rejected and validated rows
+        report = pd.Series(self.counts, name='rows', dtype='int64')
+        report['rejected'] = self.rejected
+        report['validated'] = self.rows
+        return report
@@ -1,17 +1,364 @@
+import hashlib
+import json
+import os
 import pandas as pd
 
 #load the dataset Amazon_popular_books_dataset.csv  to a pandas dataframe:
 filename = r"C:\\Users\\lenovo\\Documents\\analytics\\Amazon_Books_Data\\Amazon_popular_books_dataset.csv"
 
-def load_dataset(path):
+"""
+This module provides functions to load the datasets into pandas DataFrames:
+
+- load_dataset: Load a CSV file, using a Parquet sidecar cache to skip CSV parsing after the first read.
+                The DataFrame has the content hash of the file in df.attrs['dataset_version'](dataset_version).
+                The CSV parser is selected with the argument 'engine' (see READ_ENGINES).
+
+- load_raw_dataset: Load a raw scrape file, parsing only the columns the Cleaner keeps.
+
+- load_dataset_chunks: Stream a raw scrape file in typed chunks, parsing only the columns the Cleaner keeps.
+
+- apply_schema: Cast the columns of cleaned_data.csv to the memory-compact dtypes declared in SCHEMA.
+
+- memory_report: Show the memory used by each column before and after apply_schema.
+
+The cache is stored in a '.cache' folder next to the CSV file:
+   .cache/<name>.parquet  the parsed DataFrame
+   .cache/<name>.json     the fingerprint (size, mtime, hash) of the CSV file the cache was built from
+The cache is rebuilt automatically when the CSV file changes.
+"""
+
+CACHE_DIR = ".cache"
+
+# reads of a CSV file replaced while it's parsed, see load_dataset
+READ_ATTEMPTS = 3
+
+"""
+Declared schema of cleaned_data.csv:
+   - category: low-cardinality strings (brands, sellers, categories, formats, ranges...)
+   - int8/int16/int32: integer columns downcast to the smallest type that fits their range
+   - Int16: nullable integer for quantity_in_stock, that the Cleaner leaves NaN when the availability doesn't report a quantity
+   - float32: prices, weights, ratings and ranks
+asin, title and timestamp are unique (or almost unique) strings and keep the default string dtype.
+"""
+SCHEMA = {
+    'brand': 'category',
+    'currency': 'category',
+    'discount': 'float32',
+    'final_price': 'float32',
+    'images_count': 'int16',
+    'initial_price': 'float32',
+    'item_weight': 'float32',
+    'rating': 'float32',
+    'reviews_count': 'int32',
+    'root_bs_rank': 'int32',
+    'seller_id': 'category',
+    'seller_name': 'category',
+    'video_count': 'int16',
+    'categories': 'category',
+    'number_of_sellers': 'int16',
+    'main_category': 'int16',
+    'main_rank': 'float32',
+    'quantity_in_stock': 'Int16',
+    'is_in_stock': 'int8',
+    'book_format': 'category',
+    'discount_pct': 'float32',
+    'discount_range': 'category',
+    'price_range': 'category',
+    'num_reviews_range': 'category',
+}
+
+"""
+Columns of the raw dataset Amazon_popular_books_dataset.csv with too many missing values or not useful for analysis,
+  Cleaner.delete_columns drops them and load_dataset_chunks never parses them.
+"""
+UNUSED_RAW_COLUMNS = ['upc','answered_questions','department','delivery','domain','features','product_dimensions','video','colors','image',
+                      'date_first_available','model_number','description',
+                      'manufacturer','plus_content','buybox_seller','image_url','url','ISBN10']
+
+"""
+Dtypes of the raw columns kept by the Cleaner.
+Columns that the Cleaner parses or coerces (prices, rating, weight, JSON lists...) are read as strings,
+  so every chunk gets the same dtypes regardless of the values it contains.
+"""
+RAW_DTYPES = {
+    'asin': str,
+    'brand': str,
+    'currency': str,
+    'discount': str,
+    'final_price': str,
+    'images_count': 'Int64',
+    'initial_price': str,
+    'item_weight': str,
+    'rating': str,
+    'reviews_count': 'Int64',
+    'root_bs_rank': 'float64',
+    'seller_id': str,
+    'seller_name': str,
+    'timestamp': str,
+    'title': str,
+    'video_count': 'Int64',
+    'categories': str,
+    'number_of_sellers': str,
+    'best_sellers_rank': str,
+    'format': str,
+    'availability': str,
+}
+
+"""
+CSV reader backends that can be selected with load_dataset(engine=...):
+   - 'c': the pandas C parser
+   - 'pyarrow': the multithreaded pyarrow CSV reader
+   - 'mmap': the pandas C parser reading a memory-mapped file, the file is not copied into a Python buffer
+Compressed files (.gz, .zst, .bz2, .xz, .zip) are decompressed transparently by all the backends(compression is inferred from the extension).
+The timestamp column is always read as a string, because pyarrow would otherwise parse it as a datetime.
+Benchmark/Loader_Benchmark.py measures rows/sec and peak memory of each backend.
+"""
+READ_ENGINES = {
+    'c': {'engine': 'c'},
+    'pyarrow': {'engine': 'pyarrow'},
+    'mmap': {'engine': 'c', 'memory_map': True},
+}
+
+def read_csv(path, engine = 'c', **kwargs):
+    """
+    Read a CSV file with one of the backends of READ_ENGINES.
+
+    Args:
+        path (str): The file path to the CSV file, it can be compressed.
+        engine (str, optional): 'c', 'pyarrow' or 'mmap'. Defaults to 'c'.
+        **kwargs: other arguments for pd.read_csv.
+
+    Raises:
+        ValueError: if the engine is not valid.
+    """
+    if engine not in READ_ENGINES:
+        raise ValueError(f"Engine '{engine}' not valid, choose one of {list(READ_ENGINES)}")
+    dtype = {'timestamp': str, **kwargs.pop('dtype', {})}
+    return pd.read_csv(path, dtype=dtype, **READ_ENGINES[engine], **kwargs)
+
+def _cache_paths(path):
+    #return the paths of the parquet cache and of its fingerprint file for the CSV file 'path'
+    folder, name = os.path.split(os.path.abspath(path))
+    base = os.path.join(folder, CACHE_DIR, os.path.splitext(name)[0])
+    return base + ".parquet", base + ".json"
+
+def _file_hash(path, block_size = 1 << 20):
+    #hash the content of the file reading blocks of 1MB
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_meta(path):
+    #stored fingerprint of the cache of the CSV file 'path', None if it's missing
+    try:
+        with open(_cache_paths(path)[1]) as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else None
+    except (OSError, ValueError):
+        return None
+
+def _fingerprint(path):
+    """
+    Fingerprint (size, mtime, hash) of the CSV file 'path' and the stored fingerprint of its cache(None if missing).
+    The content hash is read from the stored fingerprint when size and mtime of the file match, otherwise the file is hashed.
+    """
+    stat = os.stat(path)
+    meta = _read_meta(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if meta and meta.get('size') == stat.st_size and meta.get('mtime_ns') == stat.st_mtime_ns and 'hash' in meta:
+        fingerprint['hash'] = meta['hash']
+    else:
+        fingerprint['hash'] = _file_hash(path)
+    return fingerprint, meta
+
+def _unchanged(path, fingerprint):
+    #check that size and mtime of the file are still the ones of the fingerprint
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return stat.st_size == fingerprint['size'] and stat.st_mtime_ns == fingerprint['mtime_ns']
+
+def _read_cache(path, fingerprint, meta):
+    """
+    Return the cached DataFrame of the CSV file 'path' or None if the cache is missing or stale.
+    The cache is valid if the stored fingerprint has the size and the content hash of the file(fingerprint, taken before reading),
+      if only the mtime changed (e.g. the file was checked out again) the stored fingerprint is refreshed.
+    """
+    if not meta or meta.get('size') != fingerprint['size'] or meta.get('hash') != fingerprint['hash']:
+        return None
+    cache_file, meta_file = _cache_paths(path)
+    try:
+        df = pd.read_parquet(cache_file)
+        if meta.get('mtime_ns') != fingerprint['mtime_ns']:
+            _write_json(meta_file, fingerprint)
+        return df
+    except (OSError, ValueError, ImportError):
+        return None
+
+def _write_json(meta_file, meta):
+    tmp = f"{meta_file}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_file)
+
+def _write_cache(path, df, fingerprint):
+    """
+    Write the DataFrame to the parquet cache of the CSV file 'path' together with its fingerprint, taken before parsing the file.
+    The file is checked again before the cache is replaced: if it changed while it was parsed, the cache is not written,
+      so the content of the old file is never stored under the fingerprint of the new one.
+    Files are written to a temporary name and then renamed, so concurrent readers never see a partial cache.
+    Errors are ignored (read-only folder, pyarrow not installed...): the cache is only an optimization.
+    """
+    cache_file, meta_file = _cache_paths(path)
+    tmp = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok = True)
+        df.to_parquet(tmp, index = False)
+        if not _unchanged(path, fingerprint):
+            os.remove(tmp)
+            return
+        os.replace(tmp, cache_file)
+        _write_json(meta_file, fingerprint)
+    except (OSError, ValueError, ImportError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def clear_cache(path):
+    #delete the parquet cache of the CSV file 'path'
+    for file in _cache_paths(path):
+        if os.path.exists(file):
+            os.remove(file)
+
+def apply_schema(df, schema = SCHEMA):
+    """
+    Cast the columns of the DataFrame to the dtypes declared in the schema, columns not in the schema are not changed.
+    Integer columns that contain NaN values are cast to the nullable integer type of the same size (e.g. int16 -> Int16)
+      instead of raising an error.
+
+    Args:
+        df (pd.DataFrame): DataFrame with the cleaned data.
+        schema (dict, optional): column -> dtype. Defaults to SCHEMA.
+
+    Returns:
+        pd.DataFrame: DataFrame with the compact dtypes.
+    """
+    dtypes = {}
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('int') and df[col].isna().any():
+            dtype = dtype.capitalize()
+        dtypes[col] = dtype
+    return df.astype(dtypes)
+
+def memory_report(df, schema = SCHEMA):
+    """
+    Compare the memory used by each column of the DataFrame before and after apply_schema.
+
+    Returns:
+        pd.DataFrame: one row per column (plus a final 'total' row) with dtype and bytes before/after
+                      and the ratio bytes_before / bytes_after.
+    """
+    compact = apply_schema(df, schema)
+    report = pd.DataFrame({
+        'dtype_before': df.dtypes.astype(str),
+        'bytes_before': df.memory_usage(deep=True, index=False),
+        'dtype_after': compact.dtypes.astype(str),
+        'bytes_after': compact.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['ratio'] = (report['bytes_before'] / report['bytes_after']).round(2)
+    return report
+
+def dataset_version(path):
+    #content hash of the file, read from the cache metadata when size and mtime of the file match
+    return _fingerprint(path)[0]['hash']
+
+def load_dataset(path, use_cache = True, compact = False, engine = 'c'):
     """Load the dataset from a CSV file into a pandas DataFrame.
 
+    The first read parses the CSV file and stores the result in a Parquet sidecar cache,
+      the next reads load the cache directly until the CSV file changes.
+    The version of the file is stored in df.attrs['dataset_version'], so the models can cache structures built on the dataset.
+    The fingerprint of the file(size, mtime, content hash) is taken once before reading, it's used for the cache check,
+      the cache write and the version; if the file is replaced while it's parsed it's read again(at most READ_ATTEMPTS times).
+
     Args:
         path (str): The file path to the CSV file.
+        use_cache (bool, optional): read and write the Parquet cache. Defaults to True.
+        compact (bool, optional): cast the columns to the memory-compact dtypes of SCHEMA. Defaults to False.
+        engine (str, optional): CSV reader backend used when the cache is missing or stale, see READ_ENGINES. Defaults to 'c'.
     """
-    df = pd.read_csv(path)
+    for _ in range(READ_ATTEMPTS):
+        fingerprint, meta = _fingerprint(path)
+        df = _read_cache(path, fingerprint, meta) if use_cache else None
+        if df is not None:
+            break
+        df = read_csv(path, engine)
+        df = df.drop('index', axis=1, errors='ignore')
+        if _unchanged(path, fingerprint):
+            if use_cache:
+                _write_cache(path, df, fingerprint)
+            break
+    if compact:
+        df = apply_schema(df)
     #change labels values
     df.index = range(1, len(df) + 1)
-    df = df.drop('index', axis=1, errors='ignore')
+    df.attrs['dataset_version'] = fingerprint['hash']
     return df
 
+def _raw_read_args(path, columns):
+    """
+    Return the arguments usecols and dtype of pd.read_csv for the raw columns to read,
+      if columns is None only the header of the file is read to find all the columns except UNUSED_RAW_COLUMNS.
+    usecols is always a list, because the pyarrow engine doesn't accept a callable.
+    """
+    if columns is None:
+        excluded = set(UNUSED_RAW_COLUMNS) | {'index'}
+        columns = [col for col in pd.read_csv(path, nrows=0).columns if col not in excluded]
+    usecols = list(columns)
+    dtype = {col: t for col, t in RAW_DTYPES.items() if col in usecols}
+    return usecols, dtype
+
+def load_raw_dataset(path, engine = 'c', columns = None):
+    """
+    Load a raw scrape file (e.g. Amazon_popular_books_dataset.csv) with the dtypes of RAW_DTYPES,
+      parsing only the selected columns (by default all the columns except UNUSED_RAW_COLUMNS).
+
+    Args:
+        path (str): The file path to the CSV file.
+        engine (str, optional): CSV reader backend, see READ_ENGINES. Defaults to 'c'.
+        columns (list, optional): columns to read. Defaults to all the columns except UNUSED_RAW_COLUMNS.
+    """
+    usecols, dtype = _raw_read_args(path, columns)
+    df = read_csv(path, engine, usecols=usecols, dtype=dtype)
+    df.index = range(1, len(df) + 1)
+    return df
+
+def load_dataset_chunks(path, chunksize = 100_000, columns = None):
+    """
+    Read a raw scrape file (e.g. Amazon_popular_books_dataset.csv) in chunks of 'chunksize' rows,
+      so the memory used doesn't depend on the size of the file.
+    Only the selected columns are parsed: by default all the columns except UNUSED_RAW_COLUMNS,
+      that are the columns dropped by Cleaner.delete_columns (features, description... are large text blobs).
+    Chunks have the dtypes declared in RAW_DTYPES and a 1-based index that continues from one chunk to the next,
+      as the DataFrame returned by load_dataset.
+
+    Args:
+        path (str): The file path to the CSV file.
+        chunksize (int, optional): number of rows of each chunk. Defaults to 100000.
+        columns (list, optional): columns to read. Defaults to all the columns except UNUSED_RAW_COLUMNS.
+
+    Yields:
+        pd.DataFrame: the chunks of the file.
+    """
+    usecols, dtype = _raw_read_args(path, columns)
+    start = 1
+    with pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk.index = range(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
@@ -3,6 +3,7 @@ import numpy as np
 from sklearn.calibration import LabelEncoder
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 import json
+import os
 
 """
 This module provide functions to normalize numerical columns in the amazon_book_dataset.csv.
@@ -14,20 +15,27 @@ Data normalization allows to compare different numerical columns on the same sca
 - Log transformation followed by Z-score standardization for highly skewed columns (e.g., reviews_count)
 - Inverted Min-Max scaling for ranking-related columns (e.g., root_bs_rank)
 - Z-score standardization for columns with limited variance (e.g., number_of_sellers)
+- Long-form table of all the category ranks of the column best_sellers_rank (explode_best_sellers_rank)
+- BookNormalizer: the same normalizations with parameters fitted once, that can be saved to a JSON file,
+    so new rows are normalized without fitting again and normalized values can be converted back(inverse_transform)
+- feature_matrix: the features of the recommendation models as a contiguous float32 matrix, that can be saved to .npy files
+- RunningStats / StreamingNormalizer: streaming version of BookNormalizer for incremental ingestion, the parameters are
+    updated chunk by chunk(or merged between workers) and the drift of the normalized values is reported
 """
 
+normalizer_path = os.path.join(os.path.dirname(__file__), 'normalizer.json')
+
 def normalize_prices(df):
     """
     Normalize the price columns in the DataFrame using Min-Max scaling from sklearn..
     This function scales the 'initial_price' and 'final_price' columns to a range of
        [0, 1] by applying Min-Max normalization.
     That's useful for comparing prices across different books on a common scale.
+    The result is built with df.assign, so df is never changed(also without pandas Copy-on-Write).
     """
-    df2 = df.copy()
-    price_columns = ['initial_price', 'final_price']
     scaler = MinMaxScaler()
-    df2[['final_price', 'initial_price']] = scaler.fit_transform(df2[['final_price', 'initial_price']])
-    return df2
+    scaled = scaler.fit_transform(df[['final_price', 'initial_price']])
+    return df.assign(final_price=scaled[:, 0], initial_price=scaled[:, 1])
 
 def normalize_reviews(df):
     """
@@ -35,13 +43,12 @@ def normalize_reviews(df):
     The values of the column 'reviews_count' vary from a range of tens up to thousands(skewed distribution),
        log transformation helps to make the values of column 'reviews_count' more normal
        and the Z-score tranformation works better on normalized data.
+    The result is built with df.assign, as in normalize_prices.
     """
-    df2 = df.copy()
-    df2['log_reviews'] = np.log1p(df2['reviews_count'])  
-    mean = df2['log_reviews'].mean()
-    std = df2['log_reviews'].std()
-    df2['reviews_normalized'] = (df2['log_reviews'] - mean) / std
-    return df2
+    log_reviews = np.log1p(df['reviews_count'])
+    mean = log_reviews.mean()
+    std = log_reviews.std()
+    return df.assign(log_reviews=log_reviews, reviews_normalized=(log_reviews - mean) / std)
 
 def normalize_root_bs_rank(df):
     """
@@ -66,49 +73,173 @@ def normalize_number_of_sellers(df):
     df['number_of_sellers_norm'] = StandardScaler().fit_transform(df[['number_of_sellers']])
     return df
 
-def normalize_best_sellers_rank(df):
+def _extract_info(value):
+    #category and rank of the first dictionary of a best_sellers_rank JSON string, (None, None) if it's not valid
+    try:
+        data = json.loads(value)
+        if isinstance(data, list) and len(data) > 0:
+            return data[0].get('category'), data[0].get('rank')
+    except (json.JSONDecodeError, TypeError, IndexError):
+        pass
+    return None, None
+
+def extract_best_sellers_rank(df):
     """
-    Extract book category and rank from the best_sellers_rank column.
+    Extract book category and rank from the best_sellers_rank column, without normalizing them.
     
     The best_sellers_rank column contains JSON-formatted strings representing lists of dictionaries, each with:
      - category: an Amazon category of the book (with a structure, separated by slashes /)
      - rank: the position of the book within that category
      
-    The function extract the category and the rank of the book within that category,
+    The function extract the category and the rank of the first dictionary of the list,
       and save the extracted values in two new columns:
-      - 'main_category'
-      - 'main_rank'
-      
-    Then normalize the column 'main_category' using LabelEncoding from sklearn, and normalize
-       the column 'main_rank' using Min-Max scaling.
-    Label econding is used to convert categorical values into numerical values.
-    
-    Returns the updated DataFrame with normalized columns.
+      - 'main_category': the category string
+      - 'main_rank': the rank within that category
+    Each row is processed independently, so the function can be applied to chunks of the dataset.
+    Each distinct JSON string is parsed once(pd.factorize) and the two columns are built from the parsed lists,
+      without creating a pd.Series for each row.
+    """
+    codes, uniques = pd.factorize(df['best_sellers_rank'], use_na_sentinel=False)
+    categories = np.empty(len(uniques), dtype=object)
+    ranks = np.empty(len(uniques), dtype=object)
+    for i, value in enumerate(uniques):
+        categories[i], ranks[i] = _extract_info(value)
+
+    df['main_category'] = pd.Series(categories[codes], index=df.index).infer_objects()
+    df['main_rank'] = pd.Series(ranks[codes], index=df.index).infer_objects()
+    return df
+
+def _extract_all(value):
+    #(category, rank) of all the dictionaries of a best_sellers_rank JSON string with both values, [] if it's not valid
+    try:
+        data = json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    if not isinstance(data, list):
+        return []
+    return [(d['category'], int(d['rank'])) for d in data
+            if isinstance(d, dict) and d.get('category') is not None and isinstance(d.get('rank'), (int, float))]
+
+class CategoryRankTable:
     """
-    def extract_info(x):
-        try:
-            data = json.loads(x)
-            if isinstance(data, list) and len(data) > 0:
-                return data[0].get('category'), data[0].get('rank')
-        except (json.JSONDecodeError, TypeError, IndexError):
-            pass
-        return None, None
+    Long-form table of all the (category, rank) pairs of the column best_sellers_rank, not only the first one(main_category).
+    The asins and the categories are stored once(asins, categories) and the table only has integer codes:
+       asin_code (int32): position of the asin in 'asins'
+       category_id (int32): position of the category in 'categories'(sorted alphabetically)
+       rank (int32): rank of the book in the category
+    The rows are sorted by category_id and rank, so the rows of a category are found with a binary search(np.searchsorted).
+    """
+    def __init__(self, asins, categories, asin_code, category_id, rank):
+        self.asins = pd.Index(asins)
+        self.categories = pd.Index(categories)
+        order = np.lexsort((rank, category_id))
+        self.asin_code = np.asarray(asin_code, dtype=np.int32)[order]
+        self.category_id = np.asarray(category_id, dtype=np.int32)[order]
+        self.rank = np.asarray(rank, dtype=np.int32)[order]
+
+    def __len__(self):
+        return len(self.rank)
+
+    @property
+    def table(self):
+        return pd.DataFrame({'asin_code': self.asin_code, 'category_id': self.category_id, 'rank': self.rank})
+
+    def category_rows(self, category):
+        #slice of the rows of a category, an empty slice if the category is unknown
+        if category not in self.categories:
+            return slice(0, 0)
+        category_id = self.categories.get_loc(category)
+        start, end = np.searchsorted(self.category_id, [category_id, category_id + 1])
+        return slice(start, end)
+
+    def top(self, category, n = 10):
+        #the n books with the best rank in a category: DataFrame with the columns 'asin' and 'rank'
+        rows = self.category_rows(category)
+        rows = slice(rows.start, min(rows.stop, rows.start + n))
+        return pd.DataFrame({'asin': self.asins[self.asin_code[rows]], 'rank': self.rank[rows]})
+
+    def save(self, path):
+        #write the table to a Parquet file, asins and categories are dictionary-encoded(pd.Categorical) with the same codes
+        pd.DataFrame({
+            'asin': pd.Categorical.from_codes(self.asin_code, categories=self.asins),
+            'category': pd.Categorical.from_codes(self.category_id, categories=self.categories),
+            'rank': self.rank,
+        }).to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path):
+        df = pd.read_parquet(path)
+        return cls(df['asin'].cat.categories, df['category'].cat.categories,
+                   df['asin'].cat.codes, df['category'].cat.codes, df['rank'])
+
+def explode_best_sellers_rank(df):
+    """
+    Build the CategoryRankTable of the columns 'asin' and 'best_sellers_rank'.
+    As in extract_best_sellers_rank each distinct JSON string is parsed once, then the (category, rank) pairs
+      are broadcast to the rows with NumPy arrays(np.repeat), without a Python loop over the rows.
+    Dictionaries without category or numeric rank are skipped.
+    """
+    codes, uniques = pd.factorize(df['best_sellers_rank'], use_na_sentinel=False)
+    pairs = [_extract_all(value) for value in uniques]
+    lengths = np.array([len(p) for p in pairs], dtype=np.int64)
+    categories = np.array([c for p in pairs for c, _ in p], dtype=object)
+    ranks = np.array([r for p in pairs for _, r in p], dtype=np.int64)
+
+    # position of the pairs of each row in the flat arrays of the distinct strings
+    row_lengths = lengths[codes]
+    rows = np.repeat(np.arange(len(df)), row_lengths)
+    starts = np.r_[0, np.cumsum(lengths)[:-1]] if len(lengths) else np.empty(0, dtype=np.int64)
+    row_starts = np.cumsum(row_lengths) - row_lengths
+    flat = np.repeat(starts[codes] - row_starts, row_lengths) + np.arange(len(rows))
 
-    df[['main_category', 'main_rank']] = df['best_sellers_rank'].apply(
-        lambda x: pd.Series(extract_info(x))
-    )
+    category_codes, category_names = pd.factorize(categories, sort=True)
+    asin_codes, asins = pd.factorize(df['asin'])
+    return CategoryRankTable(asins, category_names, asin_codes[rows], category_codes[flat], ranks[flat])
 
+def category_vocabulary(values):
+    #sorted distinct category strings, as the classes of the LabelEncoder(a missing category is NaN and it's the last class)
+    return LabelEncoder().fit(np.asarray(values, dtype=object)).classes_.tolist()
+
+def encode_best_sellers_rank(df, categories = None, rank_range = None):
+    """
+    Normalize the columns 'main_category' and 'main_rank' extracted by extract_best_sellers_rank:
+    the column 'main_category' is normalized using LabelEncoding from sklearn, and the column 'main_rank' using Min-Max scaling.
+    Label econding is used to convert categorical values into numerical values.
+    Both encodings depend on all the rows, so the function must be applied to the whole dataset,
+      or to a part of it passing the statistics of the whole dataset:
+      - categories: all the category strings of the dataset(the classes of the LabelEncoder)
+      - rank_range: (min, max) of the column 'main_rank'
+    """
     # Normalize main_category using Label Encoding
     le = LabelEncoder()
-    df['main_category'] = le.fit_transform(df['main_category'].astype(str))
+    if categories is None:
+        df['main_category'] = le.fit_transform(df['main_category'].astype(str))
+    else:
+        le.fit(np.asarray(categories, dtype=object))
+        df['main_category'] = le.transform(df['main_category'].astype(str))
 
     # Normalize main_rank
     df['main_rank'] = pd.to_numeric(df['main_rank'], errors='coerce')
     scaler = MinMaxScaler()
-    df['main_rank'] = scaler.fit_transform(df[['main_rank']])
+    if rank_range is None:
+        df['main_rank'] = scaler.fit_transform(df[['main_rank']])
+    else:
+        scaler.fit(pd.DataFrame({'main_rank': rank_range}, dtype=float))
+        df['main_rank'] = scaler.transform(df[['main_rank']])
 
     return df
 
+def normalize_best_sellers_rank(df):
+    """
+    Extract book category and rank from the best_sellers_rank column(extract_best_sellers_rank),
+      then normalize the column 'main_category' using LabelEncoding from sklearn, and normalize
+       the column 'main_rank' using Min-Max scaling(encode_best_sellers_rank).
+    
+    Returns the updated DataFrame with normalized columns.
+    """
+    df = extract_best_sellers_rank(df)
+    return encode_best_sellers_rank(df)
+
 def normalize_rating(df):
     """
     Convert all values of the column rating into numeric and then create a new column rating_normalized having all values of the rating column
@@ -121,3 +252,364 @@ def normalize_rating(df):
     return df
 
 
+
+
+class BookNormalizer:
+    """
+    Fit-once version of normalize_prices, normalize_reviews, normalize_rating, normalize_root_bs_rank,
+      normalize_number_of_sellers and encode_best_sellers_rank.
+    fit learns the parameters of the columns of the DataFrame(min/max, mean/std, the category vocabulary),
+      transform applies them to any DataFrame with the same columns(e.g. a single new book) without refitting,
+      and inverse_transform converts normalized values back to the original scale.
+    The parameters are plain numbers and lists, so they can be saved to a small JSON file and loaded by the serving processes.
+
+    Attributes:
+        params (dict): the fitted parameters of each normalization, only the columns found by fit are normalized:
+            'prices': {column: [scale, offset]} of the Min-Max scaling of initial_price and final_price, x * scale + offset
+            'reviews': [mean, std] of log(1 + reviews_count)
+            'rating': maximum rating(5.0)
+            'root_bs_rank': [scale, offset] of the Min-Max scaling of -root_bs_rank
+            'number_of_sellers': [mean, std] of number_of_sellers
+            'categories': sorted category strings, if main_category is not encoded yet(the classes of the LabelEncoder)
+            'main_rank': [scale, offset] of the Min-Max scaling of main_rank, fitted together with 'categories'
+        version (str): version of the dataset used by fit(df.attrs['dataset_version'], Loader.dataset_version),
+                       a saved normalizer with another version was fitted on an older catalog and it must be fitted again.
+    """
+    PRICE_COLUMNS = ['final_price', 'initial_price']
+
+    def __init__(self, params = None, version = None):
+        self.params = params or {}
+        self.version = version
+
+    @staticmethod
+    def _min_max(values):
+        #scale and offset of sklearn MinMaxScaler, a constant column has scale 1
+        low, high = np.nanmin(values), np.nanmax(values)
+        scale = 1.0 / (high - low) if high > low else 1.0
+        return [float(scale), float(-low * scale)]
+
+    def fit(self, df):
+        params = {}
+        self.version = df.attrs.get('dataset_version')
+        prices = [col for col in self.PRICE_COLUMNS if col in df.columns]
+        if prices:
+            params['prices'] = {col: self._min_max(df[col].to_numpy(dtype=float)) for col in prices}
+        if 'reviews_count' in df.columns:
+            log_reviews = np.log1p(df['reviews_count'])
+            params['reviews'] = [float(log_reviews.mean()), float(log_reviews.std())]
+        if 'rating' in df.columns:
+            params['rating'] = 5.0
+        if 'root_bs_rank' in df.columns:
+            params['root_bs_rank'] = self._min_max(-df['root_bs_rank'].to_numpy(dtype=float))
+        if 'number_of_sellers' in df.columns:
+            sellers = df['number_of_sellers'].to_numpy(dtype=float)
+            std = np.nanstd(sellers)
+            params['number_of_sellers'] = [float(np.nanmean(sellers)), float(std) if std > 0 else 1.0]
+        if 'main_category' in df.columns and not pd.api.types.is_numeric_dtype(df['main_category']):
+            params['categories'] = category_vocabulary(df['main_category'].astype(str))
+            params['main_rank'] = self._min_max(pd.to_numeric(df['main_rank'], errors='coerce').to_numpy(dtype=float))
+        self.params = params
+        return self
+
+    def transform(self, df):
+        """
+        Normalize a copy of the DataFrame with the fitted parameters, adding the same columns of the Normalizer functions.
+        Only the columns found in the DataFrame are normalized, categories not seen by fit are encoded as -1.
+        """
+        df = df.copy(deep=False)
+        params = self.params
+        for col, (scale, offset) in params.get('prices', {}).items():
+            if col in df.columns:
+                df[col] = df[col] * scale + offset
+        if 'reviews' in params and 'reviews_count' in df.columns:
+            mean, std = params['reviews']
+            df['log_reviews'] = np.log1p(df['reviews_count'])
+            df['reviews_normalized'] = (df['log_reviews'] - mean) / std
+        if 'rating' in params and 'rating' in df.columns:
+            df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+            df['rating_normalized'] = df['rating'] / params['rating']
+        if 'root_bs_rank' in params and 'root_bs_rank' in df.columns:
+            scale, offset = params['root_bs_rank']
+            df['root_bs_rank_inverted'] = -df['root_bs_rank']
+            df['root_bs_rank_normalized'] = df['root_bs_rank_inverted'] * scale + offset
+        if 'number_of_sellers' in params and 'number_of_sellers' in df.columns:
+            mean, std = params['number_of_sellers']
+            df['number_of_sellers_norm'] = (df['number_of_sellers'] - mean) / std
+        if 'categories' in params and 'main_category' in df.columns:
+            df['main_category'] = pd.Index(params['categories']).get_indexer(df['main_category'].astype(str))
+        if 'main_rank' in params and 'main_rank' in df.columns:
+            scale, offset = params['main_rank']
+            df['main_rank'] = pd.to_numeric(df['main_rank'], errors='coerce') * scale + offset
+        return df
+
+    def inverse_transform(self, df):
+        """
+        Convert the normalized columns of a copy of the DataFrame back to the original scale:
+          initial_price, final_price and main_rank are converted in place, main_category is decoded to the category string,
+          and reviews_count, rating, root_bs_rank and number_of_sellers are computed from their normalized columns.
+        Only the columns found in the DataFrame are converted.
+        """
+        df = df.copy(deep=False)
+        params = self.params
+        for col, (scale, offset) in params.get('prices', {}).items():
+            if col in df.columns:
+                df[col] = (df[col] - offset) / scale
+        if 'reviews' in params and 'reviews_normalized' in df.columns:
+            mean, std = params['reviews']
+            df['reviews_count'] = np.expm1(df['reviews_normalized'] * std + mean)
+        if 'rating' in params and 'rating_normalized' in df.columns:
+            df['rating'] = df['rating_normalized'] * params['rating']
+        if 'root_bs_rank' in params and 'root_bs_rank_normalized' in df.columns:
+            scale, offset = params['root_bs_rank']
+            df['root_bs_rank'] = -(df['root_bs_rank_normalized'] - offset) / scale
+        if 'number_of_sellers' in params and 'number_of_sellers_norm' in df.columns:
+            mean, std = params['number_of_sellers']
+            df['number_of_sellers'] = df['number_of_sellers_norm'] * std + mean
+        if 'categories' in params:
+            if 'main_category' in df.columns:
+                codes = df['main_category'].to_numpy()
+                categories = np.asarray(params['categories'], dtype=object)
+                df['main_category'] = np.where(codes >= 0, categories[np.clip(codes, 0, None)], None)
+            if 'main_rank' in df.columns:
+                scale, offset = params['main_rank']
+                df['main_rank'] = (df['main_rank'] - offset) / scale
+        return df
+
+    def save(self, path = normalizer_path):
+        with open(path, 'w') as f:
+            json.dump({'dataset_version': self.version, 'params': self.params}, f)
+
+    @classmethod
+    def load(cls, path = normalizer_path):
+        with open(path) as f:
+            data = json.load(f)
+        #a file without the version(only the parameters) was written before the versions were saved
+        if 'params' not in data:
+            return cls(data)
+        return cls(data['params'], data['dataset_version'])
+
+
+"""
+Columns of the feature matrix of the recommendation models, in order.
+"""
+FEATURE_COLUMNS = ['final_price', 'reviews_normalized', 'rating_normalized', 'main_category', 'main_rank']
+
+def feature_matrix(df, normalizer = None):
+    """
+    Build the features of the recommendation models(FEATURE_COLUMNS) from the cleaned dataset as one C-contiguous float32 array.
+    Only the columns needed by the features are read, the DataFrame(titles and other strings included) is not copied.
+
+    Args:
+        df (pd.DataFrame): cleaned dataset, not normalized.
+        normalizer (BookNormalizer, optional): fitted normalizer, if None it's fitted on df. Defaults to None.
+
+    Returns:
+        tuple: (np.ndarray of shape (rows, 5), pd.Index of the asin of each row)
+    """
+    normalizer = normalizer or BookNormalizer().fit(df)
+    normalized = normalizer.transform(df[['final_price', 'reviews_count', 'rating', 'main_category', 'main_rank']])
+    X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        X[:, j] = normalized[col].to_numpy(dtype=np.float32, na_value=np.nan)
+    return X, pd.Index(df['asin'], name='asin')
+
+def _asin_path(path):
+    return f"{os.path.splitext(path)[0]}_asin.npy"
+
+def save_feature_matrix(path, X, asins):
+    #write the matrix to path(.npy) and the asins to <path>_asin.npy, as fixed-width strings so both files can be memory-mapped
+    np.save(path, np.ascontiguousarray(X, dtype=np.float32))
+    np.save(_asin_path(path), np.asarray(asins, dtype=str))
+
+def load_feature_matrix(path, mmap = True):
+    #read the files written by save_feature_matrix, the matrix is memory-mapped(read-only) if mmap is True
+    X = np.load(path, mmap_mode='r' if mmap else None)
+    asins = pd.Index(np.load(_asin_path(path), mmap_mode='r' if mmap else None).astype(object), dtype=str, name='asin')
+    return X, asins
+
+class RunningStats:
+    """
+    Running count, mean, variance(Welford's M2) and min/max of a column, updated chunk by chunk.
+    Each chunk is summarized with NumPy and merged with the formula of Chan et al., so two RunningStats
+      computed by different workers can be merged into the statistics of all their values. Missing values are ignored.
+    Values can also be removed(e.g. the old row of a book that changed): count, mean and variance are exact,
+      min/max can't be restored and stay the range of all the values seen.
+    """
+    def __init__(self, count = 0, mean = 0.0, m2 = 0.0, min = np.inf, max = -np.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = values.mean()
+            self.merge(RunningStats(len(values), mean, float(((values - mean) ** 2).sum()), values.min(), values.max()))
+        return self
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = float(self.mean + delta * other.count / count)
+        self.m2 = float(self.m2 + other.m2 + delta ** 2 * self.count * other.count / count)
+        self.count = count
+        self.min = float(min(self.min, other.min))
+        self.max = float(max(self.max, other.max))
+        return self
+
+    def remove(self, values):
+        #remove values added before, the inverse of the formula of Chan et al.
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        count = self.count - len(values)
+        if count <= 0:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return self
+        mean = values.mean()
+        rest_mean = (self.count * self.mean - len(values) * mean) / count
+        delta = mean - rest_mean
+        m2 = self.m2 - ((values - mean) ** 2).sum() - delta ** 2 * count * len(values) / self.count
+        self.count, self.mean, self.m2 = count, float(rest_mean), float(max(m2, 0.0))
+        return self
+
+    def std(self, ddof = 0):
+        return float(np.sqrt(self.m2 / (self.count - ddof))) if self.count > ddof else np.nan
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+"""
+Features of the StreamingNormalizer: (name, column, kind, function applied to the column before the statistics, ddof of the std).
+'min_max' features are scaled as normalize_prices and normalize_root_bs_rank, 'z_score' features as normalize_reviews
+  (std of pandas, ddof 1) and normalize_number_of_sellers(StandardScaler, ddof 0).
+"""
+STREAMING_FEATURES = [
+    ('final_price', 'final_price', 'min_max', lambda x: x, 0),
+    ('initial_price', 'initial_price', 'min_max', lambda x: x, 0),
+    ('reviews', 'reviews_count', 'z_score', np.log1p, 1),
+    ('root_bs_rank', 'root_bs_rank', 'min_max', lambda x: -x, 0),
+    ('number_of_sellers', 'number_of_sellers', 'z_score', lambda x: x, 0),
+]
+
+class StreamingNormalizer:
+    """
+    Streaming counterpart of normalize_prices, normalize_reviews, normalize_root_bs_rank and normalize_number_of_sellers:
+      the parameters come from a RunningStats for each feature, so new rows update them without reading the old rows again.
+
+    Updating the parameters changes the normalized value of the rows normalized before, the drift of a feature is the largest
+      change of a normalized value in the range of the baseline(the statistics when the stored rows were normalized):
+      the normalizations are linear, so the largest change is at the min or the max of that range.
+    When the drift of a feature exceeds 'tolerance', the stored rows should be normalized again(then call rebase).
+
+    Attributes:
+        tolerance (float): largest drift of the normalized values that doesn't need a new normalization.
+        stats (dict): feature name -> RunningStats.
+        baseline (dict): feature name -> RunningStats of the last normalization, None before the first update.
+    """
+    def __init__(self, tolerance = 0.01):
+        self.tolerance = tolerance
+        self.stats = {name: RunningStats() for name, *_ in STREAMING_FEATURES}
+        self.baseline = None
+
+    @staticmethod
+    def _params(kind, stats, ddof):
+        if kind == 'min_max':
+            return BookNormalizer._min_max([stats.min, stats.max])
+        std = stats.std(ddof)
+        return [stats.mean, std if std > 0 else 1.0]
+
+    @staticmethod
+    def _scale(kind, params, x):
+        if kind == 'min_max':
+            return x * params[0] + params[1]
+        return (x - params[0]) / params[1]
+
+    def update(self, df, removed = None):
+        """
+        Update the statistics with the rows of a chunk, the first update is also the baseline.
+
+        Args:
+            df (pd.DataFrame): the new rows.
+            removed (pd.DataFrame, optional): rows added by a previous update that are replaced(e.g. the old rows of the books
+                                              that changed), their values are removed from the statistics. Defaults to None.
+
+        Returns:
+            pd.Series: the drift of each feature (see drift).
+        """
+        for name, col, _, func, _ in STREAMING_FEATURES:
+            if removed is not None and col in removed.columns:
+                self.stats[name].remove(func(removed[col].to_numpy(dtype=float)))
+            if col in df.columns:
+                self.stats[name].update(func(df[col].to_numpy(dtype=float)))
+        if self.baseline is None:
+            self.rebase()
+        return self.drift()
+
+    def merge(self, other):
+        #add the statistics of another StreamingNormalizer(e.g. updated by another worker)
+        for name in self.stats:
+            self.stats[name].merge(other.stats[name])
+        if self.baseline is None and other.baseline is not None:
+            self.rebase()
+        return self
+
+    def rebase(self):
+        #the current statistics become the baseline, after the stored rows were normalized again
+        self.baseline = {name: RunningStats(**stats.to_dict()) for name, stats in self.stats.items()}
+
+    def drift(self):
+        #largest change of the normalized values of the baseline range for each feature
+        drift = {}
+        for name, _, kind, _, ddof in STREAMING_FEATURES:
+            old, new = self.baseline[name] if self.baseline else RunningStats(), self.stats[name]
+            if old.count == 0 or new.count == 0:
+                drift[name] = 0.0
+                continue
+            ends = np.array([old.min, old.max])
+            shift = self._scale(kind, self._params(kind, new, ddof), ends) - self._scale(kind, self._params(kind, old, ddof), ends)
+            drift[name] = float(np.abs(shift).max())
+        return pd.Series(drift, name='drift')
+
+    def needs_renormalization(self):
+        return bool((self.drift() > self.tolerance).any())
+
+    @property
+    def params(self):
+        #current parameters in the format of BookNormalizer.params
+        params = {}
+        for name, _, kind, _, ddof in STREAMING_FEATURES:
+            if self.stats[name].count == 0:
+                continue
+            value = self._params(kind, self.stats[name], ddof)
+            if name in BookNormalizer.PRICE_COLUMNS:
+                params.setdefault('prices', {})[name] = value
+            else:
+                params[name] = value
+        return params
+
+    def transform(self, df):
+        #normalize a copy of the DataFrame with the current parameters(BookNormalizer.transform)
+        return BookNormalizer(self.params).transform(df)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'tolerance': self.tolerance,
+                       'stats': {name: stats.to_dict() for name, stats in self.stats.items()},
+                       'baseline': {name: stats.to_dict() for name, stats in self.baseline.items()} if self.baseline else None}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        normalizer = cls(data['tolerance'])
+        normalizer.stats = {name: RunningStats(**stats) for name, stats in data['stats'].items()}
+        if data['baseline'] is not None:
+            normalizer.baseline = {name: RunningStats(**stats) for name, stats in data['baseline'].items()}
+        return normalizer